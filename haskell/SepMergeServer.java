@@ -0,0 +1,211 @@
+import br.com.hasksepmerge.Diff3Runner;
+import br.com.hasksepmerge.HaskellSepMergeEngine;
+
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+
+/**
+ * Servidor de merge de longa duração para o Haskell-SepMerge.
+ *
+ * Evita subir uma JVM nova por arquivo: o processo fica vivo e atende
+ * requisições JSON delimitadas por linha no stdin, respondendo uma linha
+ * JSON por requisição no stdout.
+ *
+ *   requisição: {"id": 1, "base": "...", "left": "...", "right": "..."}
+ *   resposta:   {"id": 1, "ok": true, "merged": "...", "conflicts": 2}
+ *               {"id": 1, "ok": false, "error": "..."}
+ *
+ * Os arquivos temporários são escritos no diretório de trabalho do processo
+ * com os mesmos nomes usados pelos scripts de mineração (temp_base.hs etc.),
+ * de modo que os rótulos dos marcadores de conflito são os mesmos do
+ * "java -jar". Por isso cada servidor deve rodar no seu próprio diretório.
+ *
+ * Uso: java -cp haskell-sepmerge.jar SepMergeServer.java
+ */
+public class SepMergeServer {
+
+    public static void main(String[] args) throws IOException {
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), false, StandardCharsets.UTF_8);
+        // O stdout é reservado ao protocolo; qualquer print da ferramenta vai para o stderr
+        System.setOut(System.err);
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isBlank()) continue;
+            out.println(handle(line));
+            out.flush();
+        }
+    }
+
+    static String handle(String line) {
+        String id = "null";
+        try {
+            Map<String, Object> request = Json.parseObject(line);
+            if (request.get("id") != null) id = Json.encode(request.get("id"));
+
+            Files.writeString(Path.of("temp_base.hs"), field(request, "base"), StandardCharsets.UTF_8);
+            Files.writeString(Path.of("temp_left.hs"), field(request, "left"), StandardCharsets.UTF_8);
+            Files.writeString(Path.of("temp_right.hs"), field(request, "right"), StandardCharsets.UTF_8);
+
+            // Mesma sequência do Main: diff3 (left, base, right) e resolução dos conflitos
+            List<String> diff3Output = Diff3Runner.runDiff3("temp_left.hs", "temp_base.hs", "temp_right.hs");
+            List<String> finalOutput = HaskellSepMergeEngine.resolveConflicts(diff3Output);
+
+            StringBuilder merged = new StringBuilder();
+            int conflicts = 0;
+            for (String l : finalOutput) {
+                merged.append(l).append('\n');
+                if (l.startsWith("<<<<<<<")) conflicts++;
+            }
+            return "{\"id\":" + id + ",\"ok\":true,\"merged\":" + Json.quote(merged.toString())
+                    + ",\"conflicts\":" + conflicts + "}";
+        } catch (OutOfMemoryError e) {
+            return error(id, "OutOfMemoryError");
+        } catch (Throwable e) {
+            return error(id, e.getClass().getSimpleName() + ": " + e.getMessage());
+        }
+    }
+
+    static String field(Map<String, Object> request, String name) {
+        Object value = request.get(name);
+        if (!(value instanceof String)) throw new IllegalArgumentException("Campo ausente: " + name);
+        return (String) value;
+    }
+
+    static String error(String id, String message) {
+        return "{\"id\":" + id + ",\"ok\":false,\"error\":" + Json.quote(String.valueOf(message)) + "}";
+    }
+
+    /** JSON mínimo: objetos planos com strings, números, booleanos e null. */
+    static final class Json {
+        private final String s;
+        private int pos;
+
+        private Json(String s) {
+            this.s = s;
+        }
+
+        static Map<String, Object> parseObject(String text) {
+            Json p = new Json(text);
+            p.skipSpaces();
+            p.expect('{');
+            Map<String, Object> result = new LinkedHashMap<>();
+            p.skipSpaces();
+            if (p.peek() == '}') {
+                p.pos++;
+                return result;
+            }
+            while (true) {
+                p.skipSpaces();
+                String key = p.parseString();
+                p.skipSpaces();
+                p.expect(':');
+                p.skipSpaces();
+                result.put(key, p.parseValue());
+                p.skipSpaces();
+                char c = p.next();
+                if (c == '}') return result;
+                if (c != ',') throw new IllegalArgumentException("JSON inválido na posição " + p.pos);
+            }
+        }
+
+        static String encode(Object value) {
+            if (value instanceof String) return quote((String) value);
+            return String.valueOf(value);
+        }
+
+        static String quote(String value) {
+            StringBuilder sb = new StringBuilder(value.length() + 16);
+            sb.append('"');
+            for (int i = 0; i < value.length(); i++) {
+                char c = value.charAt(i);
+                switch (c) {
+                    case '"': sb.append("\\\""); break;
+                    case '\\': sb.append("\\\\"); break;
+                    case '\n': sb.append("\\n"); break;
+                    case '\r': sb.append("\\r"); break;
+                    case '\t': sb.append("\\t"); break;
+                    default:
+                        if (c < 0x20 || Character.isSurrogate(c)) {
+                            sb.append(String.format("\\u%04x", (int) c));
+                        } else {
+                            sb.append(c);
+                        }
+                }
+            }
+            return sb.append('"').toString();
+        }
+
+        private Object parseValue() {
+            char c = peek();
+            if (c == '"') return parseString();
+            if (s.startsWith("true", pos)) { pos += 4; return Boolean.TRUE; }
+            if (s.startsWith("false", pos)) { pos += 5; return Boolean.FALSE; }
+            if (s.startsWith("null", pos)) { pos += 4; return null; }
+            int start = pos;
+            while (pos < s.length() && "+-0123456789.eE".indexOf(s.charAt(pos)) >= 0) pos++;
+            if (start == pos) throw new IllegalArgumentException("JSON inválido na posição " + pos);
+            String number = s.substring(start, pos);
+            if (number.matches("-?\\d+")) return Long.parseLong(number);
+            return Double.parseDouble(number);
+        }
+
+        private String parseString() {
+            expect('"');
+            StringBuilder sb = new StringBuilder();
+            while (true) {
+                char c = next();
+                if (c == '"') return sb.toString();
+                if (c != '\\') {
+                    sb.append(c);
+                    continue;
+                }
+                char e = next();
+                switch (e) {
+                    case '"': case '\\': case '/': sb.append(e); break;
+                    case 'b': sb.append('\b'); break;
+                    case 'f': sb.append('\f'); break;
+                    case 'n': sb.append('\n'); break;
+                    case 'r': sb.append('\r'); break;
+                    case 't': sb.append('\t'); break;
+                    case 'u':
+                        sb.append((char) Integer.parseInt(s.substring(pos, pos + 4), 16));
+                        pos += 4;
+                        break;
+                    default:
+                        throw new IllegalArgumentException("Escape inválido na posição " + pos);
+                }
+            }
+        }
+
+        private void skipSpaces() {
+            while (pos < s.length() && Character.isWhitespace(s.charAt(pos))) pos++;
+        }
+
+        private char peek() {
+            if (pos >= s.length()) throw new IllegalArgumentException("JSON truncado");
+            return s.charAt(pos);
+        }
+
+        private char next() {
+            char c = peek();
+            pos++;
+            return c;
+        }
+
+        private void expect(char c) {
+            if (next() != c) throw new IllegalArgumentException("Esperado '" + c + "' na posição " + (pos - 1));
+        }
+    }
+}
@@ -0,0 +1,222 @@
+# AMOSTRAGEM DOS CENÁRIOS
+# Para ter uma resposta em minutos quando a ferramenta muda: --sample N sorteia
+# N cenários entre os enumerados, repartidos entre os estratos (--stratify repo
+# ou language) em proporção ao tamanho de cada um. O sorteio é determinístico:
+# cada cenário recebe um hash da --seed e da sua chave, e cada estrato guarda só
+# os N menores hashes. A memória não depende do tamanho do histórico e a mesma
+# semente dá a mesma amostra, qualquer que seja a ordem da enumeração.
+# Os cenários em que a ferramenta deu conflito, falhou ou gerou código inválido
+# nos resultados completos entram sempre, num estrato à parte com peso 1.
+# As métricas da amostra são extrapoladas para o corpus (estimador estratificado
+# com correção de população finita, intervalo de 95%); uma rodada completa
+# confirma os números depois.
+import heapq
+import hashlib
+from collections import Counter
+import numpy as np
+import pandas as pd
+from resultados import ler_resultados
+from analise import indicadores, COLUNAS_METRICAS, TAXAS, Z_95
+from linguagens import linguagem_do_arquivo
+
+# Como cada cenário é classificado em cada estratificação
+ESTRATOS = {
+    "repo": lambda cenario: cenario.repo,
+    "language": lambda cenario: linguagem_do_arquivo(cenario.arquivo).nome,
+}
+_SEM_ESTRATO = "todos"
+_CHAVE_LINHA = ["Repo", "MergeCommit", "File"]
+
+
+def chave_linha(cenario):
+    """A chave do cenário nas linhas dos resultados (o merge vem abreviado)."""
+    return cenario.repo, cenario.merge[:7], cenario.arquivo
+
+
+def prioritarios(caminho):
+    """
+    Chaves dos cenários em que a ferramenta deu conflito (ou falhou) ou
+    gerou código inválido nos resultados em 'caminho'; vazio se não existem.
+    """
+    chaves = set()
+    try:
+        for df in ler_resultados(caminho, [*_CHAVE_LINHA, "CSDiff_Conflict", "CSDiff_ParseOK"]):
+            df = df[(df["CSDiff_Conflict"] != 0) | ~df["CSDiff_ParseOK"]]
+            chaves.update(zip(df["Repo"], df["MergeCommit"].str[:7], df["File"]))
+    except FileNotFoundError:
+        pass
+    return chaves
+
+
+class Amostra:
+    """
+    Sorteio estratificado dos cenários. adicionar() recebe os cenários de
+    cada repositório conforme são enumerados; selecionar() devolve os
+    escolhidos e estimar() extrapola os resultados deles para o corpus.
+    """
+
+    def __init__(self, tamanho, semente=0, estratificar=None, prioritarios=()):
+        self.tamanho = tamanho
+        self.semente = semente
+        self.estratificar = estratificar
+        self.prioritarios = set(prioritarios)
+        # N de cada estrato (sem os prioritários) e, depois de selecionar(), o n sorteado
+        self.populacao = Counter()
+        self.sorteados = {}
+        self._certos = []
+        self._menores = {}
+        self._ordem = 0
+        self._estrato_de = {}
+
+    def _estrato(self, cenario):
+        return ESTRATOS[self.estratificar](cenario) if self.estratificar else _SEM_ESTRATO
+
+    def _sorteio(self, cenario):
+        digest = hashlib.sha1(f"{self.semente}|{cenario.repo}|{cenario.merge}|{cenario.arquivo}".encode()).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def adicionar(self, cenarios):
+        for cenario in cenarios:
+            self._ordem += 1
+            if chave_linha(cenario) in self.prioritarios:
+                self._certos.append((self._ordem, cenario))
+                continue
+            estrato = self._estrato(cenario)
+            self.populacao[estrato] += 1
+            # Heap dos maiores primeiro (hash negado): o topo é o que sai quando chega um menor
+            menores = self._menores.setdefault(estrato, [])
+            item = (-self._sorteio(cenario), self._ordem, cenario)
+            if len(menores) < self.tamanho:
+                heapq.heappush(menores, item)
+            elif menores and item > menores[0]:
+                heapq.heapreplace(menores, item)
+
+    @property
+    def certos(self):
+        return len(self._certos)
+
+    def alocacao(self):
+        """
+        O n de cada estrato: um para cada estrato não vazio (se o tamanho
+        permite) e o resto em proporção ao N, arredondado pelos maiores restos.
+        """
+        estratos = sorted(self.populacao)
+        n = min(self.tamanho, sum(self.populacao.values()))
+        minimo = 1 if n >= len(estratos) else 0
+        alocados = dict.fromkeys(estratos, minimo)
+        livres = {e: self.populacao[e] - minimo for e in estratos}
+        total_livre = sum(livres.values())
+        if total_livre == 0:
+            return alocados
+        cotas = {e: (n - minimo * len(estratos)) * livres[e] / total_livre for e in estratos}
+        for e, cota in cotas.items():
+            alocados[e] += int(cota)
+        faltam = n - sum(alocados.values())
+        for e in sorted(estratos, key=lambda e: int(cotas[e]) - cotas[e])[:faltam]:
+            alocados[e] += 1
+        return alocados
+
+    def selecionar(self):
+        """Os cenários sorteados e os prioritários, na ordem em que foram enumerados."""
+        self.sorteados = self.alocacao()
+        escolhidos = list(self._certos)
+        self._estrato_de = {chave_linha(cenario): None for _, cenario in self._certos}
+        for estrato, n in self.sorteados.items():
+            for _, ordem, cenario in heapq.nlargest(n, self._menores[estrato]):
+                escolhidos.append((ordem, cenario))
+                self._estrato_de[chave_linha(cenario)] = estrato
+        self._menores = {}
+        return [cenario for _, cenario in sorted(escolhidos, key=lambda item: item[0])]
+
+    def estimar(self, caminho):
+        """
+        Extrapola para o corpus os resultados da amostra gravados em 'caminho'.
+        Um DataFrame por métrica (as contagens de analise.indicadores e as
+        taxas de TAXAS) com o valor na amostra, a estimativa, o erro padrão e
+        o intervalo de 95%. Sem sorteados suficientes num estrato (n < 2 e
+        n < N) o erro fica indefinido (NaN); uma taxa cujo denominador tem
+        total estimado 0 também.
+        """
+        partes = []
+        for df in ler_resultados(caminho, [*_CHAVE_LINHA, *COLUNAS_METRICAS]):
+            estratos = pd.Series([self._estrato_de.get(chave, "") for chave in
+                                  zip(df["Repo"], df["MergeCommit"].str[:7], df["File"])], index=df.index)
+            # Linhas que não são da amostra atual (de uma seleção anterior) ficam de fora
+            da_amostra = estratos != ""
+            por_linha = indicadores(df[da_amostra])[0].astype(float)
+            por_linha["estrato"] = estratos[da_amostra]
+            partes.append(por_linha)
+        linhas = pd.concat(partes) if partes else indicadores(
+            pd.DataFrame({c: pd.Series(dtype="int64") for c in COLUNAS_METRICAS}))[0].assign(estrato=None)
+        certos = linhas[linhas["estrato"].isna()].drop(columns="estrato")
+        sorteadas = linhas[linhas["estrato"].notna()]
+
+        total, variancia = _total_estratificado(sorteadas, self.populacao, self.sorteados)
+        total += certos.sum()
+        estimativas = pd.DataFrame({
+            "amostra": linhas.drop(columns="estrato").sum(),
+            "estimativa": total,
+            "erro_padrao": np.sqrt(variancia),
+        })
+        # Taxas: razão de dois totais, com o erro pela linearização (resíduos y - R x)
+        for nome, (numerador, denominador) in TAXAS.items():
+            razao = total[numerador] / total[denominador] if total[denominador] > 0 else np.nan
+            residuos = pd.DataFrame({"d": sorteadas[numerador] - razao * sorteadas[denominador],
+                                     "estrato": sorteadas["estrato"]})
+            variancia_d = _total_estratificado(residuos, self.populacao, self.sorteados)[1]["d"]
+            amostra = linhas[numerador].sum() / linhas[denominador].sum() if linhas[denominador].sum() else np.nan
+            erro = np.sqrt(variancia_d) / total[denominador] if total[denominador] > 0 else np.nan
+            estimativas.loc[nome] = [amostra, razao, erro]
+        estimativas["inf"] = estimativas["estimativa"] - Z_95 * estimativas["erro_padrao"]
+        estimativas["sup"] = estimativas["estimativa"] + Z_95 * estimativas["erro_padrao"]
+        taxas = list(TAXAS)
+        estimativas.loc[taxas, ["inf", "sup"]] = estimativas.loc[taxas, ["inf", "sup"]].clip(0, 1)
+        return estimativas
+
+
+def _total_estratificado(linhas, populacao, sorteados):
+    """
+    Total estimado e variância de cada coluna de 'linhas' (as unidades
+    sorteadas que geraram linha; as demais valem 0 em todas as colunas).
+    """
+    estratos = [e for e in populacao if sorteados.get(e)]
+    valores = linhas.drop(columns="estrato")
+    soma = valores.groupby(linhas["estrato"]).sum().reindex(estratos, fill_value=0.0)
+    soma2 = (valores ** 2).groupby(linhas["estrato"]).sum().reindex(estratos, fill_value=0.0)
+    N = pd.Series(populacao, dtype=float).reindex(estratos)
+    n = pd.Series(sorteados, dtype=float).reindex(estratos)
+    media = soma.div(n, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        s2 = (soma2 - soma * media).div(n - 1, axis=0)
+        variancia = s2.mul(N ** 2 * (1 - n / N) / n, axis=0)
+    # Estrato sorteado por inteiro: sem erro, mesmo com n = 1
+    variancia.loc[n == N] = 0.0
+    total = media.mul(N, axis=0).sum()
+    variancia = variancia.sum(skipna=False)
+    # Estratos sem nenhum sorteado deixam o total indefinido
+    if any(not sorteados.get(e) for e in populacao):
+        total[:] = variancia[:] = np.nan
+    return total, variancia
+
+
+def imprimir_estimativas(amostra, estimativas):
+    estratificacao = f", por {amostra.estratificar}" if amostra.estratificar else ""
+    populacao = sum(amostra.populacao.values()) + amostra.certos
+    print(f"\n > Amostra: {sum(amostra.sorteados.values())} cenários sorteados (semente {amostra.semente}"
+          f"{estratificacao}) + {amostra.certos} sempre incluídos, de {populacao} enumerados")
+    print("   Extrapolação para o corpus (intervalo de 95%; uma rodada completa confirma):")
+    # Taxas sem denominador (nenhum cenário dele no corpus estimado) não têm valor
+    sem_denominador = {nome: denominador for nome, (_, denominador) in TAXAS.items()
+                       if estimativas.loc[denominador, "estimativa"] == 0}
+    for nome, linha in estimativas.iterrows():
+        indefinido = np.isnan(linha["erro_padrao"])
+        if nome in sem_denominador:
+            print(f"   {nome:<26}     n/d  (nenhum cenário em {sem_denominador[nome]})")
+        elif nome in TAXAS:
+            intervalo = "n/d" if indefinido else f"{linha['inf']:.1%}, {linha['sup']:.1%}"
+            print(f"   {nome:<26} {linha['estimativa']:7.1%}  [{intervalo}]  (na amostra: {linha['amostra']:.1%})")
+        else:
+            margem = "n/d" if indefinido else f"{Z_95 * linha['erro_padrao']:.0f}"
+            print(f"   {nome:<26} {linha['estimativa']:7.0f}  ± {margem}  (na amostra: {linha['amostra']:.0f})")
+    if estimativas["erro_padrao"].drop(index=list(sem_denominador)).isna().any():
+        print("   n/d: algum estrato tem um só cenário sorteado (ou nenhum); aumente o --sample")
@@ -1,33 +1,58 @@
-import csv
-import pandas as pd
+import os
+import argparse
+from analise import analisar, RECORTES
 
 # --- CONFIGURAÇÃO ---
 CSV_FILE = "resultados_com_validacao_total.csv"
+CASOS_SUCESSO_FILE = "casos_sucesso_absoluto.csv"
+# Grupos exibidos por recorte (os de mais arquivos); o --save-breakdowns grava todos
+TOP_GRUPOS = 10
 
-def analyze():
+_TITULOS = {"repo": "POR REPOSITÓRIO", "file": "POR ARQUIVO", "tool": "POR VERSÃO DA FERRAMENTA",
+            "language": "POR LINGUAGEM"}
+
+def _taxa(linha, nome):
+    """'xx.x% [inf–sup]' com o intervalo de confiança de 95%, ou '-' sem casos."""
+    if linha[nome] != linha[nome]:  # NaN: denominador zero
+        return "-"
+    return f"{linha[nome] * 100:5.1f}% [{linha[nome + '_inf'] * 100:.1f}–{linha[nome + '_sup'] * 100:.1f}]"
+
+def _imprimir_recorte(nome, grupos, top):
+    print("-" * 110)
+    print(f"📂 {_TITULOS[nome]} ({min(top, len(grupos))} de {len(grupos)} grupos, pelo nº de arquivos):")
+    print(f"  {'Grupo':<40} {'Arquivos':>8} {'Conf.diff3':>10} {'Resolvidos':>10}  "
+          f"{'Resolução [IC95]':<21} {'ParseOK [IC95]'}")
+    for chave, linha in grupos.head(top).iterrows():
+        rotulo = "/".join(chave) if isinstance(chave, tuple) else chave
+        print(f"  {(rotulo or '(sem versão)')[-40:]:<40} {int(linha['arquivos']):>8} {int(linha['conflito_diff3']):>10} "
+              f"{int(linha['resolvidos']):>10}  {_taxa(linha, 'taxa_resolucao'):<21} {_taxa(linha, 'taxa_parse_ok')}")
+
+def analyze(caminho=CSV_FILE, recortes=tuple(RECORTES), top=TOP_GRUPOS, pasta_recortes=None):
     try:
-        # Carrega os dados
-        df = pd.read_csv(CSV_FILE)
-        
+        # Uma passada sobre os dados (CSV ou o diretório Parquet), lendo só as colunas usadas;
+        # os casos resolvidos vão direto para o CSV de exportação durante a leitura
+        analise = analisar(caminho, recortes, exportar=CASOS_SUCESSO_FILE)
+        totais = analise.totais
+
         # Total de arquivos analisados (onde houve algum conflito em alguma ferramenta)
-        total_arquivos = len(df)
-        
+        total_arquivos = int(totais["arquivos"])
+
         # 1. Contagem de Conflitos (Falsos Positivos)
-        arquivos_com_conflito_diff3 = len(df[df['Diff3_Conflict'] > 0])
-        arquivos_com_conflito_csdiff = len(df[df['CSDiff_Conflict'] > 0])
-        
+        arquivos_com_conflito_diff3 = int(totais["conflito_diff3"])
+        arquivos_com_conflito_csdiff = int(totais["conflito_csdiff"])
+
         # Casos onde o diff3 falhou, mas a nossa ferramenta resolveu 100% (Falsos Positivos Eliminados)
-        resolvidos_pelo_csdiff = df[(df['Diff3_Conflict'] > 0) & (df['CSDiff_Conflict'] == 0)]
-        total_resolvidos = len(resolvidos_pelo_csdiff)
-        
+        total_resolvidos = int(totais["resolvidos"])
+
         # 2. Análise de Sintaxe (A grande vitória da "Reversão Matemática")
         # Dentre os que a ferramenta resolveu sozinha, quantos compilaram perfeitamente?
-        sucesso_sintatico = len(resolvidos_pelo_csdiff[resolvidos_pelo_csdiff['CSDiff_ParseOK'] == True])
-        
-        taxa_sucesso = (sucesso_sintatico / total_resolvidos * 100) if total_resolvidos > 0 else 0
-        
+        sucesso_sintatico = int(totais["resolvidos_parse_ok"])
+
         # 3. Comparação com o Desenvolvedor Humano
-        iguais_ao_manual = len(resolvidos_pelo_csdiff[resolvidos_pelo_csdiff['CSDiff_Equals_Manual'] == True])
+        iguais_ao_manual = int(totais["resolvidos_iguais_manual"])
+
+        # Falhas das ferramentas (TIMEOUT, OOM, CRASH) por saída; um merge que falhou tem conflitos = -1
+        falhas = analise.falhas
 
         # --- EXIBIÇÃO DOS RESULTADOS ---
         print("="*50)
@@ -39,22 +64,47 @@ def analyze():
         print(f"  -> Arquivos com conflito no Diff3 nativo:  {arquivos_com_conflito_diff3}")
         print(f"  -> Arquivos com conflito no Haskell-Sep:   {arquivos_com_conflito_csdiff}")
         print(f"  ✅ Conflitos totalmente resolvidos:        {total_resolvidos} arquivos")
+        print(f"     Taxa de resolução [IC 95%]:            {_taxa(totais, 'taxa_resolucao')}")
         print("-" * 50)
         print("🛠️  VALIDAÇÃO SINTÁTICA (Regra de Layout):")
         print(f"  -> Dos {total_resolvidos} arquivos resolvidos automaticamente:")
-        print(f"  ✅ Compilaram com sucesso no GHC (ParseOK): {sucesso_sintatico} ({taxa_sucesso:.1f}%)")
-        print(f"  🤝 Ficaram idênticos ao merge manual:       {iguais_ao_manual}")
+        print(f"  ✅ Compilaram com sucesso no GHC (ParseOK): {sucesso_sintatico} {_taxa(totais, 'taxa_parse_ok')}")
+        print(f"  🤝 Ficaram idênticos ao merge manual:       {iguais_ao_manual} {_taxa(totais, 'taxa_iguais_manual')}")
+        if falhas:
+            print("-" * 50)
+            print("⚠️  FALHAS DAS FERRAMENTAS (merge ou validação):")
+            for coluna, contagem in falhas.items():
+                detalhes = ", ".join(f"{classe}: {n}" for classe, n in contagem.most_common())
+                print(f"  -> {coluna}: {detalhes}")
         print("="*50)
 
-        # 4. (Opcional) Exportar os casos de sucesso para inspecionar no VS Code
-        if total_resolvidos > 0:
-            resolvidos_pelo_csdiff.to_csv("casos_sucesso_absoluto.csv", index=False)
-            print("\n💡 Dica: Os arquivos que a ferramenta resolveu com sucesso foram salvos em 'casos_sucesso_absoluto.csv'")
+        # 4. Recortes por repositório, arquivo, versão da ferramenta e linguagem
+        for nome, grupos in analise.recortes.items():
+            _imprimir_recorte(nome, grupos, top)
+            if pasta_recortes:
+                os.makedirs(pasta_recortes, exist_ok=True)
+                grupos.to_csv(os.path.join(pasta_recortes, f"recorte_{nome}.csv"))
+        if analise.recortes:
+            print("=" * 110)
+
+        # 5. (Opcional) Casos de sucesso exportados para inspecionar no VS Code
+        if analise.exportados > 0:
+            print(f"\n💡 Dica: Os arquivos que a ferramenta resolveu com sucesso foram salvos em '{CASOS_SUCESSO_FILE}'")
 
     except FileNotFoundError:
-        print(f"[ERRO] Arquivo '{CSV_FILE}' não encontrado. Execute o orquestrador primeiro.")
+        print(f"[ERRO] Arquivo '{caminho}' não encontrado. Execute o orquestrador primeiro.")
     except Exception as e:
         print(f"[ERRO] Ocorreu um problema ao analisar os dados: {e}")
 
 if __name__ == "__main__":
-    analyze()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Métricas dos resultados do experimento, com recortes e intervalos de confiança")
+    parser.add_argument("--input", default=CSV_FILE,
+                        help=f"CSV ou diretório Parquet dos resultados (padrão: {CSV_FILE})")
+    parser.add_argument("--by", nargs="*", choices=list(RECORTES), default=list(RECORTES),
+                        help="Recortes exibidos: repo, file, tool, language (padrão: todos; sem valores, nenhum)")
+    parser.add_argument("--top", type=int, default=TOP_GRUPOS,
+                        help=f"Grupos exibidos por recorte (padrão: {TOP_GRUPOS})")
+    parser.add_argument("--save-breakdowns", metavar="DIR",
+                        help="Grava cada recorte completo (todos os grupos) em DIR/recorte_<nome>.csv")
+    args = parser.parse_args()
+    analyze(args.input, tuple(args.by), args.top, args.save_breakdowns)
@@ -0,0 +1,127 @@
+# ANÁLISE DOS RESULTADOS EM UMA PASSADA
+# Lê os resultados (CSV ou Parquet) em pedaços e só com as colunas usadas.
+# Em cada pedaço as condições viram colunas 0/1 e um único groupby soma todas
+# as métricas de cada recorte (total, repositório, arquivo, versão da
+# ferramenta, linguagem); as somas parciais são acumuladas entre os pedaços.
+# A memória depende do número de grupos, não do número de linhas. As
+# proporções saem com o intervalo de confiança de Wilson (95%).
+import os
+from collections import Counter, namedtuple
+import numpy as np
+import pandas as pd
+from resultados import ler_resultados, COLUNAS, TAMANHO_PEDACO
+
+# Recortes disponíveis e as colunas que definem o grupo
+RECORTES = {
+    "repo": ["Repo"],
+    "file": ["Repo", "File"],
+    "tool": ["Tool_Version"],
+    "language": ["Language"],
+}
+COLUNAS_FALHA = ["Diff3_Failure", "CSDiff_Failure", "Manual_Failure"]
+COLUNAS_METRICAS = ["Diff3_Conflict", "CSDiff_Conflict", "CSDiff_Equals_Manual", "CSDiff_ParseOK", *COLUNAS_FALHA]
+
+# Proporções reportadas: numerador e denominador (contagens do acumulado)
+TAXAS = {
+    "taxa_resolucao": ("resolvidos", "conflito_diff3"),
+    "taxa_parse_ok": ("resolvidos_parse_ok", "resolvidos"),
+    "taxa_iguais_manual": ("resolvidos_iguais_manual", "resolvidos"),
+}
+Z_95 = 1.959963984540054
+
+# totais: Series de contagens; falhas: {coluna: Counter por classe};
+# recortes: {nome: DataFrame com contagens, taxas e intervalos por grupo};
+# exportados: linhas gravadas no arquivo de casos de sucesso
+Analise = namedtuple("Analise", ["totais", "falhas", "recortes", "exportados"])
+
+
+def wilson(sucessos, total, z=Z_95):
+    """Intervalo de Wilson (inferior, superior) para sucessos/total, vetorizado; NaN com total 0."""
+    sucessos = np.asarray(sucessos, dtype=float)
+    total = np.asarray(total, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = sucessos / total
+        z2 = z * z
+        denominador = 1 + z2 / total
+        centro = (p + z2 / (2 * total)) / denominador
+        margem = z * np.sqrt(p * (1 - p) / total + z2 / (4 * total * total)) / denominador
+    return centro - margem, centro + margem
+
+
+def indicadores(df):
+    """Uma coluna 0/1 por métrica, calculada sobre o pedaço inteiro de uma vez."""
+    com_conflito = df["Diff3_Conflict"] > 0
+    resolvidos = com_conflito & (df["CSDiff_Conflict"] == 0)
+    colunas = {
+        "arquivos": np.ones(len(df), dtype=np.int64),
+        "conflito_diff3": com_conflito,
+        "conflito_csdiff": df["CSDiff_Conflict"] > 0,
+        "resolvidos": resolvidos,
+        "resolvidos_parse_ok": resolvidos & df["CSDiff_ParseOK"],
+        "resolvidos_iguais_manual": resolvidos & df["CSDiff_Equals_Manual"],
+    }
+    for coluna in COLUNAS_FALHA:
+        colunas["falhas_" + coluna.split("_")[0].lower()] = df[coluna] != ""
+    return pd.DataFrame(colunas, index=df.index).astype(np.int64), resolvidos
+
+
+def _somar(acumulado, parcial):
+    return parcial if acumulado is None else acumulado.add(parcial, fill_value=0)
+
+
+def com_intervalos(contagens):
+    """Acrescenta cada taxa de TAXAS e seu intervalo (colunas _inf e _sup)."""
+    contagens = contagens.astype(np.int64)
+    for nome, (numerador, denominador) in TAXAS.items():
+        sucessos, total = contagens[numerador], contagens[denominador]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            contagens[nome] = sucessos / total.where(total > 0)
+        contagens[nome + "_inf"], contagens[nome + "_sup"] = wilson(sucessos, total)
+    return contagens
+
+
+def analisar(caminho, recortes=tuple(RECORTES), exportar=None, tamanho_pedaco=TAMANHO_PEDACO):
+    """
+    Todas as métricas em uma passada sobre os resultados. Com exportar, as
+    linhas resolvidas só pelo CSDiff (conflito no diff3, nenhum na
+    ferramenta) são gravadas nesse CSV pedaço a pedaço, sem montar a tabela.
+    """
+    colunas = set(COLUNAS_METRICAS)
+    for nome in recortes:
+        colunas.update(RECORTES[nome])
+    # A exportação leva a linha inteira; sem ela só as colunas usadas são lidas
+    colunas = COLUNAS if exportar else [c for c in COLUNAS if c in colunas]
+
+    totais = None
+    por_recorte = dict.fromkeys(recortes)
+    falhas = {coluna: Counter() for coluna in COLUNAS_FALHA}
+    exportados = 0
+    temporario = exportar + ".parcial" if exportar else None
+
+    for df in ler_resultados(caminho, colunas, tamanho_pedaco):
+        por_linha, resolvidos = indicadores(df)
+        totais = _somar(totais, por_linha.sum())
+        for nome in recortes:
+            chaves = RECORTES[nome]
+            parcial = por_linha.join(df[chaves]).groupby(chaves, sort=False).sum()
+            por_recorte[nome] = _somar(por_recorte[nome], parcial)
+        for coluna in COLUNAS_FALHA:
+            falhas[coluna].update(df.loc[df[coluna] != "", coluna].value_counts().to_dict())
+        if exportar and resolvidos.any():
+            df[resolvidos].to_csv(temporario, mode="w" if exportados == 0 else "a",
+                                  header=exportados == 0, index=False)
+            exportados += int(resolvidos.sum())
+
+    if totais is None:
+        # Arquivo sem linhas: as mesmas métricas, zeradas
+        vazio = indicadores(pd.DataFrame({c: pd.Series(dtype="int64") for c in COLUNAS_METRICAS}))[0]
+        totais = vazio.sum()
+    if exportados:
+        os.replace(temporario, exportar)
+    return Analise(
+        com_intervalos(totais.to_frame().T).iloc[0],
+        {coluna: contagem for coluna, contagem in falhas.items() if contagem},
+        {nome: com_intervalos(grupos).sort_values("arquivos", ascending=False)
+         for nome, grupos in por_recorte.items() if grupos is not None},
+        exportados,
+    )
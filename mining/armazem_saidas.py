@@ -0,0 +1,431 @@
+# ARMAZÉM DAS SAÍDAS E ÍNDICE DAS REGIÕES DE CONFLITO
+# Para cada cenário que entra nos resultados, o runner guarda aqui a saída do
+# diff3, a do motor da linguagem e o merge manual. Os três ficam comprimidos e
+# endereçados pelo conteúdo: a mesma saída em cenários diferentes ocupa um só
+# registro. Junto vai um índice com uma linha por região de conflito: faixa
+# de linhas, tamanho de cada lado, os separadores nas bordas da região, o tipo
+# de trecho (import, cabeçalho do módulo, assinatura...) e como o humano a
+# resolveu (ficou com o left, com o right, com os dois ou com outra coisa).
+# Investigar um caso deixa de exigir um novo merge: consultar() responde
+# perguntas como "todos os conflitos em listas de import" pelo índice e
+# saida() devolve o arquivo. Na linha de comando:
+#   python armazem_saidas.py --category import --resolution outra --show
+import os
+import re
+import csv
+import time
+import zlib
+import sqlite3
+import hashlib
+import argparse
+from collections import namedtuple
+from conflitos import regioes_conflito
+from csdiff_nativo import SEPARADORES_PADRAO
+from cache_resultados import CACHE, CacheResultados
+from linguagens import LINGUAGENS, linguagem_do_arquivo, versao_motor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ARMAZEM_FILE = os.path.join(SCRIPT_DIR, "saidas_merge.sqlite")
+
+# Linhas fora de conflito usadas para achar, no merge manual, onde a região foi resolvida
+CONTEXTO_REGIAO = 3
+# Quantas linhas acima da região se procura a cabeça da declaração de que ela faz parte
+LIMITE_DECLARACAO = 50
+
+# Tipo do trecho em conflito: o primeiro padrão que casa com a primeira linha
+# não vazia de um dos lados (ou, se a região continua uma declaração, com a
+# linha que abre a declaração)
+CATEGORIAS = [
+    ("import", re.compile(rb"(import|from\s+\S+\s+import)\b")),
+    ("modulo", re.compile(rb"(module|package|export)\b")),
+    ("assinatura", re.compile(rb"[a-z_][\w']*(\s*,\s*[a-z_][\w']*)*\s*::")),
+    ("tipo", re.compile(rb"(data|newtype|type|class|instance|interface|enum)\b")),
+]
+CATEGORIA_PADRAO = "codigo"
+# Como o merge manual resolveu a região (espaços ignorados); "desconhecida"
+# quando o contexto da região não foi encontrado no manual
+RESOLUCOES = ("left", "right", "left+right", "right+left", "base", "outra", "desconhecida")
+# Saídas guardadas de cada cenário
+SAIDAS = ("diff3", "csdiff", "manual")
+
+_ESPACOS = b" \t\n\r\x0b\x0c"
+# Separadores que abrem uma lista: a linha seguinte continua a mesma declaração
+_ABREM = (b"(", b"[", b"{", b",")
+
+# Uma região indexada. ferramenta: "diff3" ou "csdiff" (o motor da linguagem);
+# inicio/fim: linhas (1-based) do "<<<<<<<" e do ">>>>>>>" na saída;
+# separadores: os da linguagem nas bordas da região, separados por espaço
+Regiao = namedtuple("Regiao", [
+    "repo", "merge", "arquivo", "linguagem", "versao", "ferramenta", "indice", "inicio", "fim",
+    "linhas_left", "linhas_base", "linhas_right", "separadores", "categoria", "resolucao",
+])
+# O que indexar() calcula para cada região, antes de ganhar repositório e versão
+RegiaoIndexada = namedtuple("RegiaoIndexada", [
+    "indice", "inicio", "fim", "linhas_left", "linhas_base", "linhas_right", "separadores", "categoria", "resolucao",
+])
+
+
+def _normalizar(linhas):
+    """As linhas sem espaços, sem as que ficam vazias."""
+    return [n for n in (linha.translate(None, _ESPACOS) for linha in linhas) if n]
+
+
+def _procurar(linhas, trecho, desde):
+    """Primeira posição >= desde em que trecho aparece em linhas, ou None."""
+    if not trecho:
+        return desde
+    primeira, n = trecho[0], len(trecho)
+    try:
+        i = linhas.index(primeira, desde)
+        while True:
+            if linhas[i:i + n] == trecho:
+                return i
+            i = linhas.index(primeira, i + 1)
+    except ValueError:
+        return None
+
+
+def _categoria(lados, anteriores, separadores):
+    for lado in lados:
+        primeira = next((linha.strip() for linha in lado if linha.strip()), None)
+        if primeira is not None:
+            break
+    else:
+        primeira = b""
+    for nome, padrao in CATEGORIAS:
+        if padrao.match(primeira):
+            return nome
+    # Uma região indentada, que começa num separador ou que vem depois de uma
+    # lista aberta continua a declaração de cima: vale a linha que a abre
+    continua = (any(lado and lado[0][:1].isspace() for lado in lados)
+                or any(primeira.startswith(s) for s in separadores)
+                or (anteriores and anteriores[-1].rstrip().endswith(_ABREM)))
+    if not continua:
+        return CATEGORIA_PADRAO
+    for linha in reversed(anteriores[-LIMITE_DECLARACAO:]):
+        if not linha.strip():
+            continue
+        for nome, padrao in CATEGORIAS:
+            if padrao.match(linha.lstrip()):
+                return nome
+        if not linha[:1].isspace():
+            break
+    return CATEGORIA_PADRAO
+
+
+def _separadores(antes, depois, lados, separadores):
+    """Os separadores colados na região: no fim do que vem antes, no início do que vem depois e nas pontas dos lados."""
+    finais = [b"".join(antes).rstrip()] + [b"".join(lado).rstrip() for lado in lados]
+    iniciais = [b"".join(depois).lstrip()] + [b"".join(lado).lstrip() for lado in lados]
+    return " ".join(s.decode() for s in separadores
+                    if any(t.endswith(s) for t in finais) or any(t.startswith(s) for t in iniciais))
+
+
+def _resolucao(manual, antes, depois, left, base, right, desde):
+    """(como o manual resolveu a região, posição no manual para a próxima região)."""
+    antes, depois = _normalizar(antes), _normalizar(depois)
+    inicio = _procurar(manual, antes, desde)
+    if inicio is None:
+        return "desconhecida", desde
+    inicio += len(antes)
+    fim = _procurar(manual, depois, inicio) if depois else len(manual)
+    if fim is None:
+        return "desconhecida", desde
+    resolvido = manual[inicio:fim]
+    left, base, right = _normalizar(left), _normalizar(base), _normalizar(right)
+    for nome, lado in (("left", left), ("right", right), ("left+right", left + right),
+                       ("right+left", right + left), ("base", base)):
+        if resolvido == lado and (lado or nome in ("left", "right")):
+            return nome, fim
+    return "outra", fim
+
+
+def indexar(saida, manual=None, separadores=None):
+    """
+    Uma RegiaoIndexada por região de conflito da saída (bytes). separadores:
+    os da linguagem (None no Haskell-SepMerge, que traz os seus dentro do
+    JAR: valem os do csdiff).
+    """
+    linhas = saida.splitlines(keepends=True)
+    manual = _normalizar(manual.splitlines()) if manual is not None else None
+    separadores = tuple(s.encode() for s in (separadores or SEPARADORES_PADRAO))
+    blocos = list(regioes_conflito(saida))
+    fim_anterior = 0
+    posicao_manual = 0
+    for indice, bloco in enumerate(blocos):
+        i0, i1 = bloco.inicio - 1, bloco.fim - 1
+        left = linhas[i0 + 1:i0 + 1 + bloco.linhas_left]
+        inicio_base = i0 + 2 + bloco.linhas_left
+        base = linhas[inicio_base:inicio_base + bloco.linhas_base] if bloco.linhas_base else []
+        right = linhas[i1 - bloco.linhas_right:i1]
+        proximo = blocos[indice + 1].inicio - 1 if indice + 1 < len(blocos) else len(linhas)
+        anteriores = linhas[fim_anterior:i0]
+        antes = anteriores[-CONTEXTO_REGIAO:]
+        depois = linhas[i1 + 1:min(proximo, i1 + 1 + CONTEXTO_REGIAO)]
+        if manual is None:
+            resolucao = "desconhecida"
+        else:
+            resolucao, posicao_manual = _resolucao(manual, antes, depois, left, base, right, posicao_manual)
+        yield RegiaoIndexada(indice, bloco.inicio, bloco.fim, bloco.linhas_left, bloco.linhas_base,
+                             bloco.linhas_right, _separadores(antes, depois, (left, right), separadores),
+                             _categoria((left, right), anteriores, separadores), resolucao)
+        fim_anterior = i1 + 1
+
+
+class ArmazemSaidas:
+    """
+    Armazém em SQLite (modo WAL, seguro para vários processos; cada processo
+    abre a própria conexão, como o cache de resultados). As saídas são
+    chaveadas como o cache (blobs do cenário + versão do motor). Com
+    ativo=False nada é gravado nem consultado.
+    """
+
+    def __init__(self, caminho=ARMAZEM_FILE, ativo=True):
+        self.caminho = caminho
+        self.ativo = ativo
+        self._conexao = None
+        self._pid = None
+
+    def _conectar(self):
+        if self._conexao is None or self._pid != os.getpid():
+            self._conexao = sqlite3.connect(self.caminho, timeout=60, isolation_level=None)
+            self._pid = os.getpid()
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS conteudos (
+                    hash TEXT PRIMARY KEY,
+                    dados BLOB NOT NULL,
+                    tamanho INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS merges (
+                    chave TEXT PRIMARY KEY,
+                    linguagem TEXT NOT NULL,
+                    versao TEXT NOT NULL,
+                    diff3 TEXT,
+                    csdiff TEXT,
+                    manual TEXT,
+                    criado REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cenarios (
+                    repo TEXT NOT NULL,
+                    merge TEXT NOT NULL,
+                    arquivo TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    PRIMARY KEY (repo, merge, arquivo, chave)
+                );
+                CREATE TABLE IF NOT EXISTS regioes (
+                    chave TEXT NOT NULL,
+                    ferramenta TEXT NOT NULL,
+                    indice INTEGER NOT NULL,
+                    inicio INTEGER NOT NULL,
+                    fim INTEGER NOT NULL,
+                    linhas_left INTEGER NOT NULL,
+                    linhas_base INTEGER NOT NULL,
+                    linhas_right INTEGER NOT NULL,
+                    separadores TEXT NOT NULL,
+                    categoria TEXT NOT NULL,
+                    resolucao TEXT NOT NULL,
+                    PRIMARY KEY (chave, ferramenta, indice)
+                );
+                CREATE INDEX IF NOT EXISTS idx_cenarios_chave ON cenarios (chave);
+                CREATE INDEX IF NOT EXISTS idx_regioes_categoria ON regioes (categoria);
+                CREATE INDEX IF NOT EXISTS idx_regioes_resolucao ON regioes (resolucao);
+            """)
+        return self._conexao
+
+    def tem(self, chave):
+        """Se as saídas do cenário com esta chave já estão guardadas."""
+        linha = self._conectar().execute("SELECT 1 FROM merges WHERE chave = ?", (chave,)).fetchone()
+        return linha is not None
+
+    def _guardar_conteudo(self, conexao, conteudo):
+        if conteudo is None:
+            return None
+        digest = hashlib.sha256(conteudo).hexdigest()
+        if conexao.execute("SELECT 1 FROM conteudos WHERE hash = ?", (digest,)).fetchone() is None:
+            dados = zlib.compress(conteudo)
+            conexao.execute("INSERT INTO conteudos (hash, dados, tamanho) VALUES (?, ?, ?)",
+                            (digest, dados, len(dados)))
+        return digest
+
+    def guardar(self, chave, linguagem, versao, saidas, manual):
+        """
+        Guarda as saídas ({"diff3": bytes, "csdiff": bytes}; None se a
+        ferramenta falhou) e o manual, e indexa as regiões de conflito delas.
+        """
+        if not self.ativo:
+            return
+        conexao = self._conectar()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            hashes = {nome: self._guardar_conteudo(conexao, conteudo)
+                      for nome, conteudo in (*saidas.items(), ("manual", manual))}
+            conexao.execute(
+                "INSERT OR REPLACE INTO merges (chave, linguagem, versao, diff3, csdiff, manual, criado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chave, linguagem.nome, versao, hashes.get("diff3"), hashes.get("csdiff"), hashes["manual"], time.time()))
+            conexao.execute("DELETE FROM regioes WHERE chave = ?", (chave,))
+            for ferramenta, saida in saidas.items():
+                if saida is None:
+                    continue
+                conexao.executemany(
+                    "INSERT INTO regioes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((chave, ferramenta, *regiao) for regiao in indexar(saida, manual, linguagem.separadores)))
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+    def registrar(self, cenario, chave):
+        """Liga o cenário (repositório, merge, arquivo) às saídas guardadas com esta chave."""
+        if not self.ativo:
+            return
+        self._conectar().execute("INSERT OR IGNORE INTO cenarios (repo, merge, arquivo, chave) VALUES (?, ?, ?, ?)",
+                                 (cenario.repo, cenario.merge, cenario.arquivo, chave))
+
+    def _conteudo(self, digest):
+        if digest is None:
+            return None
+        linha = self._conectar().execute("SELECT dados FROM conteudos WHERE hash = ?", (digest,)).fetchone()
+        return None if linha is None else zlib.decompress(linha[0])
+
+    def saida_da_chave(self, chave, ferramenta="csdiff"):
+        """A saída (bytes) da ferramenta ("diff3", "csdiff" ou "manual") guardada com esta chave, ou None."""
+        if not self.ativo:
+            return None
+        linha = self._conectar().execute(f"SELECT {_coluna(ferramenta)} FROM merges WHERE chave = ?",
+                                         (chave,)).fetchone()
+        return None if linha is None else self._conteudo(linha[0])
+
+    def saida(self, repo, merge, arquivo, ferramenta="csdiff", versao=None):
+        """
+        A saída (bytes) da ferramenta no cenário (o merge pode vir abreviado),
+        na versão informada (prefixo do hash) ou na mais recente; None se não há.
+        """
+        sql = (f"SELECT m.{_coluna(ferramenta)} FROM cenarios c JOIN merges m ON m.chave = c.chave "
+               "WHERE c.repo = ? AND c.merge LIKE ? AND c.arquivo = ? AND m.versao LIKE ? ORDER BY m.criado DESC")
+        linha = self._conectar().execute(sql, (repo, merge + "%", arquivo, (versao or "") + "%")).fetchone()
+        return None if linha is None else self._conteudo(linha[0])
+
+    def consultar(self, categoria=None, separador=None, resolucao=None, ferramenta="csdiff", repo=None,
+                  linguagem=None, versao=None, min_linhas=None):
+        """
+        As Regiao que atendem a todos os filtros informados (None: qualquer
+        valor). separador: um dos separadores nas bordas; versao: prefixo do
+        hash do motor; min_linhas: mínimo de linhas somando left e right.
+        """
+        filtros = [
+            ("r.categoria = ?", categoria),
+            ("instr(' ' || r.separadores || ' ', ?) > 0", None if separador is None else f" {separador} "),
+            ("r.resolucao = ?", resolucao),
+            ("r.ferramenta = ?", ferramenta),
+            ("c.repo = ?", repo),
+            ("m.linguagem = ?", linguagem),
+            ("m.versao LIKE ?", None if versao is None else versao + "%"),
+            ("r.linhas_left + r.linhas_right >= ?", min_linhas),
+        ]
+        condicoes = [condicao for condicao, valor in filtros if valor is not None]
+        parametros = [valor for _, valor in filtros if valor is not None]
+        sql = ("SELECT c.repo, c.merge, c.arquivo, m.linguagem, m.versao, r.ferramenta, r.indice, r.inicio, r.fim, "
+               "r.linhas_left, r.linhas_base, r.linhas_right, r.separadores, r.categoria, r.resolucao "
+               "FROM regioes r JOIN merges m ON m.chave = r.chave JOIN cenarios c ON c.chave = r.chave"
+               + (" WHERE " + " AND ".join(condicoes) if condicoes else "")
+               + " ORDER BY c.repo, c.merge, c.arquivo, m.criado, r.ferramenta, r.indice")
+        for linha in self._conectar().execute(sql, parametros):
+            yield Regiao(*linha)
+
+    def trecho(self, regiao):
+        """As linhas da região (do "<<<<<<<" ao ">>>>>>>") na saída guardada."""
+        saida = self.saida(regiao.repo, regiao.merge, regiao.arquivo, regiao.ferramenta, regiao.versao)
+        if saida is None:
+            return None
+        return b"".join(saida.splitlines(keepends=True)[regiao.inicio - 1:regiao.fim])
+
+    def close(self):
+        if self._conexao is not None and self._pid == os.getpid():
+            self._conexao.close()
+        self._conexao = None
+
+
+# Muda quando o cálculo das métricas muda: entra na chave do cache junto com a
+# versão da ferramenta (2: conflitos contados por bloco ancorado na linha)
+VERSAO_METRICAS = 2
+
+# Armazém do processo (desligado com o --no-store do runner)
+ARMAZEM = ArmazemSaidas()
+
+
+def chave_cenario(oids, linguagem=None):
+    """
+    Chave dos blobs (base, left, right, manual) com o motor atual da
+    linguagem (padrão: Haskell), a mesma no cache de resultados e no armazém.
+    """
+    return CacheResultados.chave(f"cenario:{VERSAO_METRICAS}", list(oids),
+                                 versao_motor(linguagem or LINGUAGENS["haskell"]))
+
+
+def saida_registrada(oids, caminho):
+    """
+    Saída do motor de merge que uma rodada anterior guardou no armazém de
+    saídas para estes blobs do arquivo (com a mesma versão do motor), ou None.
+    """
+    linguagem = linguagem_do_arquivo(caminho)
+    if linguagem is None:
+        return None
+    try:
+        chave = chave_cenario(oids, linguagem)
+    except FileNotFoundError:
+        return None  # sem o JAR não há versão da ferramenta para comparar
+    saida = ARMAZEM.saida_da_chave(chave)
+    if saida is not None:
+        # A saída pode não ser UTF-8 (arquivo em Latin-1 etc.)
+        return saida.decode("utf-8", errors="replace")
+    # O texto só fica no armazém; entradas antigas do cache ainda o trazem junto das métricas
+    metricas = CACHE.obter(chave)
+    return metricas.get("saida_csdiff") if metricas else None
+
+
+def _coluna(ferramenta):
+    if ferramenta not in SAIDAS:
+        raise ValueError(f"Saída desconhecida: {ferramenta} (opções: {', '.join(SAIDAS)})")
+    return ferramenta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consulta o índice das regiões de conflito guardado pelo experiment_runner_final.py.")
+    parser.add_argument("--store", default=ARMAZEM_FILE, metavar="ARQUIVO",
+                        help="Armazém das saídas (padrão: saidas_merge.sqlite ao lado dos scripts)")
+    parser.add_argument("--category", choices=[nome for nome, _ in CATEGORIAS] + [CATEGORIA_PADRAO],
+                        help="Tipo do trecho em conflito")
+    parser.add_argument("--separator", help="Um separador nas bordas da região")
+    parser.add_argument("--resolution", choices=RESOLUCOES, help="Como o merge manual resolveu a região")
+    parser.add_argument("--tool", choices=["diff3", "csdiff"], default="csdiff",
+                        help="Regiões da saída do diff3 ou do motor da linguagem (padrão: csdiff)")
+    parser.add_argument("--repo", help="Só este repositório")
+    parser.add_argument("--language", help="Só esta linguagem")
+    parser.add_argument("--tool-version", metavar="PREFIXO", help="Só esta versão do motor (prefixo do hash)")
+    parser.add_argument("--min-lines", type=int, metavar="N", help="Regiões com pelo menos N linhas (left + right)")
+    parser.add_argument("--show", action="store_true", help="Imprime o trecho de cada região")
+    parser.add_argument("--csv", metavar="ARQUIVO", help="Grava as regiões encontradas neste CSV")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.store):
+        print(f"[ERRO] Armazém não encontrado: {args.store}")
+    else:
+        armazem = ArmazemSaidas(args.store)
+        regioes = list(armazem.consultar(args.category, args.separator, args.resolution, args.tool, args.repo,
+                                         args.language, args.tool_version, args.min_lines))
+        for regiao in regioes:
+            print(f"{regiao.repo} {regiao.merge[:7]} {regiao.arquivo} L{regiao.inicio}-{regiao.fim} "
+                  f"({regiao.linhas_left}/{regiao.linhas_right} linhas) {regiao.categoria} "
+                  f"[{regiao.separadores}] {regiao.resolucao}")
+            if args.show:
+                print((armazem.trecho(regiao) or b"").decode("utf-8", errors="replace"))
+        print(f"{len(regioes)} região(ões) encontrada(s)")
+        if args.csv:
+            with open(args.csv, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(Regiao._fields)
+                writer.writerows(regioes)
+            print(f"Regiões salvas em: {args.csv}")
@@ -0,0 +1,124 @@
+# ORQUESTRAÇÃO ASSÍNCRONA DAS FERRAMENTAS
+# Modo --async do runner: um só processo com um laço do asyncio em que vários
+# cenários avançam ao mesmo tempo. Enquanto um cenário espera o diff3, outro
+# lê os seus blobs e um terceiro valida uma saída no GHCi. Cada tipo de
+# ferramenta tem o seu semáforo (--async-limit TIPO=N). As ferramentas
+# persistentes (servidor do Haskell-SepMerge, sessões do GHCi) atendem uma
+# requisição por vez, então ficam num pool com um processo por vaga do
+# semáforo. As leituras do git continuam no cat-file --batch de cada
+# repositório, numa thread e uma de cada vez por repositório (o protocolo é
+# sequencial); o csdiff das outras linguagens, em Python, roda numa thread.
+import os
+import shutil
+import asyncio
+from contextlib import asynccontextmanager
+from sepmerge_cliente import ClienteSepMergeAsync
+from validacao_sintaxe import SessaoGhciAsync, ResultadoSintaxe, VALIDADORES
+from linguagens import mesclar
+
+_CPUS = os.cpu_count() or 1
+
+# Chamadas simultâneas de cada tipo. "cenarios" é quantos cenários ficam em voo;
+# "sepmerge" e "ghc" também são quantas JVMs e sessões do GHCi ficam abertas
+LIMITES_PADRAO = {
+    "cenarios": 4 * _CPUS,
+    "git": 2,
+    "diff3": _CPUS,
+    "sepmerge": max(1, _CPUS // 2),
+    "csdiff": 1,
+    "ghc": max(1, _CPUS // 2),
+    "validador": _CPUS,
+}
+
+
+def ler_limites(especificacoes):
+    """Os limites padrão com os 'TIPO=N' informados (ValueError se algum é inválido)."""
+    limites = dict(LIMITES_PADRAO)
+    for especificacao in especificacoes or ():
+        tipo, _, valor = especificacao.partition("=")
+        if tipo not in limites or not valor.isdigit() or int(valor) < 1:
+            raise ValueError(f"Limite inválido: '{especificacao}' (tipos: {', '.join(limites)})")
+        limites[tipo] = int(valor)
+    return limites
+
+
+class Pool:
+    """Até 'tamanho' processos persistentes, criados sob demanda e emprestados a uma tarefa por vez."""
+
+    def __init__(self, criar, tamanho):
+        self._criar = criar
+        self._semaforo = asyncio.Semaphore(tamanho)
+        self._livres = []
+        self._todos = []
+
+    @asynccontextmanager
+    async def usar(self):
+        async with self._semaforo:
+            if self._livres:
+                recurso = self._livres.pop()
+            else:
+                recurso = self._criar()
+                self._todos.append(recurso)
+            try:
+                yield recurso
+            finally:
+                self._livres.append(recurso)
+
+    async def fechar(self):
+        for recurso in self._todos:
+            await recurso.close()
+        self._livres = []
+        self._todos = []
+
+
+class Orquestrador:
+    """As ferramentas do modo assíncrono, cada tipo atrás do seu semáforo ou pool."""
+
+    def __init__(self, limites=None):
+        self.limites = limites or dict(LIMITES_PADRAO)
+        self._semaforos = {tipo: asyncio.Semaphore(self.limites[tipo]) for tipo in ("git", "diff3", "csdiff", "validador")}
+        self._servidores = Pool(ClienteSepMergeAsync, self.limites["sepmerge"])
+        self._sessoes_ghc = Pool(SessaoGhciAsync, self.limites["ghc"])
+        self._travas = {}
+
+    def _trava(self, repositorio):
+        return self._travas.setdefault(repositorio.nome, asyncio.Lock())
+
+    async def ler_blobs(self, repositorio, oids, limite_bytes=None):
+        """Repositorio.ler_blobs numa thread, uma leitura por vez em cada repositório."""
+        async with self._semaforos["git"], self._trava(repositorio):
+            return await asyncio.to_thread(repositorio.ler_blobs, oids, limite_bytes)
+
+    async def limpar_cache(self, repositorio):
+        # O cache de blobs é um só para todos os repositórios e tem a sua própria
+        # trava (ver CacheBlobs): leituras de outros repositórios podem estar em curso
+        repositorio.cache.limpar()
+
+    async def diff3(self, cenario_merge):
+        async with self._semaforos["diff3"]:
+            return await cenario_merge.diff3_async()
+
+    async def mesclar(self, linguagem, cenario_merge):
+        """Saída (bytes) do motor da linguagem, como linguagens.mesclar."""
+        if linguagem.motor == "sepmerge":
+            async with self._servidores.usar() as cliente:
+                return await cenario_merge.sepmerge_async(cliente)
+        async with self._semaforos["csdiff"]:
+            return await asyncio.to_thread(mesclar, linguagem, cenario_merge)
+
+    async def validar(self, arquivo, validador="ghc"):
+        """validacao_sintaxe.validar_lote para um arquivo, sem bloquear o laço de eventos."""
+        if validador == "ghc":
+            if shutil.which("ghc") is None:
+                return ResultadoSintaxe(arquivo, True, None, None, None, None)
+            async with self._sessoes_ghc.usar() as sessao:
+                return await sessao.validar(arquivo)
+        outro = VALIDADORES[validador]
+        if not outro.disponivel():
+            return ResultadoSintaxe(arquivo, True, None, None, None, None)
+        async with self._semaforos["validador"]:
+            return await outro.validar_async(arquivo)
+
+    async def fechar(self):
+        await self._servidores.fechar()
+        await self._sessoes_ghc.fechar()
@@ -0,0 +1,397 @@
+# BENCHMARK DAS FERRAMENTAS DE MERGE
+# Congela um corpus de cenários (os listados nos CSVs de resultados) num
+# diretório local e mede cada motor de merge sobre ele: vazão (cenários/s),
+# percentis de latência, pico de memória (RSS) e as colunas de acurácia
+# (conflitos, ParseOK, Equals_Manual). Tudo roda offline: o congelamento lê
+# só os repositórios que já estão em REPOS_DIR e a medição lê só o corpus.
+#
+#   python benchmark.py freeze --csv casos_sucesso_absoluto.csv resultados_com_validacao_total.csv
+#   python benchmark.py run --output bench.json [--baseline bench_anterior.json --threshold 0.10]
+#   python benchmark.py compare bench.json bench_anterior.json
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import resource
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from cenario import CenarioMerge, ROTULOS, arquivos_em_memoria
+from repositorios import GerenciadorRepositorios, REPOS_DIR
+from diff3_nativo import diff3_merge
+from csdiff_nativo import csdiff_merge
+from sepmerge_cliente import obter_cliente, fechar_clientes, HASKELL_SEPMERGE_JAR
+from validacao_sintaxe import validar_lote, fechar_sessoes
+from resultados import carregar_resultados
+from instrumentacao import percentil
+from linguagens import LINGUAGENS, linguagem_do_arquivo
+from execucao import executar, FalhaFerramenta, adicionar_argumentos, aplicar_argumentos
+from conflitos import contar_conflitos, iguais_sem_espacos, CONFLITOS_FALHA
+
+# --- CONFIGURAÇÕES ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CSDIFF_SCRIPT = os.path.join(SCRIPT_DIR, "../csdiff/csdiff.sh")
+CORPUS_DIR = os.path.join(SCRIPT_DIR, "bench_corpus")
+CSVS_PADRAO = ["casos_sucesso_absoluto.csv", "resultados_com_validacao_total.csv"]
+
+AQUECIMENTO = 1
+REPETICOES = 3
+# Queda de vazão tolerada em relação ao baseline (10%)
+LIMITE_REGRESSAO = 0.10
+
+_ROTULOS_MERGE = (ROTULOS["left"], ROTULOS["base"], ROTULOS["right"])
+
+
+def _csdiff_script(cenario):
+    # O csdiff.sh recebe "left base right" e cria arquivos ao lado das entradas
+    # e no diretório corrente: roda num diretório privado do tmpfs
+    conteudos = {ROTULOS["left"]: cenario.left, ROTULOS["base"]: cenario.base, ROTULOS["right"]: cenario.right}
+    with arquivos_em_memoria(conteudos) as caminhos:
+        res = executar(["bash", os.path.abspath(CSDIFF_SCRIPT), *_ROTULOS_MERGE], "csdiff.sh",
+                       cwd=os.path.dirname(caminhos[ROTULOS["base"]]), codigos_ok=None)
+    return res.stdout
+
+
+# Motor -> (função cenário -> saída em bytes, executáveis necessários)
+MOTORES = {
+    "diff3": (lambda c: c.diff3(), ["diff3"]),
+    "diff3_nativo": (lambda c: diff3_merge(c.left, c.base, c.right, _ROTULOS_MERGE)[0], []),
+    "csdiff.sh": (_csdiff_script, ["bash", "sed", "diff3"]),
+    "csdiff_nativo": (lambda c: csdiff_merge(c.left, c.base, c.right, rotulos=_ROTULOS_MERGE), []),
+    "sepmerge": (lambda c: c.sepmerge(obter_cliente(HASKELL_SEPMERGE_JAR)), ["java"]),
+}
+
+# Colunas do CSV que registram a rodada original de cada motor (para apontar divergências)
+_PREFIXO_CSV = {"diff3": "Diff3", "sepmerge": "CSDiff"}
+
+
+def motor_disponivel(nome):
+    faltando = [exe for exe in MOTORES[nome][1] if shutil.which(exe) is None]
+    if nome == "sepmerge" and not os.path.exists(HASKELL_SEPMERGE_JAR):
+        faltando.append(HASKELL_SEPMERGE_JAR)
+    if nome == "csdiff.sh" and not os.path.exists(CSDIFF_SCRIPT):
+        faltando.append(CSDIFF_SCRIPT)
+    return faltando
+
+
+# --- CONGELAMENTO DO CORPUS ---
+
+def congelar(csvs, destino=CORPUS_DIR, repos_dir=REPOS_DIR):
+    """
+    Lê os cenários (Repo, MergeCommit, File) dos CSVs, busca os quatro blobs de
+    cada um nos repositórios de repos_dir e grava tudo em destino: os blobs em blobs/<oid>
+    (um arquivo por conteúdo, sem repetição) e a lista de casos, com os valores
+    registrados no CSV, em manifesto.json.
+    """
+    casos = {}
+    for caminho_csv in csvs:
+        df = carregar_resultados(caminho_csv)
+        for row in df.to_dict("records"):
+            chave = (row["Repo"], row["MergeCommit"], row["File"])
+            if chave not in casos:
+                casos[chave] = {col: _valor_json(v) for col, v in row.items()}
+
+    os.makedirs(os.path.join(destino, "blobs"), exist_ok=True)
+    manifesto = {"criado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "fontes": [os.path.basename(c) for c in csvs], "casos": []}
+    por_repo = {}
+    for chave in casos:
+        por_repo.setdefault(chave[0], []).append(chave)
+
+    repositorios = GerenciadorRepositorios(repos_dir)
+    for repo_name, chaves in por_repo.items():
+        if not repositorios.existe(repo_name):
+            print(f"  [SKIP] {repo_name}: repositório não encontrado em {repos_dir} ({len(chaves)} casos)")
+            continue
+        repositorio = repositorios.abrir(repo_name)
+        for repo, merge, arquivo in chaves:
+            try:
+                caso = _congelar_caso(repositorio, destino, repo, merge, arquivo)
+            except KeyError:
+                print(f"  [SKIP] {repo} {merge} {arquivo}: commit ou arquivo não encontrado")
+                continue
+            caso["esperado"] = casos[(repo, merge, arquivo)]
+            manifesto["casos"].append(caso)
+    repositorios.fechar()
+
+    with open(os.path.join(destino, "manifesto.json"), "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    print(f"Corpus congelado em '{destino}': {len(manifesto['casos'])} casos de {len(casos)}")
+    if not manifesto["casos"]:
+        print("  [AVISO] Nenhum caso congelado: o 'run' sobre este corpus não terá o que medir")
+    return manifesto
+
+
+def _valor_json(valor):
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def _congelar_caso(repositorio, destino, repo, merge, arquivo):
+    # O hash curto do CSV basta: o cat-file resolve o commit
+    oids = repositorio.oids_do_merge(merge, arquivo)
+    if None in oids:
+        raise KeyError(arquivo)
+    for oid, conteudo in zip(oids, repositorio.ler_blobs(oids)):
+        caminho = os.path.join(destino, "blobs", oid)
+        if not os.path.exists(caminho):
+            with open(caminho, "wb") as f:
+                f.write(conteudo)
+    return {"id": f"{repo}_{merge}_{arquivo}", "repo": repo, "merge": merge, "arquivo": arquivo,
+            "oids": dict(zip(["base", "left", "right", "manual"], oids))}
+
+
+def carregar_corpus(diretorio=CORPUS_DIR):
+    """Manifesto e os cenários (CenarioMerge) do corpus congelado."""
+    with open(os.path.join(diretorio, "manifesto.json"), encoding="utf-8") as f:
+        manifesto = json.load(f)
+    blobs = {}
+
+    def ler(oid):
+        if oid not in blobs:
+            with open(os.path.join(diretorio, "blobs", oid), "rb") as f:
+                blobs[oid] = f.read()
+        return blobs[oid]
+
+    cenarios = [CenarioMerge(*(ler(caso["oids"][v]) for v in ("base", "left", "right", "manual")))
+                for caso in manifesto["casos"]]
+    return manifesto, cenarios
+
+
+def assinatura_corpus(manifesto):
+    """Hash dos casos e conteúdos: dois relatórios só são comparáveis se ela bater."""
+    h = hashlib.sha256()
+    for caso in manifesto["casos"]:
+        h.update(json.dumps([caso["id"], caso["oids"]], sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+# --- MEDIÇÃO ---
+
+def medir_motor(nome, diretorio, aquecimento=AQUECIMENTO, repeticoes=REPETICOES, sintaxe=False):
+    """
+    Roda num processo próprio (o pico de RSS é só deste motor): aquecimento
+    sem medir, depois as repetições cronometradas cenário a cenário. A
+    acurácia é calculada sobre as saídas da última repetição, fora do tempo.
+    """
+    manifesto, cenarios = carregar_corpus(diretorio)
+    merge = MOTORES[nome][0]
+
+    def motor(cenario):
+        # Uma falha (TIMEOUT, OOM, CRASH) não interrompe a medição: a saída fica None
+        try:
+            return merge(cenario)
+        except FalhaFerramenta:
+            return None
+
+    for _ in range(aquecimento):
+        for cenario in cenarios:
+            motor(cenario)
+
+    latencias = []
+    vazoes = []
+    for _ in range(repeticoes):
+        saidas = []
+        inicio = time.perf_counter()
+        for cenario in cenarios:
+            t0 = time.perf_counter()
+            saidas.append(motor(cenario))
+            latencias.append(time.perf_counter() - t0)
+        vazoes.append(len(cenarios) / (time.perf_counter() - inicio))
+
+    resultado = {
+        "cenarios": len(cenarios),
+        "cenarios_por_s": percentil(sorted(vazoes), 50),
+        "cenarios_por_s_min": min(vazoes),
+        "cenarios_por_s_max": max(vazoes),
+    }
+    ordenadas = sorted(latencias)
+    for p in (50, 90, 99):
+        resultado[f"p{p}_ms"] = 1000 * percentil(ordenadas, p)
+    resultado["max_ms"] = 1000 * ordenadas[-1]
+    # ru_maxrss está em KiB no Linux. Os servidores persistentes (a JVM do
+    # sepmerge) ainda estão vivos aqui: o pico deles vem do /proc
+    resultado["pico_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    resultado["pico_rss_filhos_mb"] = _pico_rss_filhos_vivos()
+    resultado.update(_acuracia(nome, manifesto["casos"], cenarios, saidas, sintaxe))
+    fechar_clientes()
+    fechar_sessoes()
+    return resultado
+
+
+def _pico_rss_filhos_vivos():
+    """
+    Maior VmHWM (MB) entre os processos filhos ainda vivos, ou None sem /proc.
+    O RUSAGE_CHILDREN não serve: um filho criado por fork começa com o RSS do
+    Python e isso esconde o consumo real de ferramentas pequenas (diff3, sed).
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    pico = 0
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            if ppid != os.getpid():
+                continue
+            with open(f"/proc/{pid}/status") as f:
+                for linha in f:
+                    if linha.startswith("VmHWM:"):
+                        pico = max(pico, int(linha.split()[1]))
+        except (OSError, IndexError, ValueError):
+            continue  # o processo terminou no meio da leitura
+    return pico / 1024
+
+
+def _acuracia(nome, casos, cenarios, saidas, sintaxe):
+    # Saídas de merges que falharam contam -1 conflitos, como nos resultados da mineração
+    conflitos = [CONFLITOS_FALHA if saida is None else contar_conflitos(saida) for saida in saidas]
+    iguais = sum(saida is not None and iguais_sem_espacos(saida, c.manual) for saida, c in zip(saidas, cenarios))
+    acuracia = {
+        "conflitos": sum(n for n in conflitos if n > 0),
+        "com_conflito": sum(1 for n in conflitos if n > 0),
+        "iguais_ao_manual": iguais,
+        "falhas": sum(1 for saida in saidas if saida is None),
+        "parse_ok": None,
+    }
+    if sintaxe:
+        # Como na mineração: só as saídas sem marcadores de conflito são validadas,
+        # cada uma com a extensão e o validador da linguagem do arquivo do caso
+        por_validador = {}
+        for i, (caso, saida, n) in enumerate(zip(casos, saidas, conflitos)):
+            if n == 0:
+                linguagem = linguagem_do_arquivo(caso["arquivo"]) or LINGUAGENS["haskell"]
+                por_validador.setdefault(linguagem.validador, {})[f"saida_{i}{linguagem.extensoes[0]}"] = saida
+        acuracia["parse_ok"] = 0
+        for validador, sem_conflito in por_validador.items():
+            with arquivos_em_memoria(sem_conflito) as caminhos:
+                acuracia["parse_ok"] += sum(r.ok for r in validar_lote(list(caminhos.values()), validador))
+    prefixo = _PREFIXO_CSV.get(nome)
+    if prefixo:
+        # Cenários em que a contagem de conflitos mudou desde a rodada que gerou o CSV
+        acuracia["divergencias_csv"] = sum(
+            1 for caso, n in zip(casos, conflitos) if caso["esperado"].get(f"{prefixo}_Conflict") != n)
+    return acuracia
+
+
+def rodar(diretorio=CORPUS_DIR, motores=None, aquecimento=AQUECIMENTO, repeticoes=REPETICOES, sintaxe=False):
+    manifesto, _ = carregar_corpus(diretorio)
+    if not manifesto["casos"]:
+        # Sem cenários não há vazão nem percentis para medir
+        raise ValueError(f"Corpus vazio em '{diretorio}': rode o freeze com os repositórios dos casos presentes (--repos)")
+    relatorio = {
+        "inicio": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": {"diretorio": os.path.abspath(diretorio), "casos": len(manifesto["casos"]),
+                   "assinatura": assinatura_corpus(manifesto)},
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(),
+                     "cpus": os.cpu_count()},
+        "parametros": {"aquecimento": aquecimento, "repeticoes": repeticoes, "sintaxe": sintaxe},
+        "motores": {},
+    }
+    for nome in motores or MOTORES:
+        faltando = motor_disponivel(nome)
+        if faltando:
+            print(f"  [SKIP] {nome}: não encontrado(s): {', '.join(faltando)}")
+            continue
+        print(f"  -> Medindo {nome}...")
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            relatorio["motores"][nome] = pool.submit(
+                medir_motor, nome, diretorio, aquecimento, repeticoes, sintaxe).result()
+    return relatorio
+
+
+def comparar(atual, baseline, limite=LIMITE_REGRESSAO):
+    """Motores cuja vazão caiu mais que o limite: [(motor, vazão baseline, vazão atual)]."""
+    if atual["corpus"]["assinatura"] != baseline["corpus"]["assinatura"]:
+        print("[AVISO] O baseline foi medido sobre outro corpus; a comparação pode não ser justa.")
+    regressoes = []
+    for nome, medida in baseline["motores"].items():
+        if nome not in atual["motores"]:
+            print(f"[AVISO] {nome} está no baseline mas não foi medido agora.")
+            continue
+        antes = medida["cenarios_por_s"]
+        agora = atual["motores"][nome]["cenarios_por_s"]
+        variacao = (agora - antes) / antes
+        marca = "REGRESSÃO" if variacao < -limite else "ok"
+        print(f"  {nome:<16}{antes:>10.1f} -> {agora:>10.1f} cenários/s ({100 * variacao:+.1f}%)  {marca}")
+        if variacao < -limite:
+            regressoes.append((nome, antes, agora))
+    return regressoes
+
+
+def imprimir_relatorio(relatorio):
+    print("=" * 128)
+    print(f" BENCHMARK: {relatorio['corpus']['casos']} cenários, "
+          f"{relatorio['parametros']['repeticoes']} repetições (corpus {relatorio['corpus']['assinatura']})")
+    print("=" * 128)
+    print(f"{'Motor':<16}{'Cen/s':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'RSS':>9}{'RSS servidor':>14}"
+          f"{'Conflitos':>11}{'Com conf.':>11}{'=Manual':>9}{'ParseOK':>9}{'Falhas':>8}")
+    print("-" * 128)
+    for nome, m in relatorio["motores"].items():
+        parse_ok = "-" if m["parse_ok"] is None else m["parse_ok"]
+        filhos = f"{m['pico_rss_filhos_mb']:.0f}MB" if m["pico_rss_filhos_mb"] else "-"
+        print(f"{nome:<16}{m['cenarios_por_s']:>9.1f}{m['p50_ms']:>8.1f}ms{m['p90_ms']:>8.1f}ms{m['p99_ms']:>8.1f}ms"
+              f"{m['pico_rss_mb']:>7.0f}MB{filhos:>14}"
+              f"{m['conflitos']:>11}{m['com_conflito']:>11}{m['iguais_ao_manual']:>9}{parse_ok:>9}{m.get('falhas', 0):>8}")
+    print("=" * 128)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline dos motores de merge sobre um corpus congelado.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_freeze = sub.add_parser("freeze", help="Congela os cenários dos CSVs num corpus local")
+    p_freeze.add_argument("--csv", nargs="+", default=CSVS_PADRAO, help="CSVs com as colunas Repo, MergeCommit e File")
+    p_freeze.add_argument("--corpus", default=CORPUS_DIR, help="Diretório do corpus")
+    p_freeze.add_argument("--repos", default=REPOS_DIR, help="Diretório com os repositórios (padrão: o compartilhado)")
+
+    p_run = sub.add_parser("run", help="Mede os motores sobre o corpus")
+    p_run.add_argument("--corpus", default=CORPUS_DIR, help="Diretório do corpus")
+    p_run.add_argument("--engines", nargs="+", choices=list(MOTORES), help="Motores a medir (padrão: todos)")
+    p_run.add_argument("--warmup", type=int, default=AQUECIMENTO, help="Passadas de aquecimento (não medidas)")
+    p_run.add_argument("--repeat", type=int, default=REPETICOES, help="Repetições medidas")
+    p_run.add_argument("--syntax", action="store_true", help="Valida a sintaxe das saídas sem conflito (com o validador da linguagem de cada caso)")
+    adicionar_argumentos(p_run)
+    p_run.add_argument("--output", metavar="ARQUIVO_JSON", help="Grava o relatório neste JSON")
+    p_run.add_argument("--baseline", metavar="ARQUIVO_JSON", help="Compara a vazão com um relatório anterior")
+    p_run.add_argument("--threshold", type=float, default=LIMITE_REGRESSAO,
+                       help="Queda de vazão tolerada (fração; padrão: 0.10)")
+
+    p_compare = sub.add_parser("compare", help="Compara dois relatórios já gravados")
+    p_compare.add_argument("atual")
+    p_compare.add_argument("baseline")
+    p_compare.add_argument("--threshold", type=float, default=LIMITE_REGRESSAO,
+                           help="Queda de vazão tolerada (fração; padrão: 0.10)")
+    args = parser.parse_args()
+
+    if args.comando == "freeze":
+        congelar(args.csv, args.corpus, args.repos)
+        sys.exit(0)
+
+    if args.comando == "run":
+        aplicar_argumentos(args)
+        try:
+            atual = rodar(args.corpus, args.engines, args.warmup, args.repeat, args.syntax)
+        except ValueError as e:
+            print(f"[ERRO] {e}")
+            sys.exit(1)
+        imprimir_relatorio(atual)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(atual, f, indent=2, ensure_ascii=False)
+            print(f"Relatório salvo em: {args.output}")
+        baseline = args.baseline
+    else:
+        with open(args.atual, encoding="utf-8") as f:
+            atual = json.load(f)
+        baseline = args.baseline
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            referencia = json.load(f)
+        regressoes = comparar(atual, referencia, args.threshold)
+        if regressoes:
+            print(f"[FALHA] {len(regressoes)} motor(es) com vazão abaixo do limite de {100 * args.threshold:.0f}%")
+            sys.exit(1)
+        print("Sem regressões de vazão.")
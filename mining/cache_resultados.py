@@ -0,0 +1,123 @@
+# CACHE DE RESULTADOS ENDEREÇADO POR CONTEÚDO
+# Guarda, num SQLite ao lado dos scripts, o resultado de cada cenário já
+# processado. A chave são os OIDs dos blobs (base, left, right, manual) mais
+# o hash da ferramenta de merge: o mesmo trio de blobs em merges diferentes
+# (ou numa nova rodada com a mesma ferramenta) nunca é recalculado.
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(SCRIPT_DIR, "cache_resultados.sqlite")
+
+# Tamanho máximo (bytes comprimidos) antes de remover as entradas menos usadas
+LIMITE_PADRAO = 2 * 1024 ** 3
+# A verificação do tamanho total é feita a cada N escritas
+_VERIFICAR_A_CADA = 200
+
+
+def hash_ferramenta(*caminhos):
+    """Hash (sha256) do conteúdo dos arquivos que definem a versão da ferramenta."""
+    h = hashlib.sha256()
+    for caminho in caminhos:
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloco)
+    return h.hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache em SQLite (modo WAL, seguro para vários processos). Cada processo
+    abre a própria conexão na primeira consulta. Com ativo=False todas as
+    consultas erram e nada é gravado (equivale ao --no-cache).
+    """
+
+    def __init__(self, caminho=CACHE_FILE, limite_bytes=LIMITE_PADRAO, ativo=True):
+        self.caminho = caminho
+        self.limite_bytes = limite_bytes
+        self.ativo = ativo
+        self._conexao = None
+        self._pid = None
+        self._escritas = 0
+
+    def _conectar(self):
+        if self._conexao is None or self._pid != os.getpid():
+            self._conexao = sqlite3.connect(self.caminho, timeout=60, isolation_level=None)
+            self._pid = os.getpid()
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    chave TEXT PRIMARY KEY,
+                    ferramenta TEXT NOT NULL,
+                    valor BLOB NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    ultimo_acesso REAL NOT NULL
+                )""")
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_ferramenta ON resultados (ferramenta)")
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_acesso ON resultados (ultimo_acesso)")
+        return self._conexao
+
+    @staticmethod
+    def chave(tipo, oids, ferramenta):
+        """Chave do cenário: tipo de resultado + OIDs dos blobs + versão da ferramenta."""
+        return hashlib.sha256("|".join([tipo, *oids, ferramenta]).encode()).hexdigest()
+
+    def obter(self, chave):
+        if not self.ativo:
+            return None
+        conexao = self._conectar()
+        linha = conexao.execute("SELECT valor FROM resultados WHERE chave = ?", (chave,)).fetchone()
+        if linha is None:
+            return None
+        conexao.execute("UPDATE resultados SET ultimo_acesso = ? WHERE chave = ?", (time.time(), chave))
+        return json.loads(zlib.decompress(linha[0]))
+
+    def guardar(self, chave, ferramenta, valor):
+        if not self.ativo:
+            return
+        dados = zlib.compress(json.dumps(valor).encode("utf-8"))
+        conexao = self._conectar()
+        conexao.execute(
+            "INSERT OR REPLACE INTO resultados (chave, ferramenta, valor, tamanho, ultimo_acesso) VALUES (?, ?, ?, ?, ?)",
+            (chave, ferramenta, dados, len(dados), time.time()))
+        self._escritas += 1
+        if self._escritas % _VERIFICAR_A_CADA == 0:
+            self.aplicar_limite()
+
+    def aplicar_limite(self):
+        """Remove as entradas acessadas há mais tempo até caber no limite."""
+        conexao = self._conectar()
+        total = conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM resultados").fetchone()[0]
+        if total <= self.limite_bytes:
+            return 0
+        excesso = total - self.limite_bytes
+        removidas = 0
+        for chave, tamanho in conexao.execute(
+                "SELECT chave, tamanho FROM resultados ORDER BY ultimo_acesso").fetchall():
+            if excesso <= 0:
+                break
+            conexao.execute("DELETE FROM resultados WHERE chave = ?", (chave,))
+            excesso -= tamanho
+            removidas += 1
+        return removidas
+
+    def invalidar_ferramenta(self, ferramenta):
+        """Apaga todas as entradas de uma versão da ferramenta (aceita prefixo do hash)."""
+        conexao = self._conectar()
+        cursor = conexao.execute("DELETE FROM resultados WHERE ferramenta LIKE ?", (ferramenta + "%",))
+        return cursor.rowcount
+
+    def close(self):
+        if self._conexao is not None and self._pid == os.getpid():
+            self._conexao.close()
+        self._conexao = None
+
+
+# Cache do processo, o mesmo para o runner, a revalidação e as consultas às
+# saídas (desligado com --no-cache; workers herdam a configuração no fork)
+CACHE = CacheResultados()
@@ -0,0 +1,124 @@
+# EXTRAÇÃO DE CASOS E DIFFS VISUAIS EM LOTE
+# Seleciona os casos nos resultados (CSV ou Parquet) com um filtro qualquer
+# sobre as colunas, por exemplo "not CSDiff_Equals_Manual", e extrai cada um
+# (extrair_casos.py) e/ou gera o seu HTML lado a lado (gerar_diff_visual.py)
+# num pool de processos. A saída do Haskell-SepMerge vem do cache do runner
+# quando o cenário já foi minerado; só os casos novos vão ao servidor de merge.
+import io
+import re
+import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+import pandas as pd
+from sepmerge_cliente import fechar_clientes
+from resultados import ler_resultados, COLUNAS
+from execucao import adicionar_argumentos, aplicar_argumentos
+from repositorios import REPOSITORIOS, adicionar_opcoes_repositorios, aplicar_opcoes_repositorios
+from extrair_casos import extrair_caso, OUTPUT_DIR
+from gerar_diff_visual import gerar_comparacao, PASTA_SAIDA
+
+# --- CONFIGURAÇÕES ---
+CSV_FILE = "resultados_com_validacao_total.csv"
+# Os casos que a ferramenta resolveu sem conflito mas com código diferente do manual
+FILTRO_PADRAO = "CSDiff_Conflict == 0 and not CSDiff_Equals_Manual"
+_CHAVE_CASO = ["Repo", "MergeCommit", "File"]
+
+
+def selecionar_casos(caminho, filtro=FILTRO_PADRAO, limite=None):
+    """
+    (Repo, MergeCommit, File) das linhas que satisfazem o filtro (expressão do
+    DataFrame.query), sem repetições. Lê os resultados em pedaços e só com as
+    colunas da chave e as que o filtro cita.
+    """
+    citadas = set(re.findall(r"\w+", filtro or ""))
+    colunas = [c for c in COLUNAS if c in _CHAVE_CASO or c in citadas]
+    partes = []
+    for df in ler_resultados(caminho, colunas):
+        if filtro:
+            df = df.query(filtro)
+        partes.append(df[_CHAVE_CASO])
+    casos = pd.concat(partes).drop_duplicates() if partes else pd.DataFrame(columns=_CHAVE_CASO)
+    # Casos do mesmo repositório e merge juntos: os blobs repetidos saem do cache do worker
+    casos = casos.sort_values(["Repo", "MergeCommit"], kind="stable")
+    if limite is not None:
+        casos = casos.head(limite)
+    return list(casos.itertuples(index=False, name=None))
+
+
+def processar_caso(caso, extrair=True, html=True, pasta_casos=OUTPUT_DIR, pasta_html=PASTA_SAIDA):
+    """
+    Extrai e/ou gera o HTML de um caso. Devolve (diretório do caso, caminho
+    do HTML, mensagens): as mensagens são capturadas para que os workers não
+    misturem as suas linhas no console.
+    """
+    repo_name, commit_sha, filename = caso
+    diretorio = caminho_html = None
+    with redirect_stdout(io.StringIO()) as mensagens:
+        if extrair:
+            diretorio = extrair_caso(repo_name, commit_sha, filename, pasta_casos, separar_arquivos=True)
+        if html:
+            caminho_html = gerar_comparacao(repo_name, commit_sha, filename, pasta_html)
+    return diretorio, caminho_html, mensagens.getvalue()
+
+
+def _inicializar_worker():
+    # Workers saem com os._exit, então o atexit não roda: encerra a JVM e os cat-file explicitamente
+    Finalize(None, fechar_clientes, exitpriority=10)
+    Finalize(None, REPOSITORIOS.fechar, exitpriority=10)
+
+
+def processar_lote(casos, workers=1, **opcoes):
+    """Processa os casos (em paralelo com workers > 1) e devolve quantos geraram extração e HTML."""
+    extraidos = htmls = 0
+
+    def registrar(i, caso, resultado):
+        nonlocal extraidos, htmls
+        diretorio, caminho_html, mensagens = resultado
+        extraidos += diretorio is not None
+        htmls += caminho_html is not None
+        print(f"[{i}/{len(casos)}] {caso[0]} | {caso[1][:7]} | {caso[2]}")
+        print(mensagens, end="")
+        if caminho_html:
+            print(f"  -> Diff guardado em: {caminho_html}")
+
+    if workers <= 1:
+        for i, caso in enumerate(casos, 1):
+            registrar(i, caso, processar_caso(caso, **opcoes))
+        return extraidos, htmls
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as pool:
+        futuros = {pool.submit(processar_caso, caso, **opcoes): caso for caso in casos}
+        for i, futuro in enumerate(as_completed(futuros), 1):
+            registrar(i, futuros[futuro], futuro.result())
+    return extraidos, htmls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extrai casos e gera os diffs visuais em lote, a partir de um filtro sobre os resultados.")
+    parser.add_argument("--input", default=CSV_FILE,
+                        help=f"CSV ou diretório Parquet dos resultados (padrão: {CSV_FILE})")
+    parser.add_argument("--filter", default=FILTRO_PADRAO,
+                        help=f"Expressão do DataFrame.query sobre as colunas (padrão: \"{FILTRO_PADRAO}\"; vazio: todos)")
+    parser.add_argument("--limit", type=int, help="Processa no máximo N casos")
+    parser.add_argument("--no-extract", action="store_true", help="Não extrai os arquivos dos casos")
+    parser.add_argument("--no-html", action="store_true", help="Não gera os diffs HTML")
+    parser.add_argument("--cases-dir", default=OUTPUT_DIR, help=f"Diretório dos casos extraídos (padrão: {OUTPUT_DIR})")
+    parser.add_argument("--html-dir", default=PASTA_SAIDA, help=f"Diretório dos HTMLs (padrão: {PASTA_SAIDA})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de processos em paralelo (1 = execução sequencial)")
+    adicionar_argumentos(parser)
+    adicionar_opcoes_repositorios(parser)
+    args = parser.parse_args()
+
+    aplicar_argumentos(args)
+    aplicar_opcoes_repositorios(args)
+    try:
+        casos = selecionar_casos(args.input, args.filter, args.limit)
+    except FileNotFoundError:
+        print(f"[ERRO] Arquivo '{args.input}' não encontrado. Execute o orquestrador primeiro.")
+        raise SystemExit(1)
+    print(f"A processar {len(casos)} casos com {args.workers} worker(s)...\n")
+    extraidos, htmls = processar_lote(casos, args.workers, extrair=not args.no_extract, html=not args.no_html,
+                                      pasta_casos=args.cases_dir, pasta_html=args.html_dir)
+    print(f"\nConcluído: {extraidos} casos extraídos, {htmls} diffs HTML gerados.")
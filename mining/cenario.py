@@ -0,0 +1,122 @@
+# CENÁRIO DE MERGE EM MEMÓRIA
+# Mantém base/left/right/manual como bytes e entrega o conteúdo às ferramentas
+# sem passar pelos temp_*.hs do diretório corrente: o diff3 lê de memfds
+# (/dev/fd/N), o Haskell-SepMerge recebe o conteúdo pelo servidor de merge e
+# as saídas são capturadas direto do pipe. Só o GHC e scripts de shell, que
+# precisam de um nome de arquivo de verdade, recebem arquivos num tmpfs.
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from execucao import executar, executar_async
+
+# Rótulos usados nos marcadores de conflito: os mesmos nomes de antes,
+# para que a saída do diff3 continue idêntica à da versão com arquivos
+ROTULOS = {"base": "temp_base.hs", "left": "temp_left.hs", "right": "temp_right.hs", "manual": "temp_manual.hs"}
+
+
+def diretorio_tmpfs():
+    """Diretório em memória (/dev/shm) quando existir; senão o temporário padrão."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+@contextmanager
+def descritores_em_memoria(conteudos):
+    """
+    Cria um memfd por conteúdo e devolve os caminhos /dev/fd/N (mais a lista de
+    fds para o pass_fds do subprocess). Sem memfd_create, cai para arquivos no tmpfs.
+    """
+    if not hasattr(os, "memfd_create"):
+        with arquivos_em_memoria({f"entrada_{i}": c for i, c in enumerate(conteudos)}) as caminhos:
+            yield list(caminhos.values()), ()
+        return
+    fds = []
+    try:
+        for conteudo in conteudos:
+            fd = os.memfd_create("cenario")
+            fds.append(fd)
+            _escrever_tudo(fd, conteudo)
+        yield [f"/dev/fd/{fd}" for fd in fds], tuple(fds)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _escrever_tudo(fd, conteudo):
+    visao = memoryview(conteudo)
+    while visao:
+        visao = visao[os.write(fd, visao):]
+
+
+@contextmanager
+def arquivos_em_memoria(conteudos):
+    """Escreve {nome: bytes} num diretório privado do tmpfs e apaga tudo na saída."""
+    diretorio = tempfile.mkdtemp(prefix="cenario_", dir=diretorio_tmpfs())
+    try:
+        caminhos = {}
+        for nome, conteudo in conteudos.items():
+            caminho = os.path.join(diretorio, nome)
+            with open(caminho, "wb") as f:
+                f.write(conteudo)
+            caminhos[nome] = caminho
+        yield caminhos
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def _args_diff3(caminhos):
+    return ["diff3", "-m", "-L", ROTULOS["left"], "-L", ROTULOS["base"], "-L", ROTULOS["right"], *caminhos]
+
+
+class CenarioMerge:
+    """Os quatro blobs de um cenário, mantidos em memória."""
+
+    def __init__(self, base, left, right, manual=None):
+        self.base = base
+        self.left = left
+        self.right = right
+        self.manual = manual
+
+    def tem_mudancas_dos_dois_lados(self):
+        return not (self.base == self.left or self.base == self.right or self.left == self.right)
+
+    def diff3(self):
+        """Saída (bytes) do 'diff3 -m left base right', com os rótulos de sempre."""
+        with descritores_em_memoria([self.left, self.base, self.right]) as (caminhos, fds):
+            # Código 1 = houve conflito; 2 = erro do diff3
+            res = executar(_args_diff3(caminhos), "diff3", pass_fds=fds, codigos_ok=(0, 1))
+        return res.stdout
+
+    async def diff3_async(self):
+        """diff3() para o modo assíncrono (ver assincrono.py)."""
+        with descritores_em_memoria([self.left, self.base, self.right]) as (caminhos, fds):
+            res = await executar_async(_args_diff3(caminhos), "diff3", pass_fds=fds, codigos_ok=(0, 1))
+        return res.stdout
+
+    def sepmerge(self, cliente):
+        """Saída (bytes) do Haskell-SepMerge pelo servidor de merge."""
+        texto, _ = cliente.merge(self.base, self.left, self.right)
+        return texto.encode("utf-8")
+
+    async def sepmerge_async(self, cliente):
+        """sepmerge() com um ClienteSepMergeAsync."""
+        texto, _ = await cliente.merge(self.base, self.left, self.right)
+        return texto.encode("utf-8")
+
+    def executar_script(self, script):
+        """
+        Roda um script de merge no estilo csdiff.sh ('script base left right'),
+        que cria arquivos ao lado das entradas e no diretório corrente. Tudo
+        acontece num diretório privado do tmpfs; a saída vem do pipe.
+        """
+        conteudos = {ROTULOS["base"]: self.base, ROTULOS["left"]: self.left, ROTULOS["right"]: self.right}
+        with arquivos_em_memoria(conteudos) as caminhos:
+            # O código de saída de um script não é confiável: só sinais e falta de memória contam
+            res = executar(
+                [os.path.abspath(script), ROTULOS["base"], ROTULOS["left"], ROTULOS["right"]],
+                os.path.basename(script), cwd=os.path.dirname(caminhos[ROTULOS["base"]]), codigos_ok=None
+            )
+        return res.stdout
+
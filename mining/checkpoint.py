@@ -0,0 +1,65 @@
+# CHECKPOINT DA MINERAÇÃO
+# Registra, num SQLite ao lado do CSV de resultados, cada cenário (repo, merge,
+# arquivo) já processado e a última ponta (tip) minerada de cada repositório.
+# Com isso uma execução interrompida continua de onde parou, e uma nova
+# execução depois de um "git fetch" só olha os merges que chegaram desde então.
+import sqlite3
+
+
+class Checkpoint:
+    """Cenários concluídos e pontas mineradas. Só o processo principal escreve."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._conexao = None
+
+    def _conectar(self):
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self.caminho, timeout=60, isolation_level=None)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.execute("""
+                CREATE TABLE IF NOT EXISTS cenarios (
+                    repo TEXT NOT NULL,
+                    merge TEXT NOT NULL,
+                    arquivo TEXT NOT NULL,
+                    PRIMARY KEY (repo, merge, arquivo)
+                )""")
+            self._conexao.execute("""
+                CREATE TABLE IF NOT EXISTS pontas (
+                    repo TEXT PRIMARY KEY,
+                    commit_sha TEXT NOT NULL
+                )""")
+        return self._conexao
+
+    def concluidos(self, repo):
+        """Conjunto de (merge, arquivo) já processados no repositório."""
+        linhas = self._conectar().execute("SELECT merge, arquivo FROM cenarios WHERE repo = ?", (repo,))
+        return set(linhas)
+
+    def marcar_varios(self, chaves):
+        """Marca vários cenários (repo, merge, arquivo) numa única transação."""
+        conexao = self._conectar()
+        with conexao:
+            conexao.execute("BEGIN")
+            conexao.executemany("INSERT OR IGNORE INTO cenarios (repo, merge, arquivo) VALUES (?, ?, ?)", chaves)
+
+    def ponta(self, repo):
+        linha = self._conectar().execute("SELECT commit_sha FROM pontas WHERE repo = ?", (repo,)).fetchone()
+        return linha[0] if linha else None
+
+    def registrar_ponta(self, repo, commit_sha):
+        """Todos os merges alcançáveis a partir de commit_sha foram processados."""
+        self._conectar().execute(
+            "INSERT OR REPLACE INTO pontas (repo, commit_sha) VALUES (?, ?)", (repo, commit_sha))
+
+    def limpar(self):
+        conexao = self._conectar()
+        conexao.execute("DELETE FROM cenarios")
+        conexao.execute("DELETE FROM pontas")
+
+    def close(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
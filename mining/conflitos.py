@@ -0,0 +1,115 @@
+# CONFLITOS E IGUALDADE DAS SAÍDAS
+# Conta os blocos de conflito de uma saída de merge (bytes ou mmap) numa só
+# passada, reconhecendo os marcadores só no início da linha (um "<<<<<<<"
+# dentro de uma string não conta), e devolve a faixa de linhas e o tamanho de
+# cada lado de cada bloco. A comparação com o merge manual ignora espaços
+# sem montar cópias dos arquivos: os dois lados são normalizados em blocos
+# de tamanho fixo e a comparação para na primeira diferença.
+from collections import namedtuple
+
+# Linhas (1-based) do "<<<<<<<" e do ">>>>>>>" e quantas linhas há em cada lado
+BlocoConflito = namedtuple("BlocoConflito", ["inicio", "fim", "linhas_left", "linhas_base", "linhas_right"])
+# Contagem de conflitos registrada quando a ferramenta não produziu saída
+CONFLITOS_FALHA = -1
+
+_INICIO = b"<<<<<<<"
+_BASE = b"|||||||"
+_SEPARADOR = b"======="
+_FIM = b">>>>>>>"
+_TAMANHO_MARCADOR = 7
+_FIM_DE_LINHA = 0x0A
+
+# Bytes ignorados na comparação: os espaços ASCII e os separadores \x1c-\x1f,
+# que o str.split() da versão anterior também descartava
+_ESPACOS = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+TAMANHO_BLOCO = 64 * 1024
+
+
+def _linha_marcador(conteudo, marcador, inicio, fim=None):
+    """
+    Posição da próxima linha que começa com o marcador (seguido de espaço ou
+    do fim da linha, como o git reconhece), ou -1.
+    """
+    fim = len(conteudo) if fim is None else fim
+    pos = conteudo.find(marcador, inicio, fim)
+    while pos != -1:
+        depois = pos + _TAMANHO_MARCADOR
+        if ((pos == 0 or conteudo[pos - 1] == _FIM_DE_LINHA)
+                and (depois == len(conteudo) or conteudo[depois] in b" \r\n")):
+            return pos
+        pos = conteudo.find(marcador, pos + 1, fim)
+    return -1
+
+
+def _quebras(conteudo, inicio, fim):
+    """Quantos \n há em conteudo[inicio:fim] (o mmap não tem count: vai por blocos)."""
+    if isinstance(conteudo, bytes):
+        return conteudo.count(b"\n", inicio, fim)
+    return sum(conteudo[i:min(i + TAMANHO_BLOCO, fim)].count(b"\n") for i in range(inicio, fim, TAMANHO_BLOCO))
+
+
+def regioes_conflito(conteudo):
+    """
+    Gera um BlocoConflito por conflito completo (<<<<<<< ... ======= ... >>>>>>>,
+    com o ||||||| opcional do diff3). As buscas e contagens de linhas são
+    feitas pelo find/count dos próprios bytes: nada é decodificado nem copiado
+    inteiro.
+    """
+    pos = 0
+    linha = 1  # número da linha em pos
+    while True:
+        inicio = _linha_marcador(conteudo, _INICIO, pos)
+        if inicio == -1:
+            return
+        separador = _linha_marcador(conteudo, _SEPARADOR, inicio)
+        fim = _linha_marcador(conteudo, _FIM, separador) if separador != -1 else -1
+        if fim == -1:
+            return  # marcador sem fechamento: não é um bloco de conflito
+        linha_inicio = linha + _quebras(conteudo, pos, inicio)
+        linha_separador = linha_inicio + _quebras(conteudo, inicio, separador)
+        linha_fim = linha_separador + _quebras(conteudo, separador, fim)
+        base = _linha_marcador(conteudo, _BASE, inicio, separador)
+        if base == -1:
+            linhas_left, linhas_base = linha_separador - linha_inicio - 1, 0
+        else:
+            linha_base = linha_inicio + _quebras(conteudo, inicio, base)
+            linhas_left, linhas_base = linha_base - linha_inicio - 1, linha_separador - linha_base - 1
+        yield BlocoConflito(linha_inicio, linha_fim, linhas_left, linhas_base, linha_fim - linha_separador - 1)
+        pos, linha = fim, linha_fim
+
+
+def contar_conflitos(conteudo):
+    return sum(1 for _ in regioes_conflito(conteudo))
+
+
+def _sem_espacos(conteudo, tamanho_bloco):
+    for i in range(0, len(conteudo), tamanho_bloco):
+        pedaco = conteudo[i:i + tamanho_bloco].translate(None, _ESPACOS)
+        if pedaco:
+            yield pedaco
+
+
+def iguais_sem_espacos(a, b, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    True se a e b (bytes ou mmap) têm o mesmo conteúdo desconsiderando os
+    espaços. Usa no máximo alguns blocos de memória e para na primeira
+    diferença.
+    """
+    if isinstance(a, bytes) and isinstance(b, bytes) and a == b:
+        return True
+    blocos_a, blocos_b = _sem_espacos(a, tamanho_bloco), _sem_espacos(b, tamanho_bloco)
+    pedaco_a = pedaco_b = b""
+    pos_a = pos_b = 0
+    while True:
+        if pos_a == len(pedaco_a):
+            pedaco_a, pos_a = next(blocos_a, b""), 0
+        if pos_b == len(pedaco_b):
+            pedaco_b, pos_b = next(blocos_b, b""), 0
+        if not pedaco_a or not pedaco_b:
+            # Um dos lados acabou: iguais só se o outro também acabou
+            return not pedaco_a and not pedaco_b
+        n = min(len(pedaco_a) - pos_a, len(pedaco_b) - pos_b)
+        if memoryview(pedaco_a)[pos_a:pos_a + n] != memoryview(pedaco_b)[pos_b:pos_b + n]:
+            return False
+        pos_a += n
+        pos_b += n
@@ -0,0 +1,76 @@
+# CSDIFF EM PYTHON
+# Equivalente ao csdiff/csdiff.sh sem subir nenhum processo: os separadores
+# viram linhas próprias (marcadas com $$$$$$$), o merge de três vias é feito
+# pelo diff3_nativo e a saída é remontada com as mesmas substituições dos sed
+# do script. O resultado é idêntico, byte a byte, ao do csdiff.sh chamado com
+# arquivos de mesmo nome (o sed é tratado com a semântica de bytes do locale C).
+import re
+
+from diff3_nativo import diff3_merge
+from cenario import descritores_em_memoria
+from execucao import executar
+
+# Mesmos separadores (e na mesma ordem) do pipeline de sed do csdiff.sh
+SEPARADORES_PADRAO = ("{", "}", "(", ")", ";", ",")
+MARCADOR = b"$$$$$$$"
+
+# Nomes dos arquivos que o csdiff.sh receberia; aparecem nos marcadores de conflito
+ROTULOS_PADRAO = ("left", "base", "right")
+
+
+def _como_bytes(valor):
+    return valor.encode("utf-8") if isinstance(valor, str) else valor
+
+
+def tokenizar(conteudo, separadores=SEPARADORES_PADRAO):
+    """Isola cada separador numa linha própria, como os sed 's/X/\\n$$$$$$$X\\n$$$$$$$/g'."""
+    for separador in separadores:
+        separador = _como_bytes(separador)
+        conteudo = conteudo.replace(separador, b"\n" + MARCADOR + separador + b"\n" + MARCADOR)
+    return conteudo
+
+
+def _padrao_rotulo(rotulo):
+    # No sed o rótulo entra como expressão regular (só '/' e '&' são escapados):
+    # um '.' no nome do arquivo casa com qualquer caractere
+    return re.escape(rotulo).replace(rb"\.", rb"[^\n]")
+
+
+def reconstruir(mesclado, rotulos, rotulos_temp):
+    """Remove os marcadores e restaura os rótulos originais (o final do csdiff.sh)."""
+    texto = mesclado.replace(b"\n" + MARCADOR, b"")
+    esquerda, base, direita = (_padrao_rotulo(r) for r in rotulos_temp)
+    # O que vier colado no marcador de conflito vai para a linha seguinte
+    for inicio in (b"<<<<<<< " + esquerda, b"\\|\\|\\|\\|\\|\\|\\| " + base, b"=======", b">>>>>>> " + direita):
+        texto = re.sub(rb"(?m)^([^\n]*?)(" + inicio + rb")([^\n]+)", rb"\1\2\n\3", texto)
+    for temp, original in zip((esquerda, base, direita), rotulos):
+        texto = re.sub(temp, lambda _m, o=original: o, texto)
+    return texto
+
+
+def _diff3_externo(left, base, right, rotulos):
+    """Mesmo merge pelo executável diff3 (referência para comparar os motores)."""
+    with descritores_em_memoria([left, base, right]) as (caminhos, fds):
+        res = executar(
+            [b"diff3", b"-m", b"-L", rotulos[0], b"-L", rotulos[1], b"-L", rotulos[2], *caminhos],
+            "diff3", pass_fds=fds, codigos_ok=(0, 1)
+        )
+    return res.stdout
+
+
+def csdiff_merge(left, base, right, separadores=SEPARADORES_PADRAO, rotulos=ROTULOS_PADRAO, motor="python"):
+    """
+    Merge estruturado por separadores (bytes ou str nas entradas, bytes na saída),
+    equivalente a 'csdiff.sh <rotulo_left> <rotulo_base> <rotulo_right>'.
+    motor="python" faz tudo no processo; motor="diff3" usa o executável.
+    """
+    left, base, right = (tokenizar(_como_bytes(c), separadores) for c in (left, base, right))
+    rotulos = tuple(_como_bytes(r) for r in rotulos)
+    rotulos_temp = tuple(r + b"_temp" for r in rotulos)
+    if motor == "python":
+        mesclado, _ = diff3_merge(left, base, right, rotulos_temp)
+    elif motor == "diff3":
+        mesclado = _diff3_externo(left, base, right, rotulos_temp)
+    else:
+        raise ValueError(f"Motor desconhecido: {motor}")
+    return reconstruir(mesclado, rotulos, rotulos_temp)
@@ -0,0 +1,551 @@
+# DIFF3 EM PYTHON (sem subprocess)
+# Porte do "diff3 -m" do GNU diffutils: o diff de duas vias segue o analyze.c
+# do GNU diff (prefixo/sufixo idênticos com horizonte de 100 linhas, descarte
+# de linhas "confusas", busca de Myers com o corte de custo e o
+# shift_boundaries), e a junção das duas threads e a saída seguem o diff3.c.
+# Assim a saída é a mesma do executável, byte a byte, para o mesmo par de
+# rótulos. As linhas são bytes e mantêm o "\n" (a última pode não ter).
+
+HORIZONTE = 100
+
+
+def dividir_linhas(conteudo):
+    """Quebra bytes em linhas (só em '\n', como o diff), preservando o '\n' de cada uma."""
+    partes = conteudo.split(b"\n")
+    linhas = [p + b"\n" for p in partes[:-1]]
+    if partes[-1]:
+        linhas.append(partes[-1])
+    return linhas
+
+
+# --- DIFF DE DUAS VIAS (analyze.c / io.c) ---
+
+def _prefixo_comum(a, b):
+    """Tamanho do maior prefixo comum de dois bytes (busca binária com memcmp)."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        meio = (lo + hi + 1) // 2
+        if a[lo:meio] == b[lo:meio]:
+            lo = meio
+        else:
+            hi = meio - 1
+    return lo
+
+
+def _sufixo_comum(a, b, limite):
+    lo, hi = 0, min(len(a), len(b), limite)
+    na, nb = len(a), len(b)
+    while lo < hi:
+        meio = (lo + hi + 1) // 2
+        if a[na - meio:na - lo] == b[nb - meio:nb - lo]:
+            lo = meio
+        else:
+            hi = meio - 1
+    return lo
+
+
+def _extremos_identicos(linhas0, linhas1):
+    """
+    find_identical_ends: devolve (linhas_de_prefixo, fim0, fim1), onde as
+    linhas [prefixo, fimN) de cada arquivo são as que entram na análise.
+    """
+    falta0 = bool(linhas0) and not linhas0[-1].endswith(b"\n")
+    falta1 = bool(linhas1) and not linhas1[-1].endswith(b"\n")
+    buf0 = b"".join(linhas0) + (b"\n" if falta0 else b"")
+    buf1 = b"".join(linhas1) + (b"\n" if falta1 else b"")
+    n0, n1 = len(buf0), len(buf1)
+
+    # Prefixo idêntico; a falta de '\n' final não conta como parte dele
+    p = _prefixo_comum(buf0, buf1)
+    if (n0 - falta0 < p) != (n1 - falta1 < p):
+        p -= 1
+    # Volta ao início da linha e descarta até HORIZONTE linhas do prefixo
+    i = HORIZONTE
+    while p != 0:
+        if buf0[p - 1] != 0x0A:
+            p -= 1
+            continue
+        if i == 0:
+            break
+        i -= 1
+        p -= 1
+    prefixo_fim = p
+    prefixo_linhas = buf0.count(b"\n", 0, prefixo_fim)
+
+    if falta0 != falta1:
+        return prefixo_linhas, len(linhas0), len(linhas1)
+
+    beg0 = prefixo_fim + (0 if n0 < n1 else n0 - n1)
+    s = _sufixo_comum(buf0, buf1, n0 - beg0)
+    p0, p1 = n0 - s, n1 - s
+    inicio_sufixo0 = p0
+    i = HORIZONTE + (0 if ((p0 == 0 or buf0[p0 - 1] == 0x0A) and (p1 == 0 or buf1[p1 - 1] == 0x0A)) else 1)
+    while i and p0 != n0:
+        i -= 1
+        p0 = buf0.index(b"\n", p0) + 1
+    p1 += p0 - inicio_sufixo0
+
+    fim0 = prefixo_linhas + buf0.count(b"\n", prefixo_fim, p0)
+    fim1 = prefixo_linhas + buf1.count(b"\n", prefixo_fim, p1)
+    return prefixo_linhas, fim0, fim1
+
+
+def _descartar_confusas(equivs, changed):
+    """discard_confusing_lines: devolve (undiscarded, realindexes) de cada arquivo."""
+    contagem = [{}, {}]
+    for f in (0, 1):
+        for e in equivs[f]:
+            contagem[f][e] = contagem[f].get(e, 0) + 1
+
+    descartes = [[0] * len(equivs[0]), [0] * len(equivs[1])]
+    for f in (0, 1):
+        fim = len(equivs[f])
+        outros = contagem[1 - f]
+        muitos = 5
+        tem = fim // 64
+        tem >>= 2
+        while tem > 0:
+            muitos *= 2
+            tem >>= 2
+        d = descartes[f]
+        for i, e in enumerate(equivs[f]):
+            n = outros.get(e, 0)
+            if n == 0:
+                d[i] = 1
+            elif n > muitos:
+                d[i] = 2
+
+    for f in (0, 1):
+        d = descartes[f]
+        fim = len(d)
+        i = 0
+        while i < fim:
+            if d[i] == 2:
+                d[i] = 0
+            elif d[i] != 0:
+                provisorios = 0
+                j = i
+                while j < fim:
+                    if d[j] == 0:
+                        break
+                    if d[j] == 2:
+                        provisorios += 1
+                    j += 1
+                while j > i and d[j - 1] == 2:
+                    j -= 1
+                    d[j] = 0
+                    provisorios -= 1
+                tamanho = j - i
+                if provisorios * 4 > tamanho:
+                    while j > i:
+                        j -= 1
+                        if d[j] == 2:
+                            d[j] = 0
+                else:
+                    minimo = 1
+                    tem = tamanho >> 2
+                    tem >>= 2
+                    while tem > 0:
+                        minimo <<= 1
+                        tem >>= 2
+                    minimo += 1
+
+                    j = 0
+                    consec = 0
+                    while j < tamanho:
+                        if d[i + j] != 2:
+                            consec = 0
+                        else:
+                            consec += 1
+                            if minimo == consec:
+                                j -= consec
+                            elif minimo < consec:
+                                d[i + j] = 0
+                        j += 1
+
+                    j = 0
+                    consec = 0
+                    while j < tamanho:
+                        if j >= 8 and d[i + j] == 1:
+                            break
+                        if d[i + j] == 2:
+                            consec = 0
+                            d[i + j] = 0
+                        elif d[i + j] == 0:
+                            consec = 0
+                        else:
+                            consec += 1
+                        if consec == 3:
+                            break
+                        j += 1
+
+                    i += tamanho - 1
+
+                    j = 0
+                    consec = 0
+                    while j < tamanho:
+                        if j >= 8 and d[i - j] == 1:
+                            break
+                        if d[i - j] == 2:
+                            consec = 0
+                            d[i - j] = 0
+                        elif d[i - j] == 0:
+                            consec = 0
+                        else:
+                            consec += 1
+                        if consec == 3:
+                            break
+                        j += 1
+            i += 1
+
+    resultado = []
+    for f in (0, 1):
+        undiscarded, realindexes = [], []
+        for i, e in enumerate(equivs[f]):
+            if descartes[f][i] == 0:
+                undiscarded.append(e)
+                realindexes.append(i)
+            else:
+                changed[f][i + 1] = 1
+        resultado.append((undiscarded, realindexes))
+    return resultado
+
+
+def _diag(xv, yv, xoff, xlim, yoff, ylim, minimo, fd, bd, deslocamento, caro):
+    """Busca do 'middle snake' (diffseq.h); devolve (xmid, ymid, lo_minimal, hi_minimal)."""
+    dmin = xoff - ylim
+    dmax = xlim - yoff
+    fmid = xoff - yoff
+    bmid = xlim - ylim
+    fmin = fmax = fmid
+    bmin = bmax = bmid
+    impar = (fmid - bmid) & 1
+    o = deslocamento
+    fd[fmid + o] = xoff
+    bd[bmid + o] = xlim
+    c = 0
+    while True:
+        c += 1
+        if fmin > dmin:
+            fmin -= 1
+            fd[fmin - 1 + o] = -1
+        else:
+            fmin += 1
+        if fmax < dmax:
+            fmax += 1
+            fd[fmax + 1 + o] = -1
+        else:
+            fmax -= 1
+        for d in range(fmax, fmin - 1, -2):
+            tlo = fd[d - 1 + o]
+            thi = fd[d + 1 + o]
+            x = thi if tlo < thi else tlo + 1
+            y = x - d
+            while x < xlim and y < ylim and xv[x] == yv[y]:
+                x += 1
+                y += 1
+            fd[d + o] = x
+            if impar and bmin <= d <= bmax and bd[d + o] <= x:
+                return x, y, True, True
+
+        if bmin > dmin:
+            bmin -= 1
+            bd[bmin - 1 + o] = _INFINITO
+        else:
+            bmin += 1
+        if bmax < dmax:
+            bmax += 1
+            bd[bmax + 1 + o] = _INFINITO
+        else:
+            bmax -= 1
+        for d in range(bmax, bmin - 1, -2):
+            tlo = bd[d - 1 + o]
+            thi = bd[d + 1 + o]
+            x = tlo if tlo < thi else thi - 1
+            y = x - d
+            while xoff < x and yoff < y and xv[x - 1] == yv[y - 1]:
+                x -= 1
+                y -= 1
+            bd[d + o] = x
+            if not impar and fmin <= d <= fmax and x <= fd[d + o]:
+                return x, y, True, True
+
+        if minimo:
+            continue
+
+        # Passou muito do razoável: devolve o melhor ponto encontrado até aqui
+        if c >= caro:
+            fxybest = -1
+            fxbest = 0
+            for d in range(fmax, fmin - 1, -2):
+                x = min(fd[d + o], xlim)
+                y = x - d
+                if ylim < y:
+                    x = ylim + d
+                    y = ylim
+                if fxybest < x + y:
+                    fxybest = x + y
+                    fxbest = x
+            bxybest = _INFINITO
+            bxbest = 0
+            for d in range(bmax, bmin - 1, -2):
+                x = max(xoff, bd[d + o])
+                y = x - d
+                if y < yoff:
+                    x = yoff + d
+                    y = yoff
+                if x + y < bxybest:
+                    bxybest = x + y
+                    bxbest = x
+            if (xlim + ylim) - bxybest < fxybest - (xoff + yoff):
+                return fxbest, fxybest - fxbest, True, False
+            return bxbest, bxybest - bxbest, False, True
+
+
+_INFINITO = float("inf")
+
+
+def _compareseq(xv, yv, changed, realindexes, caro):
+    nx, ny = len(xv), len(yv)
+    deslocamento = ny + 1
+    fd = [0] * (nx + ny + 3)
+    bd = [0] * (nx + ny + 3)
+    changed0, changed1 = changed
+    real0, real1 = realindexes
+    pilha = [(0, nx, 0, ny, False)]
+    while pilha:
+        xoff, xlim, yoff, ylim, minimo = pilha.pop()
+        while xoff < xlim and yoff < ylim and xv[xoff] == yv[yoff]:
+            xoff += 1
+            yoff += 1
+        while xoff < xlim and yoff < ylim and xv[xlim - 1] == yv[ylim - 1]:
+            xlim -= 1
+            ylim -= 1
+        if xoff == xlim:
+            for y in range(yoff, ylim):
+                changed1[real1[y] + 1] = 1
+        elif yoff == ylim:
+            for x in range(xoff, xlim):
+                changed0[real0[x] + 1] = 1
+        else:
+            xmid, ymid, lo_min, hi_min = _diag(xv, yv, xoff, xlim, yoff, ylim, minimo, fd, bd, deslocamento, caro)
+            pilha.append((xmid, xlim, ymid, ylim, hi_min))
+            pilha.append((xoff, xmid, yoff, ymid, lo_min))
+
+
+def _shift_boundaries(equivs, changed):
+    for f in (0, 1):
+        ch = changed[f]          # ch[i + 1] == changed[i]; ch[0] e ch[-1] são sentinelas
+        outro = changed[1 - f]
+        eq = equivs[f]
+        i = 0
+        j = 0
+        i_fim = len(eq)
+        while True:
+            while i < i_fim and not ch[i + 1]:
+                while outro[j + 1]:
+                    j += 1
+                j += 1
+                i += 1
+            if i == i_fim:
+                break
+            inicio = i
+            i += 1
+            while ch[i + 1]:
+                i += 1
+            while outro[j + 1]:
+                j += 1
+            while True:
+                tamanho = i - inicio
+                while inicio and eq[inicio - 1] == eq[i - 1]:
+                    inicio -= 1
+                    ch[inicio + 1] = 1
+                    i -= 1
+                    ch[i + 1] = 0
+                    while ch[inicio]:
+                        inicio -= 1
+                    j -= 1
+                    while outro[j + 1]:
+                        j -= 1
+                correspondente = i if outro[j] else i_fim
+                while i != i_fim and eq[inicio] == eq[i]:
+                    ch[inicio + 1] = 0
+                    inicio += 1
+                    ch[i + 1] = 1
+                    i += 1
+                    while ch[i + 1]:
+                        i += 1
+                    j += 1
+                    while outro[j + 1]:
+                        j += 1
+                        correspondente = i
+                if tamanho == i - inicio:
+                    break
+            while correspondente < i:
+                inicio -= 1
+                ch[inicio + 1] = 1
+                i -= 1
+                ch[i + 1] = 0
+                j -= 1
+                while outro[j + 1]:
+                    j -= 1
+
+
+def diff_linhas(linhas0, linhas1):
+    """
+    Diff de duas vias como o GNU diff. Devolve a lista de mudanças
+    (inicio0, num0, inicio1, num1), com índices a partir de 0, em ordem.
+    """
+    prefixo, fim0, fim1 = _extremos_identicos(linhas0, linhas1)
+    classes = {}
+    equivs = [
+        [classes.setdefault(l, len(classes) + 1) for l in linhas0[prefixo:fim0]],
+        [classes.setdefault(l, len(classes) + 1) for l in linhas1[prefixo:fim1]],
+    ]
+    changed = [[0] * (len(equivs[0]) + 2), [0] * (len(equivs[1]) + 2)]
+    (xv, real0), (yv, real1) = _descartar_confusas(equivs, changed)
+
+    diags = len(xv) + len(yv) + 3
+    caro = 1
+    while diags != 0:
+        caro <<= 1
+        diags >>= 2
+    caro = max(4096, caro)
+
+    _compareseq(xv, yv, changed, (real0, real1), caro)
+    _shift_boundaries(equivs, changed)
+
+    # build_script (de trás para frente, como no diff)
+    mudancas = []
+    ch0, ch1 = changed
+    i0, i1 = len(equivs[0]), len(equivs[1])
+    while i0 >= 0 or i1 >= 0:
+        if ch0[i0] or ch1[i1]:
+            linha0, linha1 = i0, i1
+            while ch0[i0]:
+                i0 -= 1
+            while ch1[i1]:
+                i1 -= 1
+            mudancas.append((i0 + prefixo, linha0 - i0, i1 + prefixo, linha1 - i1))
+        i0 -= 1
+        i1 -= 1
+    mudancas.reverse()
+    return mudancas
+
+
+# --- DIFF3 (diff3.c) ---
+# Blocos de duas vias: [FO] = o outro arquivo, [FC] = o arquivo comum (base),
+# com faixas de linhas a partir de 1 (faixa vazia: alto = baixo - 1).
+_FO, _FC = 0, 1
+
+
+def _blocos_duas_vias(outro, comum):
+    blocos = []
+    for i0, n0, i1, n1 in diff_linhas(outro, comum):
+        blocos.append(((i0 + 1, i0 + n0), (i1 + 1, i1 + n1)))
+    return blocos
+
+
+def _blocos_tres_vias(thread0, thread1, linhas):
+    """make_3way_diff + using_to_diff3_block. Faixas por arquivo: 0 = mine, 1 = yours, 2 = base."""
+    correntes = [list(reversed(thread0)), list(reversed(thread1))]
+    ultimo = ((0, 0), (0, 0), (0, 0))
+    resultado = []
+    while correntes[0] or correntes[1]:
+        usando = [[], []]
+        if not correntes[0]:
+            base_thread = 1
+        elif not correntes[1]:
+            base_thread = 0
+        else:
+            base_thread = 1 if correntes[0][-1][_FC][0] > correntes[1][-1][_FC][0] else 0
+        alta_thread = base_thread
+        bloco = correntes[alta_thread].pop()
+        usando[alta_thread].append(bloco)
+        marca = bloco[_FC][1]
+        outra = alta_thread ^ 1
+        while correntes[outra] and correntes[outra][-1][_FC][0] <= marca + 1:
+            bloco = correntes[outra].pop()
+            usando[outra].append(bloco)
+            if marca < bloco[_FC][1]:
+                alta_thread ^= 1
+                marca = bloco[_FC][1]
+            outra = alta_thread ^ 1
+
+        lowc = usando[base_thread][0][_FC][0]
+        highc = usando[alta_thread][-1][_FC][1]
+        faixas = []
+        for d in (0, 1):
+            if usando[d]:
+                primeiro, ultimo_d = usando[d][0], usando[d][-1]
+                baixo = lowc - primeiro[_FC][0] + primeiro[_FO][0]
+                alto = highc - ultimo_d[_FC][1] + ultimo_d[_FO][1]
+            else:
+                baixo = lowc - ultimo[2][1] + ultimo[d][1]
+                alto = highc - ultimo[2][1] + ultimo[d][1]
+            faixas.append((baixo, alto))
+        faixas.append((lowc, highc))
+        faixas = tuple(faixas)
+
+        if not usando[0]:
+            tipo = "2ND"
+        elif not usando[1]:
+            tipo = "1ST"
+        else:
+            (b0, a0), (b1, a1) = faixas[0], faixas[1]
+            if linhas[0][b0 - 1:a0] != linhas[1][b1 - 1:a1]:
+                tipo = "ALL"
+            else:
+                tipo = "3RD"
+        resultado.append((faixas, tipo))
+        ultimo = faixas
+    return resultado
+
+
+def diff3_merge(mine, older, yours, rotulos=("mine", "older", "yours")):
+    """
+    Equivalente a 'diff3 -m MINE OLDER YOURS' (com -L para os rótulos).
+    Recebe e devolve bytes. Devolve (saida, houve_conflito).
+    """
+    linhas = [dividir_linhas(mine), dividir_linhas(yours), dividir_linhas(older)]
+    thread0 = _blocos_duas_vias(linhas[0], linhas[2])
+    thread1 = _blocos_duas_vias(linhas[1], linhas[2])
+    blocos = _blocos_tres_vias(thread0, thread1, linhas)
+
+    rotulo0, rotulo1, rotulo2 = (r.encode() if isinstance(r, str) else r for r in rotulos)
+    # Numeração da saída: 0 = mine, 1 = older, 2 = yours (mapeada para a interna: 0, 2, 1)
+    saida = []
+    lidas = 0
+    conflitos = False
+    for faixas, tipo_interno in blocos:
+        # Tipos na numeração da saída (rev_mapping do diff3.c)
+        tipo = {"ALL": "ALL", "1ST": "1ST", "2ND": "3RD", "3RD": "2ND"}[tipo_interno]
+        if tipo == "1ST":
+            continue
+        conflito = tipo != "3RD"
+
+        baixo0 = faixas[0][0]
+        saida.extend(linhas[0][lidas:baixo0 - 1])
+        lidas = baixo0 - 1
+
+        def trecho(interno):
+            b, a = faixas[interno]
+            return linhas[interno][b - 1:a]
+
+        if conflito:
+            conflitos = True
+            if tipo == "ALL":
+                saida.append(b"<<<<<<< " + rotulo0 + b"\n")
+                saida.extend(trecho(0))
+                saida.append(b"||||||| " + rotulo1 + b"\n")
+            else:
+                saida.append(b"<<<<<<< " + rotulo1 + b"\n")
+            saida.extend(trecho(2))
+            saida.append(b"=======\n")
+        saida.extend(trecho(1))
+        if conflito:
+            saida.append(b">>>>>>> " + rotulo2 + b"\n")
+
+        lidas += faixas[0][1] - faixas[0][0] + 1
+    saida.extend(linhas[0][lidas:])
+    return b"".join(saida), conflitos
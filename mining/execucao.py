@@ -0,0 +1,208 @@
+# EXECUÇÃO DE FERRAMENTAS EXTERNAS COM LIMITES
+# Toda chamada a uma ferramenta de merge ou de compilação passa por aqui, com
+# um timeout de relógio e limites de memória (RLIMIT_AS) e de CPU (RLIMIT_CPU)
+# por chamada. Quando algo dá errado a falha é classificada como TIMEOUT, OOM
+# ou CRASH e sobe como FalhaFerramenta, para ser registrada nos resultados
+# em vez de sumir num "except: continue".
+import os
+import re
+import signal
+import asyncio
+import resource
+import threading
+import subprocess
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Classes de falha (valores das colunas *_Failure dos resultados)
+TIMEOUT = "TIMEOUT"
+OOM = "OOM"
+CRASH = "CRASH"
+
+# Limites por chamada: segundos de relógio, MB de memória e segundos de CPU (None desliga)
+Limites = namedtuple("Limites", ["timeout", "memoria_mb", "cpu_s"])
+TIMEOUT_PADRAO = 30
+MEMORIA_PADRAO_MB = 4096
+CPU_PADRAO_S = 60
+
+LIMITES = Limites(TIMEOUT_PADRAO, MEMORIA_PADRAO_MB, CPU_PADRAO_S)
+
+# Mensagens de falta de memória (C, GHC e JVM)
+_SEM_MEMORIA = re.compile(
+    rb"memory exhausted|out of memory|cannot allocate memory|heap exhausted|outofmemoryerror|memoryerror|std::bad_alloc",
+    re.IGNORECASE)
+
+
+class FalhaFerramenta(Exception):
+    """A ferramenta não produziu resultado: classe é TIMEOUT, OOM ou CRASH."""
+
+    def __init__(self, ferramenta, classe, detalhe=""):
+        super().__init__(f"{ferramenta}: {classe}" + (f" ({detalhe})" if detalhe else ""))
+        self.ferramenta = ferramenta
+        self.classe = classe
+        self.detalhe = detalhe
+
+
+def configurar_limites(timeout=None, memoria_mb=None, cpu_s=None):
+    """
+    Troca os limites do processo (valor 0 desliga o limite). Deve ser chamado
+    antes de criar os workers, que herdam o valor no fork.
+    """
+    global LIMITES
+    novos = {nome: valor or None for nome, valor in
+             (("timeout", timeout), ("memoria_mb", memoria_mb), ("cpu_s", cpu_s)) if valor is not None}
+    LIMITES = LIMITES._replace(**novos)
+    return LIMITES
+
+
+def adicionar_argumentos(parser):
+    """As mesmas opções de limite em todos os scripts."""
+    parser.add_argument("--timeout", type=int, metavar="SEG",
+                        help=f"Tempo máximo por chamada de ferramenta (padrão: {TIMEOUT_PADRAO}s; 0 desliga)")
+    parser.add_argument("--mem-limit", type=int, metavar="MB",
+                        help=f"Memória máxima por ferramenta (padrão: {MEMORIA_PADRAO_MB} MB; 0 desliga)")
+    parser.add_argument("--cpu-limit", type=int, metavar="SEG",
+                        help=f"Tempo de CPU máximo por chamada (padrão: {CPU_PADRAO_S}s; 0 desliga)")
+
+
+def aplicar_argumentos(args):
+    return configurar_limites(args.timeout, args.mem_limit, args.cpu_limit)
+
+
+def _aplicar_rlimits(pid, memoria_mb, cpu_s):
+    # Aplicados logo depois do exec (o Popen só volta depois dele), e não num
+    # preexec_fn: o preexec_fn obriga um fork completo do worker e deixa cada
+    # chamada ~5x mais cara. A janela até o prlimit é de microssegundos
+    try:
+        if memoria_mb:
+            limite = memoria_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limite, limite))
+        if cpu_s:
+            # SIGXCPU no limite; SIGKILL alguns segundos depois, se ele for ignorado
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_s, cpu_s + 5))
+    except (ProcessLookupError, PermissionError):
+        pass  # já terminou
+
+
+def classificar(returncode, erros=b"", codigos_ok=(0,), cpu_esgotada=False):
+    """
+    Classe da falha pelo código de saída e pelo stderr, ou None se a execução
+    foi normal. cpu_esgotada diz que o processo gastou o limite de CPU: aí um
+    SIGKILL é o limite rígido do RLIMIT_CPU (SIGXCPU ignorado), não falta de memória.
+    """
+    if returncode < 0:
+        sinal = -returncode
+        if sinal == signal.SIGXCPU or (sinal == signal.SIGKILL and cpu_esgotada):
+            return TIMEOUT
+        if sinal == signal.SIGKILL or _SEM_MEMORIA.search(erros or b""):
+            # Sem o nosso timeout, um SIGKILL é o OOM killer do kernel
+            return OOM
+        return CRASH
+    if returncode != 0 and _SEM_MEMORIA.search(erros or b""):
+        return OOM
+    if codigos_ok is None or returncode in codigos_ok:
+        return None
+    return CRASH
+
+
+def executar(args, ferramenta, entrada=None, cwd=None, pass_fds=(), codigos_ok=(0,), limitar_memoria=True):
+    """
+    subprocess.run com os limites atuais. Devolve o CompletedProcess (stdout e
+    stderr em bytes) ou levanta FalhaFerramenta. codigos_ok=None aceita qualquer
+    código de saída (ferramentas que usam o código para dizer o resultado).
+    limitar_memoria=False para ferramentas com limite próprio (GHC, JVM), que
+    reservam muito espaço de endereçamento e não convivem com o RLIMIT_AS.
+    """
+    limites = LIMITES
+    cpu_antes = _cpu_filhos()
+    # Sessão própria: o timeout mata o grupo inteiro, inclusive os sed/diff3 de um script
+    proc = subprocess.Popen(
+        args, cwd=cwd, pass_fds=pass_fds, start_new_session=True,
+        stdin=subprocess.PIPE if entrada is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    _aplicar_rlimits(proc.pid, limites.memoria_mb if limitar_memoria else None, limites.cpu_s)
+    try:
+        saida, erros = proc.communicate(entrada, timeout=limites.timeout)
+    except subprocess.TimeoutExpired:
+        _matar_grupo(proc)
+        proc.communicate()
+        raise FalhaFerramenta(ferramenta, TIMEOUT, f"mais de {limites.timeout}s")
+    return _concluido(args, ferramenta, proc.returncode, saida, erros, codigos_ok, limites, cpu_antes)
+
+
+async def executar_async(args, ferramenta, entrada=None, cwd=None, pass_fds=(), codigos_ok=(0,), limitar_memoria=True):
+    """
+    executar() para o modo assíncrono: o processo sobe com o
+    asyncio.create_subprocess_exec, com os mesmos limites, e a espera não
+    bloqueia o laço de eventos.
+    """
+    limites = LIMITES
+    cpu_antes = _cpu_filhos()
+    proc = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd, pass_fds=pass_fds, start_new_session=True,
+        stdin=asyncio.subprocess.PIPE if entrada is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    _aplicar_rlimits(proc.pid, limites.memoria_mb if limitar_memoria else None, limites.cpu_s)
+    try:
+        saida, erros = await asyncio.wait_for(proc.communicate(entrada), limites.timeout)
+    except asyncio.TimeoutError:
+        _matar_grupo(proc)
+        await proc.wait()
+        raise FalhaFerramenta(ferramenta, TIMEOUT, f"mais de {limites.timeout}s")
+    except asyncio.CancelledError:
+        # O cenário foi cancelado: a ferramenta não fica rodando sozinha, e o
+        # processo morto é recolhido (senão vira zumbi) mesmo que o cancelamento se repita
+        _matar_grupo(proc)
+        await asyncio.shield(proc.wait())
+        raise
+    return _concluido(args, ferramenta, proc.returncode, saida, erros, codigos_ok, limites, cpu_antes)
+
+
+def _cpu_filhos():
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _concluido(args, ferramenta, returncode, saida, erros, codigos_ok, limites, cpu_antes):
+    # CPU dos filhos recolhidos desde o início da chamada: no modo assíncrono
+    # inclui as ferramentas que terminaram ao mesmo tempo, mas abaixo do limite
+    # ela descarta com certeza o RLIMIT_CPU como causa de um SIGKILL
+    cpu_esgotada = bool(limites.cpu_s) and _cpu_filhos() - cpu_antes >= limites.cpu_s
+    classe = classificar(returncode, erros, codigos_ok, cpu_esgotada)
+    if classe is not None:
+        detalhe = erros.decode("utf-8", errors="replace").strip().splitlines()
+        raise FalhaFerramenta(ferramenta, classe, detalhe[-1] if detalhe else f"código {returncode}")
+    return subprocess.CompletedProcess(args, returncode, saida, erros)
+
+
+def _matar_grupo(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+@contextmanager
+def prazo(proc, segundos):
+    """
+    Para processos persistentes (servidor de merge): mata proc se o bloco
+    passar de segundos. O Event devolvido diz se o prazo estourou.
+    """
+    estourou = threading.Event()
+    if not segundos:
+        yield estourou
+        return
+
+    def matar():
+        estourou.set()
+        proc.kill()
+
+    relogio = threading.Timer(segundos, matar)
+    relogio.daemon = True
+    relogio.start()
+    try:
+        yield estourou
+    finally:
+        relogio.cancel()
@@ -1,8 +1,32 @@
 import os
-import csv
-import subprocess
+import gc
+import time
 import shutil
+import asyncio
+import argparse
+from itertools import islice
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from git import Repo
+from multiprocessing.util import Finalize
+from sepmerge_cliente import fechar_clientes
+from validacao_sintaxe import validar_lote, fechar_sessoes, FALHAS_VALIDACAO
+from cache_resultados import CACHE
+from cenario import CenarioMerge, arquivos_em_memoria
+from historico_git import CatFileBatch, GrafoCommits, ObjetoGrande, iterar_merges, contar_merges, arquivos_alterados_nos_dois_lados
+from checkpoint import Checkpoint
+from resultados import ColetorResultados, caminho_resultados, COLUNAS
+from execucao import FalhaFerramenta, adicionar_argumentos, aplicar_argumentos
+from instrumentacao import PERFIL, iniciar_cprofile, salvar_cprofile
+from conflitos import regioes_conflito, contar_conflitos, iguais_sem_espacos, CONFLITOS_FALHA
+from repositorios import REPOSITORIOS, adicionar_opcoes_repositorios, aplicar_opcoes_repositorios
+from linguagens import LINGUAGENS, LINGUAGENS_PADRAO, linguagem_do_arquivo, versao_motor, mesclar, requisitos_faltando
+from memoria import ORCAMENTO, pico_rss_mb, zerar_pico, adicionar_opcoes_memoria, aplicar_opcoes_memoria
+from amostragem import Amostra, ESTRATOS, prioritarios, imprimir_estimativas
+from assincrono import Orquestrador, LIMITES_PADRAO, ler_limites
+from armazem_saidas import ARMAZEM, chave_cenario
+from fila_distribuida import (FilaTrabalho, Batimento, identificador_trabalhador, DURACAO_ALUGUEL,
+                              TAMANHO_LOTE_FILA, INTERVALO_FILA, LOTE_PUBLICACAO, LIMITE_ALUGUEIS_TAREFA)
 
 # --- CONFIGURAÇÕES ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,8 +35,11 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 HASKELL_SEPMERGE_JAR = os.path.join(SCRIPT_DIR, "../haskell/haskell-sepmerge.jar")
 
-REPOS_DIR = os.path.join(SCRIPT_DIR, "repos_haskell")
 RESULTS_FILE = "resultados_com_validacao_total.csv"
+CHECKPOINT_FILE = "checkpoint_mineracao.sqlite"
+# Uma rodada com --sample grava à parte, sem tocar nos resultados completos
+SAMPLE_RESULTS_FILE = "resultados_amostra.csv"
+SAMPLE_CHECKPOINT_FILE = "checkpoint_amostra.sqlite"
 
 REPOS_TO_MINE = [
     "https://github.com/koalaman/shellcheck.git",
@@ -21,158 +48,896 @@ REPOS_TO_MINE = [
     "https://github.com/commercialhaskell/stack.git"
 ]
 
+# Linguagens mineradas (ver linguagens.py): os arquivos das outras extensões são ignorados
+LINGUAGENS_ATIVAS = list(LINGUAGENS_PADRAO)
+
+# Cenários concluídos e última ponta de cada repositório (usado pelo --resume)
+CHECKPOINT = Checkpoint(CHECKPOINT_FILE)
+# Chaves (Repo, MergeCommit, File) que já estavam no CSV ao retomar
+_linhas_no_csv = set()
+# Coletor das linhas (criado no setup): grava em lotes, no CSV ou em Parquet
+COLETOR = None
+
+# Um cenário de merge: repositório, commit de merge, merge base, arquivo (de
+# uma das LINGUAGENS_ATIVAS) e os OIDs do arquivo em (base, left, right, manual)
+Cenario = namedtuple("Cenario", ["repo", "merge", "base", "arquivo", "oids"])
+# Memória de um cenário: pico de RSS do processo que o rodou (MB) e se foi
+# ignorado por ter um arquivo acima do limite de tamanho
+MemoriaCenario = namedtuple("MemoriaCenario", ["pico_rss_mb", "grande"])
+# Por repositório: [pico de RSS (MB), cenários ignorados por tamanho]
+_memoria_repos = {}
+
+_COLUNA_MANUAL_OK = COLUNAS.index("Manual_ParseOK")
+_COLUNA_MANUAL_FALHA = COLUNAS.index("Manual_Failure")
+
 def check_dependencies():
     print("--- Verificando Dependências ---")
-    if not os.path.exists(HASKELL_SEPMERGE_JAR):
-        print(f"[ERRO CRÍTICO] JAR não encontrado em: {HASKELL_SEPMERGE_JAR}")
-        print("Certifique-se de compilar o projeto com 'mvn clean package'")
-        return False
     if shutil.which("diff3") is None:
         print("[ERRO CRÍTICO] 'diff3' não instalado.")
         return False
-    if shutil.which("java") is None:
-        print("[ERRO CRÍTICO] 'java' não instalado. O Haskell-SepMerge requer a JRE.")
+    for nome in LINGUAGENS_ATIVAS:
+        linguagem = LINGUAGENS[nome]
+        faltando_motor, faltando_validador = requisitos_faltando(linguagem)
+        if faltando_motor:
+            print(f"[ERRO CRÍTICO] {nome}: o motor '{linguagem.motor}' requer: {', '.join(faltando_motor)}")
+            if linguagem.motor == "sepmerge":
+                print("Certifique-se de compilar o projeto com 'mvn clean package' e de ter a JRE instalada")
+            return False
+        if faltando_validador:
+            print(f"[AVISO] {nome}: '{', '.join(faltando_validador)}' não encontrado. Validação de sintaxe será ignorada.")
+    return True
+
+def setup(retomar=False, formato="csv"):
+    global _linhas_no_csv, COLETOR
+    # O checkpoint só é marcado depois que o lote com as linhas foi gravado
+    COLETOR = ColetorResultados(caminho_resultados(RESULTS_FILE, formato), formato,
+                                ao_descarregar=CHECKPOINT.marcar_varios)
+    # Ao retomar, o arquivo existente é mantido (sem uma eventual última linha incompleta)
+    _linhas_no_csv = COLETOR.preparar(retomar)
+    if retomar:
+        print(f" > Checkpoint: retomando com {len(_linhas_no_csv)} linhas já registradas")
+    else:
+        CHECKPOINT.limpar()
+
+def count_conflicts(conteudo):
+    # Só blocos completos com os marcadores no início da linha
+    return contar_conflitos(conteudo)
+
+def files_are_equal(conteudo1, conteudo2):
+    # Comparação sem espaços em blocos, parando na primeira diferença
+    return iguais_sem_espacos(conteudo1, conteudo2)
+
+def ensure_repo(repo_url, atualizar=False):
+    # Espelho bare no diretório compartilhado (ver repositorios.py); com atualizar, traz os commits novos
+    return REPOSITORIOS.garantir(repo_url, atualizar=atualizar)
+
+def ponta_atual(repo):
+    """Commit mais recente a minerar: a branch remota rastreada (atualizada pelo fetch) ou o HEAD."""
+    try:
+        rastreada = repo.active_branch.tracking_branch()
+    except TypeError:
+        rastreada = None  # HEAD destacado
+    if rastreada is not None and rastreada.is_valid():
+        return rastreada.commit
+    return repo.head.commit
+
+def listar_cenarios(repo_name, repo, ponta=None, desde=None):
+    """
+    Enumera os cenários de merge (repo, merge, arquivo) de um repositório.
+    Só resolve o merge base e o diff entre os pais; a leitura dos blobs
+    fica para quem processa o cenário. Com 'desde', só os merges que não
+    são alcançáveis a partir desse commit (os que chegaram depois dele).
+    """
+    rev = ponta.hexsha if ponta is not None else "HEAD"
+    if desde is not None:
+        try:
+            repo.commit(desde)
+            rev = f"{desde}..{rev}"
+        except Exception:
+            print(f"[AVISO] Ponta do checkpoint ({desde[:7]}) não existe mais; enumerando tudo")
+    print(f" > Total de merges: {contar_merges(repo.git_dir, rev)}")
+
+    # Os merges chegam do rev-list conforme são lidos e os merge bases são
+    # resolvidos por um único cat-file --batch (ver historico_git.py)
+    with CatFileBatch(repo.git_dir) as catfile:
+        grafo = GrafoCommits(catfile)
+        # Para testar com menos cenários, ver --sample (amostragem.py)
+        for merge, pai1, pai2 in iterar_merges(repo.git_dir, rev):
+            try:
+                base = grafo.merge_base(pai1, pai2)
+            except KeyError: continue
+            if base is None: continue
+
+            # Pré-filtro por OID: só sobram arquivos das linguagens ativas alterados
+            # dos dois lados desde a base (nenhum blob é lido aqui)
+            arquivos = arquivos_alterados_nos_dois_lados(
+                catfile, grafo.arvore(base), grafo.arvore(pai1), grafo.arvore(pai2), grafo.arvore(merge),
+                lambda caminho: linguagem_do_arquivo(caminho, LINGUAGENS_ATIVAS) is not None)
+
+            for caminho, oids in arquivos:
+                yield Cenario(repo_name, merge, base, caminho, oids)
+            # Com orçamento de memória, o cache de commits não cresce com o histórico
+            grafo.limitar(ORCAMENTO.max_commits())
+
+def versao_ferramenta(linguagem=None):
+    """Hash do motor de merge da linguagem (padrão: Haskell-SepMerge): muda sempre que a ferramenta muda."""
+    return versao_motor(linguagem or LINGUAGENS["haskell"])
+
+def processar_cenario(repositorio, cenario):
+    """
+    Executa diff3 e Haskell-SepMerge num cenário e calcula as métricas.
+    Retorna a linha do CSV ou None se o cenário não interessa.
+    """
+    filename = cenario.arquivo
+    linguagem = linguagem_do_arquivo(filename)
+
+    # Os OIDs identificam o conteúdo: cenários com os mesmos blobs reaproveitam o resultado
+    chave = chave_cenario(cenario.oids, linguagem)
+    with PERFIL.medir("cache"):
+        metricas = metricas_em_cache(chave)
+    if metricas is None:
+        # Os quatro blobs vêm do cache LRU ou num único pedido ao cat-file --batch
+        # (no clone parcial, os que faltam são buscados antes, numa só ida ao servidor).
+        # Um blob acima do limite do orçamento não é carregado: sobe ObjetoGrande
+        with PERFIL.medir("leitura_blobs"):
+            cenario_merge = CenarioMerge(*repositorio.ler_blobs(cenario.oids, ORCAMENTO.limite_para(cenario.oids)))
+        saidas = {}
+        metricas = calcular_metricas(cenario_merge, linguagem, saidas)
+        guardar_metricas(chave, linguagem, metricas)
+        armazenar(chave, linguagem, metricas, saidas, cenario_merge.manual)
+    registrar_no_armazem(cenario, chave, metricas)
+    return linha_resultado(cenario, linguagem, metricas)
+
+def metricas_em_cache(chave):
+    """As métricas do cache; None também se o cenário interessa e as saídas dele ainda não estão no armazém."""
+    metricas = CACHE.obter(chave)
+    if metricas is not None and metricas["interessante"] and ARMAZEM.ativo and not ARMAZEM.tem(chave):
+        return None
+    return metricas
+
+def armazenar(chave, linguagem, metricas, saidas, manual):
+    """Guarda as saídas de um cenário que vai para os resultados e indexa as regiões de conflito."""
+    if metricas["interessante"]:
+        with PERFIL.medir("armazem"):
+            ARMAZEM.guardar(chave, linguagem, versao_ferramenta(linguagem), saidas, manual)
+
+def registrar_no_armazem(cenario, chave, metricas):
+    # As mesmas saídas podem servir a vários cenários (os mesmos blobs em merges diferentes)
+    if metricas["interessante"]:
+        ARMAZEM.registrar(cenario, chave)
+
+def guardar_metricas(chave, linguagem, metricas):
+    # Falhas podem ser passageiras (máquina carregada): só resultados completos vão para o cache
+    if not any(metricas.get(k) for k in ("diff3_failure", "csdiff_failure", "manual_failure")):
+        CACHE.guardar(chave, versao_ferramenta(linguagem), metricas)
+
+def linha_resultado(cenario, linguagem, metricas):
+    """A linha do CSV com as métricas do cenário, ou None se o cenário não interessa."""
+    filename = cenario.arquivo
+    if not metricas["interessante"]:
+        return None
+    return [
+        cenario.repo, cenario.merge[:7], filename, 
+        metricas["diff3_conflict"], metricas["csdiff_conflict"], 
+        metricas["csdiff_equals_manual"], 
+        metricas["diff3_parse_ok"], metricas["csdiff_parse_ok"], metricas["manual_parse_ok"],
+        metricas.get("diff3_failure", ""), metricas.get("csdiff_failure", ""), metricas.get("manual_failure", ""),
+        versao_ferramenta(linguagem)[:TAMANHO_VERSAO], linguagem.nome
+    ]
+
+# Arquivo (sem a extensão da linguagem) e etapa do perfil de cada validação sintática
+_ARQUIVOS_SINTAXE = {"manual": "temp_manual", "diff3": "out_diff3", "csdiff": "out_csdiff"}
+_ETAPAS_SINTAXE = {"manual": "sintaxe_manual", "diff3": "sintaxe_diff3", "csdiff": "sintaxe_ferramenta"}
+# Caracteres do hash da ferramenta gravados na coluna Tool_Version
+TAMANHO_VERSAO = 12
+
+def executar_cenario(repositorio, cenario):
+    """Processa um cenário e devolve (linha ou None, tempos das etapas, MemoriaCenario)."""
+    zerar_pico()
+    grande = False
+    with PERFIL.cenario() as tempos:
+        try:
+            row = processar_cenario(repositorio, cenario)
+        except ObjetoGrande as e:
+            avisar_grande(cenario, e)
+            row, grande = None, True
+        except Exception as e:
+            # Falhas das ferramentas já viram colunas; aqui só chega o inesperado (blob ausente etc.)
+            print(f"   [ERRO] {cenario.repo} {cenario.merge[:7]} {cenario.arquivo}: {e!r}")
+            row = None
+    memoria = MemoriaCenario(pico_rss_mb(), grande)
+    if acima_do_orcamento():
+        # Acima do orçamento: devolve o que dá para recarregar depois (os blobs em cache)
+        repositorio.cache.limpar()
+        gc.collect()
+    return row, tempos, memoria
+
+def avisar_grande(cenario, e):
+    print(f"   [GRANDE] {cenario.repo} {cenario.merge[:7]} {cenario.arquivo}: blob de "
+          f"{e.tamanho // 1024} KB acima do limite de {ORCAMENTO.limite_arquivo() // 1024} KB; ignorado")
+
+def acima_do_orcamento():
+    if not ORCAMENTO.excedido():
         return False
-    if shutil.which("ghc") is None:
-        print("[AVISO] 'ghc' não encontrado. Validação de sintaxe será ignorada.")
+    if not ORCAMENTO.avisado:
+        print(f"   [MEMÓRIA] RSS acima de {ORCAMENTO.limite_mb:.0f} MB: esvaziando o cache de blobs")
+        ORCAMENTO.avisado = True
     return True
 
-def setup():
-    if not os.path.exists(REPOS_DIR):
-        os.makedirs(REPOS_DIR)
+def calcular_metricas(cenario_merge, linguagem=None, saidas=None):
+    """
+    Roda o diff3 e o motor da linguagem (padrão: Haskell) sobre os blobs e
+    devolve as métricas (o que vai para o cache). Com o dict saidas, deixa
+    nele as duas saídas (bytes, ou None se a ferramenta falhou).
+    """
+    linguagem = linguagem or LINGUAGENS["haskell"]
+    if not cenario_merge.tem_mudancas_dos_dois_lados():
+        return {"interessante": False}
+
+    # Executa ferramentas (entradas e saídas ficam em memória)
+    # Executa o diff3 padrão (já estava no seu script)
+    # Uma ferramenta que estoura tempo/memória ou quebra não derruba o cenário:
+    # a falha (TIMEOUT, OOM ou CRASH) vai para a coluna *_Failure da saída
+    falhas = {}
+    with PERFIL.medir("diff3"):
+        out_diff3 = _executar_ferramenta(cenario_merge.diff3, falhas, "diff3")
     
-    # Adicionada coluna Manual_ParseOK
-    with open(RESULTS_FILE, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            "Repo", "MergeCommit", "File", 
-            "Diff3_Conflict", "CSDiff_Conflict", 
-            "CSDiff_Equals_Manual", 
-            "Diff3_ParseOK", "CSDiff_ParseOK", "Manual_ParseOK"
-        ])
-
-def count_conflicts(filepath):
-    try:
-        with open(filepath, 'r', errors='ignore') as f:
-            return f.read().count("<<<<<<<")
-    except: return 0
+    # Executa a nova ferramenta: no Haskell, o merge roda no servidor persistente
+    # (uma JVM por processo) em vez de "java -jar" por arquivo; nas outras
+    # linguagens, o csdiff com os separadores da linguagem (ver linguagens.py)
+    with PERFIL.medir("merge_ferramenta"):
+        out_csdiff = _executar_ferramenta(lambda: mesclar(linguagem, cenario_merge), falhas, "csdiff")
+    if saidas is not None:
+        saidas.update(diff3=out_diff3, csdiff=out_csdiff)
+
+    # Métricas
+    # (uma passada por saída, guardando onde está cada bloco e o tamanho de cada lado)
+    with PERFIL.medir("contagem_conflitos"):
+        blocos_diff3 = _blocos(out_diff3)
+        blocos_csdiff = _blocos(out_csdiff)
+    c_diff3 = _conflitos(blocos_diff3)
+    c_csdiff = _conflitos(blocos_csdiff)
+    
+    # Só analisamos se houve conflito (ou falha) em alguma ferramenta
+    if c_diff3 == 0 and c_csdiff == 0:
+        return {"interessante": False, "diff3_conflict": 0, "csdiff_conflict": 0}
+
+    with PERFIL.medir("igualdade"):
+        eq_manual = out_csdiff is not None and files_are_equal(out_csdiff, cenario_merge.manual)
+    
+    # Validação sintática na sessão do GHCi do processo (ou no validador
+    # da linguagem); só faz sentido validar saídas sem marcadores de conflito.
+    # O GHC precisa de arquivos .hs de verdade: eles vão para um diretório no tmpfs
+    a_validar = _saidas_a_validar(cenario_merge, c_diff3, c_csdiff, out_diff3, out_csdiff)
+    extensao = linguagem.extensoes[0]
+    # (um arquivo por vez na mesma sessão, para medir cada validação: o validar_lote
+    # também valida um por vez, então nada se perde em relação a uma só chamada)
+    sintaxe = {}
+    with arquivos_em_memoria({_ARQUIVOS_SINTAXE[k] + extensao: v for k, v in a_validar.items()}) as caminhos:
+        for saida in a_validar:
+            with PERFIL.medir(_ETAPAS_SINTAXE[saida]):
+                resultado = validar_lote([caminhos[_ARQUIVOS_SINTAXE[saida] + extensao]], linguagem.validador)[0]
+            _anotar_sintaxe(sintaxe, falhas, saida, resultado)
+
+    return _montar_metricas(c_diff3, c_csdiff, blocos_diff3, blocos_csdiff, eq_manual, sintaxe, falhas)
+
+async def calcular_metricas_async(orquestrador, cenario_merge, linguagem=None, saidas=None):
+    """
+    calcular_metricas no modo assíncrono (ver assincrono.py). O diff3 e o motor
+    da linguagem rodam ao mesmo tempo; se o diff3 deu conflito (o cenário já
+    interessa), a validação do manual começa junto com o merge da ferramenta,
+    e as outras validações rodam juntas no fim. Os tempos das etapas incluem
+    a espera pela vez no semáforo da ferramenta.
+    """
+    linguagem = linguagem or LINGUAGENS["haskell"]
+    if not cenario_merge.tem_mudancas_dos_dois_lados():
+        return {"interessante": False}
 
-def files_are_equal(file1, file2):
+    falhas = {}
+    merges = {
+        "diff3": asyncio.create_task(_ferramenta_async(orquestrador.diff3(cenario_merge), falhas, "diff3", "diff3")),
+        "csdiff": asyncio.create_task(_ferramenta_async(
+            orquestrador.mesclar(linguagem, cenario_merge), falhas, "csdiff", "merge_ferramenta")),
+    }
+    validacoes = {}
     try:
-        with open(file1, "r", encoding='utf-8', errors='ignore') as f1, \
-             open(file2, "r", encoding='utf-8', errors='ignore') as f2:
-            return "".join(f1.read().split()) == "".join(f2.read().split())
-    except: return False
+        out_diff3 = await merges["diff3"]
+        with PERFIL.medir("contagem_conflitos"):
+            blocos_diff3 = _blocos(out_diff3)
+        c_diff3 = _conflitos(blocos_diff3)
+        if c_diff3 != 0:
+            validacoes["manual"] = asyncio.create_task(
+                _validar_async(orquestrador, linguagem, "manual", cenario_merge.manual))
+        out_csdiff = await merges["csdiff"]
+        with PERFIL.medir("contagem_conflitos"):
+            blocos_csdiff = _blocos(out_csdiff)
+        c_csdiff = _conflitos(blocos_csdiff)
+        if saidas is not None:
+            saidas.update(diff3=out_diff3, csdiff=out_csdiff)
+
+        if c_diff3 == 0 and c_csdiff == 0:
+            return {"interessante": False, "diff3_conflict": 0, "csdiff_conflict": 0}
+
+        with PERFIL.medir("igualdade"):
+            eq_manual = out_csdiff is not None and files_are_equal(out_csdiff, cenario_merge.manual)
 
-def check_syntax(filepath):
-    if shutil.which("ghc") is None: return True
+        a_validar = _saidas_a_validar(cenario_merge, c_diff3, c_csdiff, out_diff3, out_csdiff)
+        for saida, conteudo in a_validar.items():
+            if saida not in validacoes:
+                validacoes[saida] = asyncio.create_task(_validar_async(orquestrador, linguagem, saida, conteudo))
+        sintaxe = {}
+        for saida in a_validar:
+            _anotar_sintaxe(sintaxe, falhas, saida, await validacoes[saida])
+    finally:
+        # Num erro inesperado, nada do cenário fica rodando (as concluídas ignoram o cancel)
+        for tarefa in [*merges.values(), *validacoes.values()]:
+            tarefa.cancel()
+
+    return _montar_metricas(c_diff3, c_csdiff, blocos_diff3, blocos_csdiff, eq_manual, sintaxe, falhas)
+
+def _blocos(saida):
+    return None if saida is None else [list(b) for b in regioes_conflito(saida)]
+
+def _conflitos(blocos):
+    return CONFLITOS_FALHA if blocos is None else len(blocos)
+
+def _saidas_a_validar(cenario_merge, c_diff3, c_csdiff, out_diff3, out_csdiff):
+    # --- NOVA VALIDAÇÃO: MANUAL ---
+    # Verificamos se o humano comitou código válido
+    a_validar = {"manual": cenario_merge.manual}
+    if c_diff3 == 0: a_validar["diff3"] = out_diff3
+    if c_csdiff == 0: a_validar["csdiff"] = out_csdiff
+    return a_validar
+
+def _anotar_sintaxe(sintaxe, falhas, saida, resultado):
+    sintaxe[saida] = resultado.ok
+    if resultado.classe_erro in FALHAS_VALIDACAO:
+        falhas[saida] = resultado.classe_erro
+
+def _montar_metricas(c_diff3, c_csdiff, blocos_diff3, blocos_csdiff, eq_manual, sintaxe, falhas):
+    return {
+        "interessante": True,
+        "diff3_conflict": c_diff3,
+        "csdiff_conflict": c_csdiff,
+        # [linha inicial, linha final, linhas left, linhas base, linhas right] por bloco
+        "blocos_diff3": blocos_diff3,
+        "blocos_csdiff": blocos_csdiff,
+        "csdiff_equals_manual": eq_manual,
+        "diff3_parse_ok": sintaxe.get("diff3", False),
+        "csdiff_parse_ok": sintaxe.get("csdiff", False),
+        "manual_parse_ok": sintaxe["manual"],
+        "diff3_failure": falhas.get("diff3", ""),
+        "csdiff_failure": falhas.get("csdiff", ""),
+        "manual_failure": falhas.get("manual", ""),
+    }
+
+def _executar_ferramenta(merge, falhas, saida):
+    """Saída do merge ou None, anotando em falhas[saida] a classe da falha."""
     try:
-        res = subprocess.run(["ghc", "-fno-code", "-v0", filepath], 
-                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
-        if res.returncode == 0: return True
-        err = res.stderr.lower()
-        if any(e in err for e in ["parse error", "lexical error", "incorrect indentation", "unexpected"]):
-            return False
-        return True
-    except: return True
+        return merge()
+    except FalhaFerramenta as e:
+        falhas[saida] = e.classe
+        print(f"   [FALHA] {e}")
+        return None
 
-def get_content_safe(tree, filepath):
-    try: return tree[filepath].data_stream.read()
-    except: return None
+async def _ferramenta_async(merge, falhas, saida, etapa):
+    """_executar_ferramenta para uma corrotina de merge, medindo a etapa."""
+    with PERFIL.medir(etapa):
+        try:
+            return await merge
+        except FalhaFerramenta as e:
+            falhas[saida] = e.classe
+            print(f"   [FALHA] {e}")
+            return None
 
-def process_repo(repo_url):
-    repo_name = repo_url.split("/")[-1].replace(".git", "")
-    repo_path = os.path.join(REPOS_DIR, repo_name)
-    
-    print(f"\n--- Iniciando Repositório: {repo_name} ---")
+async def _validar_async(orquestrador, linguagem, saida, conteudo):
+    # Cada validação tem o seu diretório no tmpfs: elas rodam ao mesmo tempo
+    nome = _ARQUIVOS_SINTAXE[saida] + linguagem.extensoes[0]
+    with arquivos_em_memoria({nome: conteudo}) as caminhos:
+        with PERFIL.medir(_ETAPAS_SINTAXE[saida]):
+            return await orquestrador.validar(caminhos[nome], linguagem.validador)
+
+def cenarios_pendentes(repo_name, repo, retomar=False):
+    """
+    Cenários que ainda faltam processar. Com retomar=True pula os concluídos
+    no checkpoint (ou já presentes no CSV) e, se o repositório já foi minerado
+    até o fim, só enumera os merges novos desde a última ponta.
+    Devolve (ponta, gerador de cenários).
+    """
+    ponta = ponta_atual(repo)
+    if not retomar:
+        return ponta, listar_cenarios(repo_name, repo, ponta)
+    cenarios = listar_cenarios(repo_name, repo, ponta, CHECKPOINT.ponta(repo_name))
+    return ponta, sem_os_concluidos(repo_name, cenarios)
+
+def sem_os_concluidos(repo_name, cenarios):
+    """Os cenários que não estão no checkpoint nem no CSV ao retomar."""
+    feitos = CHECKPOINT.concluidos(repo_name)
+    return (c for c in cenarios
+            if (c.merge, c.arquivo) not in feitos
+            and (c.repo, c.merge[:7], c.arquivo) not in _linhas_no_csv)
+
+def amostrar(repo_urls, amostra, retomar=False):
+    """
+    Enumera todos os repositórios e sorteia a amostra (ver amostragem.py): o
+    sorteio precisa do tamanho de cada estrato. Devolve {repositório: cenários
+    sorteados}; ao retomar, sem os já concluídos. Os repositórios não são
+    atualizados (nem ao retomar): com commits novos, o sorteio mudaria.
+    """
+    for repo_url in repo_urls:
+        repositorio = ensure_repo(repo_url)
+        print(f"\n--- Enumerando Repositório: {repositorio.nome} ---")
+        amostra.adicionar(listar_cenarios(repositorio.nome, Repo(repositorio.caminho)))
+    selecao = {}
+    for cenario in amostra.selecionar():
+        selecao.setdefault(cenario.repo, []).append(cenario)
+    if retomar:
+        selecao = {repo_name: list(sem_os_concluidos(repo_name, cenarios)) for repo_name, cenarios in selecao.items()}
+    return selecao
+
+def concluir_cenario(cenario, row, memoria=None):
+    """Entrega a linha (se houver) e a marca do cenário ao coletor, que grava os dois em lote."""
+    if memoria is not None:
+        acumulado = _memoria_repos.setdefault(cenario.repo, [0.0, 0])
+        acumulado[0] = max(acumulado[0], memoria.pico_rss_mb)
+        acumulado[1] += memoria.grande
+    marca = (cenario.repo, cenario.merge, cenario.arquivo)
+    with PERFIL.medir("gravacao_resultados"):
+        if row is None:
+            COLETOR.adicionar(marca=marca)
+        else:
+            registrar_resultado(row, marca)
+
+def registrar_resultado(row, marca=None):
+    """Único ponto de escrita dos resultados (sempre no processo principal)."""
+    COLETOR.adicionar(row, marca)
     
-    if not os.path.exists(repo_path):
-        Repo.clone_from(repo_url, repo_path)
+    # Log de alerta se o humano errou (código quebrado no repo)
+    if not row[_COLUNA_MANUAL_OK] and not row[_COLUNA_MANUAL_FALHA]:
+        print(f"   [ALERTA] Código Manual Inválido em {row[2]} ({row[1]})")
+
+# --- EXECUÇÃO PARALELA ---
+# Cada worker abre seu próprio cat-file --batch por repositório (REPOSITORIOS é por
+# processo). Os cenários não usam arquivos fixos no diretório corrente (ver
+# cenario.py), então workers não colidem.
+
+def _aplicar_orcamento():
+    """Leva a parte do orçamento de memória deste processo ao cache de blobs."""
+    REPOSITORIOS.cache.limite_bytes = ORCAMENTO.limite_cache_bytes(REPOSITORIOS.cache.limite_bytes)
+
+def imprimir_memoria(repo_name):
+    pico, grandes = _memoria_repos.get(repo_name, (0.0, 0))
+    limite = ORCAMENTO.limite_arquivo()
+    ignorados = f"; {grandes} cenário(s) acima de {limite // 1024} KB ignorado(s)" if limite is not None else ""
+    print(f" > Memória ({repo_name}): pico de {pico:.0f} MB de RSS por processo{ignorados}")
+
+def _inicializar_worker(perfil_ativo=False, cprofile=None, orcamento=(None, None, 0.0)):
+    # Workers saem com os._exit, então o atexit não roda: encerra a JVM do worker explicitamente
+    Finalize(None, fechar_clientes, exitpriority=10)
+    Finalize(None, fechar_sessoes, exitpriority=10)
+    Finalize(None, REPOSITORIOS.fechar, exitpriority=10)
+    # A parte do orçamento de cada worker (a mesma do processo principal)
+    ORCAMENTO.limite_mb, ORCAMENTO.limite_arquivo_kb, ORCAMENTO.amostra_grandes = orcamento
+    _aplicar_orcamento()
+    # Os tempos voltam com cada resultado; o cProfile é gravado por worker (arquivo.<pid>)
+    PERFIL.ativo = perfil_ativo
+    if cprofile:
+        iniciar_cprofile()
+        Finalize(None, salvar_cprofile, args=(cprofile, True), exitpriority=20)
+
+def _processar_no_worker(cenario):
+    # Cada worker abre o seu cat-file (e tem o seu cache de blobs) por repositório
+    return executar_cenario(REPOSITORIOS.abrir(cenario.repo), cenario)
+
+def process_repo(repo_url, retomar=False, selecao=None):
+    """Minera um repositório; com selecao (ver amostrar), só os cenários sorteados dele."""
+    repositorio = ensure_repo(repo_url, atualizar=retomar and selecao is None)
+    print(f"\n--- Iniciando Repositório: {repositorio.nome} ---")
     
-    repo = Repo(repo_path)
-    merges = [c for c in repo.iter_commits() if len(c.parents) == 2]
-    print(f" > Total de merges: {len(merges)}")
-
-    # Sem limite de break para rodar tudo (ou descomente para testar)
-    for i, commit in enumerate(merges):
-        # if i >= 200: break 
-        
-        parent1 = commit.parents[0]
-        parent2 = commit.parents[1]
-        
+    if selecao is None:
+        ponta, cenarios = cenarios_pendentes(repositorio.nome, Repo(repositorio.caminho), retomar)
+    else:
+        ponta, cenarios = None, selecao.get(repositorio.nome, [])
+    _aplicar_orcamento()
+    for cenario in PERFIL.cronometrar(cenarios, "enumeracao"):
+        row, tempos, memoria = executar_cenario(repositorio, cenario)
+        PERFIL.acumular(tempos)
+        concluir_cenario(cenario, row, memoria)
+    COLETOR.descarregar()
+    # Numa amostra não há ponta: os merges que ficaram de fora não foram minerados
+    if ponta is not None:
+        CHECKPOINT.registrar_ponta(repositorio.nome, ponta.hexsha)
+    # O pico da enumeração entre um cenário e outro também conta
+    acumulado = _memoria_repos.setdefault(repositorio.nome, [0.0, 0])
+    acumulado[0] = max(acumulado[0], pico_rss_mb())
+    imprimir_memoria(repositorio.nome)
+
+def process_repos_parallel(repo_urls, workers, retomar=False, cprofile=None, selecao=None):
+    """
+    Modo paralelo: enumera os cenários de todos os repositórios e os distribui
+    num pool de processos. Os resultados voltam para o processo principal,
+    que é o único escritor do CSV (e do checkpoint). Com selecao (ver
+    amostrar), só os cenários sorteados.
+    """
+    pontas = []
+    # O orçamento é dividido entre os workers e o processo principal (que só enumera)
+    ORCAMENTO.dividir(workers + 1)
+    _aplicar_orcamento()
+    orcamento = (ORCAMENTO.limite_mb, ORCAMENTO.limite_arquivo_kb, ORCAMENTO.amostra_grandes)
+    zerar_pico()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker,
+                             initargs=(PERFIL.ativo, cprofile, orcamento)) as pool:
+        em_voo = {}
+        for repo_url in repo_urls:
+            repositorio = ensure_repo(repo_url, atualizar=retomar and selecao is None)
+            if selecao is None:
+                print(f"\n--- Enumerando Repositório: {repositorio.nome} ---")
+                ponta, cenarios = cenarios_pendentes(repositorio.nome, Repo(repositorio.caminho), retomar)
+                pontas.append((repositorio.nome, ponta.hexsha))
+            else:
+                cenarios = selecao.get(repositorio.nome, [])
+            for cenario in PERFIL.cronometrar(cenarios, "enumeracao"):
+                em_voo[pool.submit(_processar_no_worker, cenario)] = cenario
+                # Limita os cenários em voo para a memória não crescer com o histórico
+                if len(em_voo) >= workers * 4:
+                    prontos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                    _registrar_prontos(prontos, em_voo)
+        _registrar_prontos(wait(em_voo).done, em_voo)
+    COLETOR.descarregar()
+    # As pontas só valem quando todos os cenários de todos os repositórios terminaram
+    for repo_name, ponta in pontas:
+        CHECKPOINT.registrar_ponta(repo_name, ponta)
+    for repo_name in (selecao if selecao is not None else dict(pontas)):
+        imprimir_memoria(repo_name)
+    print(f" > Memória do processo principal (enumeração e gravação): pico de {pico_rss_mb():.0f} MB de RSS")
+
+def _registrar_prontos(futures, em_voo):
+    for future in futures:
+        row, tempos, memoria = future.result()
+        PERFIL.acumular(tempos)
+        concluir_cenario(em_voo.pop(future), row, memoria)
+
+# --- EXECUÇÃO ASSÍNCRONA ---
+# Um só processo: os cenários são tarefas do asyncio e as ferramentas rodam
+# como subprocessos assíncronos, cada tipo limitado pelo seu semáforo (ver
+# assincrono.py). O cache, o checkpoint e o CSV continuam no laço principal.
+
+async def processar_cenario_async(orquestrador, repositorio, cenario):
+    """processar_cenario com as ferramentas do orquestrador."""
+    linguagem = linguagem_do_arquivo(cenario.arquivo)
+    chave = chave_cenario(cenario.oids, linguagem)
+    with PERFIL.medir("cache"):
+        metricas = metricas_em_cache(chave)
+    if metricas is None:
+        with PERFIL.medir("leitura_blobs"):
+            blobs = await orquestrador.ler_blobs(repositorio, cenario.oids, ORCAMENTO.limite_para(cenario.oids))
+        saidas = {}
+        metricas = await calcular_metricas_async(orquestrador, CenarioMerge(*blobs), linguagem, saidas)
+        guardar_metricas(chave, linguagem, metricas)
+        armazenar(chave, linguagem, metricas, saidas, blobs[3])
+    registrar_no_armazem(cenario, chave, metricas)
+    return linha_resultado(cenario, linguagem, metricas)
+
+async def executar_cenario_async(orquestrador, repositorio, cenario):
+    """executar_cenario para uma tarefa: o pico de RSS é o do processo, que roda todos os cenários."""
+    grande = False
+    with PERFIL.cenario() as tempos:
         try:
-            base = repo.merge_base(parent1, parent2)[0]
-        except: continue
-        
-        diffs = parent1.diff(parent2)
-        hs_files = [d for d in diffs if d.a_path.endswith(".hs")]
-        
-        for diff in hs_files:
-            filename = diff.a_path
-            
-            base_blob = get_content_safe(base.tree, filename)
-            left_blob = get_content_safe(parent1.tree, filename)
-            right_blob = get_content_safe(parent2.tree, filename)
-            
-            if base_blob is None or left_blob is None or right_blob is None: continue
-
-            if (base_blob == left_blob or base_blob == right_blob or left_blob == right_blob):
-                continue
+            row = await processar_cenario_async(orquestrador, repositorio, cenario)
+        except ObjetoGrande as e:
+            avisar_grande(cenario, e)
+            row, grande = None, True
+        except Exception as e:
+            print(f"   [ERRO] {cenario.repo} {cenario.merge[:7]} {cenario.arquivo}: {e!r}")
+            row = None
+    if acima_do_orcamento():
+        await orquestrador.limpar_cache(repositorio)
+        gc.collect()
+    return row, tempos, MemoriaCenario(pico_rss_mb(), grande)
 
-            try:
-                manual_blob = get_content_safe(commit.tree, filename)
-                if manual_blob is None: continue
-
-                with open("temp_base.hs", "wb") as f: f.write(base_blob)
-                with open("temp_left.hs", "wb") as f: f.write(left_blob)
-                with open("temp_right.hs", "wb") as f: f.write(right_blob)
-                with open("temp_manual.hs", "wb") as f: f.write(manual_blob)
-                
-                # Executa ferramentas
-                # Executa o diff3 padrão (já estava no seu script)
-                subprocess.run(["diff3", "-m", "temp_left.hs", "temp_base.hs", "temp_right.hs"], 
-                               stdout=open("out_diff3.hs", "w"), stderr=subprocess.DEVNULL)
-                
-                # Executa a nova ferramenta Java
-                # Note que o redirect ">" salva a saída System.out.println(line) do Java no arquivo "out_csdiff.hs"
-                with open("out_csdiff.hs", "w") as out_file:
-                    subprocess.run(["java", "-jar", HASKELL_SEPMERGE_JAR, "temp_base.hs", "temp_left.hs", "temp_right.hs"],
-                                   stdout=out_file, stderr=subprocess.DEVNULL)
-
-                # Métricas
-                c_diff3 = count_conflicts("out_diff3.hs")
-                c_csdiff = count_conflicts("out_csdiff.hs")
-                
-                # Só analisamos se houve conflito em alguma ferramenta
-                if c_diff3 > 0 or c_csdiff > 0:
-                    eq_manual = files_are_equal("out_csdiff.hs", "temp_manual.hs")
-                    
-                    parse_diff3 = check_syntax("out_diff3.hs") if c_diff3 == 0 else False
-                    parse_csdiff = check_syntax("out_csdiff.hs") if c_csdiff == 0 else False
-                    
-                    # --- NOVA VALIDAÇÃO: MANUAL ---
-                    # Verificamos se o humano comitou código válido
-                    parse_manual = check_syntax("temp_manual.hs")
-
-                    with open(RESULTS_FILE, 'a', newline='') as csvfile:
-                        writer = csv.writer(csvfile)
-                        writer.writerow([
-                            repo_name, commit.hexsha[:7], filename, 
-                            c_diff3, c_csdiff, 
-                            eq_manual, 
-                            parse_diff3, parse_csdiff, parse_manual
-                        ])
-                    
-                    # Log de alerta se o humano errou (código quebrado no repo)
-                    if not parse_manual:
-                        print(f"   [ALERTA] Código Manual Inválido em {filename} ({commit.hexsha[:7]})")
-
-            except Exception:
+def process_repos_async(repo_urls, retomar=False, selecao=None, limites=None):
+    """
+    Modo assíncrono: como o paralelo, enumera os repositórios e mantém até
+    limites["cenarios"] cenários em andamento, mas num só processo, com as
+    etapas de cenários diferentes se sobrepondo. Com selecao (ver amostrar),
+    só os cenários sorteados.
+    """
+    asyncio.run(_process_repos_async(repo_urls, retomar, selecao, limites or dict(LIMITES_PADRAO)))
+
+async def _process_repos_async(repo_urls, retomar, selecao, limites):
+    orquestrador = Orquestrador(limites)
+    pontas = []
+    _aplicar_orcamento()
+    zerar_pico()
+    em_voo = {}
+    try:
+        for repo_url in repo_urls:
+            repositorio = ensure_repo(repo_url, atualizar=retomar and selecao is None)
+            if selecao is None:
+                print(f"\n--- Enumerando Repositório: {repositorio.nome} ---")
+                ponta, cenarios = cenarios_pendentes(repositorio.nome, Repo(repositorio.caminho), retomar)
+                pontas.append((repositorio.nome, ponta.hexsha))
+            else:
+                cenarios = selecao.get(repositorio.nome, [])
+            for cenario in PERFIL.cronometrar(cenarios, "enumeracao"):
+                em_voo[asyncio.create_task(executar_cenario_async(orquestrador, repositorio, cenario))] = cenario
+                if len(em_voo) >= limites["cenarios"]:
+                    prontos, _ = await asyncio.wait(em_voo, return_when=asyncio.FIRST_COMPLETED)
+                    _registrar_prontos(prontos, em_voo)
+                else:
+                    # A enumeração é síncrona: cede a vez para as tarefas andarem entre um cenário e outro
+                    await asyncio.sleep(0)
+        if em_voo:
+            _registrar_prontos((await asyncio.wait(em_voo))[0], em_voo)
+    finally:
+        for tarefa in em_voo:
+            tarefa.cancel()
+        await orquestrador.fechar()
+    COLETOR.descarregar()
+    for repo_name, ponta in pontas:
+        CHECKPOINT.registrar_ponta(repo_name, ponta)
+    for repo_name in (selecao if selecao is not None else dict(pontas)):
+        imprimir_memoria(repo_name)
+
+# --- EXECUÇÃO DISTRIBUÍDA ---
+# O coordenador (--coordinator FILA) enumera e publica os cenários e grava os
+# resultados; cada trabalhador (--worker FILA, em qualquer máquina que enxergue
+# a fila) clona os repositórios no seu --repos-dir e processa os cenários que
+# alugar (ver fila_distribuida.py).
+
+# Intervalo entre os resumos do andamento da fila no coordenador (segundos)
+INTERVALO_PROGRESSO = 30
+
+def coordenar(repo_urls, caminho_fila, retomar=False, selecao=None, duracao=DURACAO_ALUGUEL):
+    """
+    Modo coordenador: como o paralelo, mas os cenários vão para a fila e as
+    linhas voltam dos trabalhadores. A coleta acontece durante a publicação
+    e depois dela, até a fila esvaziar ou até nenhum trabalhador dar sinal de
+    vida por um prazo (duracao) inteiro; as tarefas que restarem ficam na fila
+    para o --resume. Com selecao (ver amostrar), só os cenários sorteados.
+    """
+    fila = FilaTrabalho(caminho_fila)
+    # Os trabalhadores medem as etapas se o coordenador vai gerar o relatório
+    opcoes = {"perfil": PERFIL.ativo}
+    if retomar:
+        fila.retomar(opcoes)
+    else:
+        fila.reiniciar(opcoes)
+    pontas = []
+    zerar_pico()
+    # Ao retomar, a primeira coleta pode trazer linhas já gravadas antes da interrupção
+    conferir = retomar
+    for repo_url in repo_urls:
+        repositorio = ensure_repo(repo_url, atualizar=retomar and selecao is None)
+        if selecao is None:
+            print(f"\n--- Enumerando Repositório: {repositorio.nome} ---")
+            ponta, cenarios = cenarios_pendentes(repositorio.nome, Repo(repositorio.caminho), retomar)
+            pontas.append((repositorio.nome, ponta.hexsha))
+        else:
+            cenarios = iter(selecao.get(repositorio.nome, []))
+        cenarios = PERFIL.cronometrar(cenarios, "enumeracao")
+        publicadas = 0
+        while lote := list(islice(cenarios, LOTE_PUBLICACAO)):
+            publicadas += fila.publicar(repo_url, lote)
+            _coletar_da_fila(fila, conferir)
+            conferir = False
+        print(f" > {publicadas} cenário(s) publicados na fila")
+    fila.fechar_publicacao()
+
+    # Os trabalhadores têm um prazo, a partir do fim da publicação, para aparecer
+    fim_publicacao = time.time()
+    ultimo_resumo = time.monotonic()
+    while not fila.encerrada():
+        if not _coletar_da_fila(fila, conferir):
+            time.sleep(INTERVALO_FILA)
+        conferir = False
+        if time.time() > max(fim_publicacao + duracao, fila.prazo_trabalhadores() or 0):
+            print(f" > Nenhum trabalhador deu sinal de vida nos últimos {duracao:.0f}s: encerrando a coleta "
+                  "(as tarefas restantes ficam na fila para o --resume)")
+            break
+        if time.monotonic() - ultimo_resumo >= INTERVALO_PROGRESSO:
+            resumo = fila.resumo()
+            print(f" > Fila: {resumo.get('concluida', 0)} concluídos, {resumo.get('alugada', 0)} em andamento, "
+                  f"{resumo.get('pendente', 0)} pendentes, {resumo.get('falhou', 0)} com falha")
+            ultimo_resumo = time.monotonic()
+    _coletar_da_fila(fila, conferir)
+    COLETOR.descarregar()
+
+    falhas = fila.falhas()
+    if falhas:
+        print(f" > {len(falhas)} cenário(s) desistidos depois de todas as tentativas (o --resume tenta de novo)")
+    # Um repositório com cenários que falharam (ou que ficaram na fila) fica sem ponta:
+    # o --resume enumera tudo de novo e pula os concluídos
+    inacabados = fila.inacabadas()
+    for repo_name, ponta in pontas:
+        if repo_name not in inacabados:
+            CHECKPOINT.registrar_ponta(repo_name, ponta)
+    for repo_name in (selecao if selecao is not None else dict(pontas)):
+        imprimir_memoria(repo_name)
+
+def _coletar_da_fila(fila, conferir=False):
+    """Grava as linhas das tarefas terminadas; devolve quantas tarefas foram coletadas."""
+    terminadas = fila.coletar()
+    cenarios = [Cenario(t.repo, t.merge, t.base, t.arquivo, tuple(t.oids)) for t, _, _ in terminadas]
+    novos = None
+    if conferir:
+        novos = set()
+        for repo_name in {cenario.repo for cenario in cenarios}:
+            novos.update(sem_os_concluidos(repo_name, [c for c in cenarios if c.repo == repo_name]))
+    for cenario, (_, resultado, erro) in zip(cenarios, terminadas):
+        if resultado is None:
+            print(f"   [FILA] {cenario.repo} {cenario.merge[:7]} {cenario.arquivo}: desistindo ({erro})")
+        elif novos is None or cenario in novos:
+            PERFIL.acumular(resultado["tempos"])
+            concluir_cenario(cenario, resultado["linha"], MemoriaCenario(*resultado["memoria"]))
+    if terminadas:
+        # As tarefas só saem da coleta depois que as linhas estão no disco
+        COLETOR.descarregar()
+        fila.marcar_coletadas([tarefa.id for tarefa, _, _ in terminadas])
+    return len(terminadas)
+
+def trabalhar(caminho_fila, lote=TAMANHO_LOTE_FILA, duracao=DURACAO_ALUGUEL):
+    """
+    Modo trabalhador: aluga lotes de tarefas, processa cada cenário e devolve
+    a linha, até o coordenador fechar a publicação e a fila esvaziar. Não
+    grava CSV nem checkpoint; o cache e o armazém das saídas são os do nó.
+    """
+    fila = FilaTrabalho(caminho_fila)
+    dono = identificador_trabalhador()
+    print(f"--- Trabalhador {dono} na fila {caminho_fila} ---")
+    _aplicar_orcamento()
+    feitos = 0
+    with Batimento(caminho_fila, dono, duracao) as batimento:
+        while True:
+            tarefas = fila.alugar(dono, lote, duracao)
+            if not tarefas:
+                if fila.encerrada():
+                    break
+                time.sleep(INTERVALO_FILA)
                 continue
+            PERFIL.ativo = fila.opcoes().get("perfil", False)
+            for tarefa in tarefas:
+                batimento.tarefa()
+                cenario = Cenario(tarefa.repo, tarefa.merge, tarefa.base, tarefa.arquivo, tuple(tarefa.oids))
+                try:
+                    repositorio = _repositorio_da_tarefa(tarefa)
+                except Exception as e:
+                    print(f"   [FILA] {tarefa.repo_url}: {e!r}")
+                    fila.falhar(dono, tarefa.id, repr(e))
+                    continue
+                row, tempos, memoria = executar_cenario(repositorio, cenario)
+                if fila.concluir(dono, tarefa.id, {"linha": row, "tempos": tempos, "memoria": list(memoria)}):
+                    feitos += 1
+                else:
+                    print(f"   [FILA] Aluguel perdido, resultado descartado: {cenario.repo} {cenario.merge[:7]} "
+                          f"{cenario.arquivo}")
+    print(f" > Trabalhador {dono}: {feitos} cenário(s) concluídos")
+
+def _repositorio_da_tarefa(tarefa):
+    """O repositório no diretório deste nó: clonado na primeira tarefa e atualizado se o merge ainda não chegou."""
+    repositorio = ensure_repo(tarefa.repo_url)
+    try:
+        repositorio.grafo.commit(tarefa.merge)
+    except KeyError:
+        REPOSITORIOS.atualizar(repositorio.nome)
+        # O cat-file é reaberto e enxerga os objetos trazidos pelo fetch
+        repositorio.close()
+        repositorio.grafo.commit(tarefa.merge)
+    return repositorio
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minera cenários de merge em repositórios Haskell (e de outras linguagens).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de processos em paralelo (1 = execução sequencial)")
+    parser.add_argument("--async", dest="assincrono", action="store_true",
+                        help="Um só processo com asyncio: leituras do git, merges e validações de cenários "
+                             "diferentes se sobrepõem (não combina com --workers)")
+    parser.add_argument("--async-limit", action="append", metavar="TIPO=N",
+                        help="Chamadas simultâneas de um tipo no --async (pode repetir); tipos e padrões: "
+                             + ", ".join(f"{tipo}={n}" for tipo, n in LIMITES_PADRAO.items()))
+    parser.add_argument("--coordinator", metavar="FILA",
+                        help="Coordenador da mineração distribuída: publica os cenários na fila (um SQLite visível "
+                             "para os trabalhadores) e grava os resultados que eles devolvem")
+    parser.add_argument("--worker", metavar="FILA",
+                        help="Trabalhador da mineração distribuída: processa os cenários da fila até ela esvaziar "
+                             "(rode quantos quiser, em qualquer máquina que enxergue a fila)")
+    parser.add_argument("--lease-seconds", type=float, default=DURACAO_ALUGUEL, metavar="S",
+                        help="Prazo do aluguel de uma tarefa; sem batimento nesse prazo ela volta para a fila, e "
+                             f"uma tarefa que passa de {LIMITE_ALUGUEIS_TAREFA} prazos perde o batimento. No "
+                             "coordenador: quanto esperar sem sinal de nenhum trabalhador antes de desistir "
+                             f"(padrão: {DURACAO_ALUGUEL})")
+    parser.add_argument("--lease-batch", type=int, default=TAMANHO_LOTE_FILA, metavar="N",
+                        help=f"Tarefas alugadas de uma vez por trabalhador (padrão: {TAMANHO_LOTE_FILA})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Não consulta nem grava o cache de resultados")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Não guarda as saídas nem o índice das regiões de conflito (ver armazem_saidas.py)")
+    parser.add_argument("--invalidate-tool", nargs="?", const="atual", metavar="HASH",
+                        help="Apaga do cache os resultados da ferramenta atual (ou do HASH informado)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Mantém o CSV e pula os cenários já concluídos; após um git fetch, processa só os merges novos")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="Formato dos resultados (parquet grava um diretório de partes com tipos)")
+    parser.add_argument("--profile-report", metavar="ARQUIVO_JSON",
+                        help="Mede cada etapa por cenário e grava o relatório (percentis e histogramas) neste JSON")
+    parser.add_argument("--cprofile", metavar="ARQUIVO_PROF",
+                        help="Grava o perfil do cProfile (pstats); cada worker grava ARQUIVO_PROF.<pid>")
+    parser.add_argument("--languages", nargs="+", choices=list(LINGUAGENS), default=LINGUAGENS_ATIVAS,
+                        help=f"Linguagens mineradas numa só passada pelo histórico (padrão: {' '.join(LINGUAGENS_ATIVAS)})")
+    parser.add_argument("--repo-urls", nargs="+", metavar="URL", default=REPOS_TO_MINE,
+                        help="Repositórios a minerar (padrão: os de REPOS_TO_MINE)")
+    parser.add_argument("--sample", type=int, metavar="N",
+                        help=f"Minera só N cenários sorteados (mais os que deram conflito ou código inválido em "
+                             f"{RESULTS_FILE}) e extrapola as métricas para o corpus; grava em {SAMPLE_RESULTS_FILE}")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Semente do sorteio do --sample (a mesma semente dá a mesma amostra)")
+    parser.add_argument("--stratify", choices=list(ESTRATOS),
+                        help="Reparte o --sample entre repositórios ou linguagens, em proporção ao tamanho de cada um")
+    adicionar_argumentos(parser)
+    adicionar_opcoes_repositorios(parser)
+    adicionar_opcoes_memoria(parser)
+    parser.add_argument("--cache-max-mb", type=int, default=CACHE.limite_bytes // 1024 ** 2,
+                        help="Tamanho máximo do cache antes de descartar as entradas menos usadas")
+    args = parser.parse_args()
+    LINGUAGENS_ATIVAS[:] = args.languages
+    if args.assincrono and args.workers > 1:
+        parser.error("--async e --workers > 1 não se combinam")
+    if args.coordinator and args.worker:
+        parser.error("--coordinator e --worker não se combinam (rode os trabalhadores em outros processos)")
+    if (args.coordinator or args.worker) and (args.assincrono or args.workers > 1):
+        parser.error("--coordinator e --worker não se combinam com --async nem com --workers > 1")
+    try:
+        limites_async = ler_limites(args.async_limit)
+    except ValueError as e:
+        parser.error(str(e))
+
     if check_dependencies():
-        setup()
-        for url in REPOS_TO_MINE:
-            process_repo(url)
-        print(f"\nFim! Verifique '{RESULTS_FILE}'")
\ No newline at end of file
+        aplicar_argumentos(args)
+        aplicar_opcoes_repositorios(args)
+        aplicar_opcoes_memoria(args)
+        CACHE.ativo = not args.no_cache
+        ARMAZEM.ativo = not args.no_store
+        CACHE.limite_bytes = args.cache_max_mb * 1024 ** 2
+        if args.invalidate_tool:
+            alvos = ([versao_ferramenta(LINGUAGENS[nome]) for nome in LINGUAGENS_ATIVAS]
+                     if args.invalidate_tool == "atual" else [args.invalidate_tool])
+            for alvo in alvos:
+                print(f" > Cache: {CACHE.invalidar_ferramenta(alvo)} resultados removidos ({alvo[:12]})")
+        PERFIL.ativo = args.profile_report is not None
+        if args.cprofile:
+            iniciar_cprofile()
+        if args.worker:
+            # O trabalhador não grava resultados: as linhas voltam pela fila para o coordenador
+            trabalhar(args.worker, args.lease_batch, args.lease_seconds)
+        else:
+            amostra = selecao = None
+            if args.sample is not None:
+                amostra = Amostra(args.sample, args.seed, args.stratify,
+                                  prioritarios(caminho_resultados(RESULTS_FILE, args.format)))
+                # Resultados e checkpoint próprios: a rodada completa (e o seu --resume) não é tocada
+                RESULTS_FILE = SAMPLE_RESULTS_FILE
+                CHECKPOINT.caminho = SAMPLE_CHECKPOINT_FILE
+            setup(retomar=args.resume, formato=args.format)
+            if amostra is not None:
+                selecao = amostrar(args.repo_urls, amostra, retomar=args.resume)
+            if args.coordinator:
+                coordenar(args.repo_urls, args.coordinator, retomar=args.resume, selecao=selecao,
+                          duracao=args.lease_seconds)
+            elif args.assincrono:
+                process_repos_async(args.repo_urls, retomar=args.resume, selecao=selecao, limites=limites_async)
+            elif args.workers > 1:
+                process_repos_parallel(args.repo_urls, args.workers, retomar=args.resume, cprofile=args.cprofile,
+                                       selecao=selecao)
+            else:
+                for url in args.repo_urls:
+                    process_repo(url, retomar=args.resume, selecao=selecao)
+            if amostra is not None:
+                imprimir_estimativas(amostra, amostra.estimar(COLETOR.caminho))
+        CACHE.aplicar_limite()
+        if args.cprofile:
+            salvar_cprofile(args.cprofile)
+        if PERFIL.ativo and not args.worker:
+            PERFIL.imprimir_resumo(PERFIL.salvar(args.profile_report))
+            print(f" > Perfil da rodada salvo em '{args.profile_report}'")
+        if not args.worker:
+            print(f"\nFim! Verifique '{COLETOR.caminho}'")
@@ -1,13 +1,15 @@
 # SCRIPT PARA BUSCAR OS CONFLITOS PARA ANALISE
 import os
-import subprocess
-from git import Repo
+from execucao import executar, FalhaFerramenta
+from repositorios import REPOSITORIOS
+from cenario import CenarioMerge
+from linguagens import LINGUAGENS, linguagem_do_arquivo, mesclar
+from armazem_saidas import saida_registrada
 
 # CONFIGURAÇÕES
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 HASKELL_SEPMERGE_JAR = os.path.abspath(os.path.join(SCRIPT_DIR, "../haskell/haskell-sepmerge.jar"))
 print(f"Usando JAR em: {HASKELL_SEPMERGE_JAR}")
-REPOS_DIR = "./repos_haskell"
 OUTPUT_DIR = "./casos_estudo"
 
 # Seus casos encontrados
@@ -27,17 +29,12 @@ REPO_URLS = {
 
 def ensure_repo_cloned(repo_name):
     """
-    Garante que o repositório existe em REPOS_DIR.
+    Garante que o repositório existe no diretório compartilhado (ver repositorios.py).
     Se não existir, ele é clonado automaticamente.
     """
-    repo_path = os.path.join(REPOS_DIR, repo_name)
-
-    # Cria a pasta onde ficam os repositórios
-    os.makedirs(REPOS_DIR, exist_ok=True)
-
-    if os.path.exists(repo_path):
-        print(f"   [OK] Repositório encontrado: {repo_path}")
-        return repo_path
+    if REPOSITORIOS.existe(repo_name):
+        print(f"   [OK] Repositório encontrado: {REPOSITORIOS.caminho(repo_name)}")
+        return REPOSITORIOS.abrir(repo_name)
 
     # Verifica se temos URL para este repo
     if repo_name not in REPO_URLS:
@@ -47,110 +44,128 @@ def ensure_repo_cloned(repo_name):
     print(f"   [CLONANDO] {repo_name} de {repo_url} ...")
 
     try:
-        Repo.clone_from(repo_url, repo_path)
+        repositorio = REPOSITORIOS.garantir(repo_url)
         print(f"   [OK] Clone concluído")
     except Exception as e:
         print(f"   [ERRO] Falha ao clonar {repo_name}: {e}")
         raise e
 
-    return repo_path
+    return repositorio
 
 
-def extract_cases():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def extrair_caso(repo_name, commit_sha, filepath, output_dir=OUTPUT_DIR, separar_arquivos=False):
+    """
+    Extrai um caso para output_dir/<repo>_<merge>/ e devolve o diretório (ou
+    None se falhou). Com separar_arquivos, cada arquivo do merge vai para uma
+    subpasta própria (vários arquivos do mesmo merge não se sobrescrevem).
+    """
+    merge_short = commit_sha[:7]
+    print(f"--- Extraindo caso de merge: {merge_short} ({filepath}) ---")
 
-    for repo_name, commit_sha, filepath in CASOS_INTERESSANTES:
-        merge_short = commit_sha[:7]
-        print(f"--- Extraindo caso de merge: {merge_short} ({filepath}) ---")
+    # Agora garantimos que o repositório existe (clonando se necessário)
+    try:
+        repositorio = ensure_repo_cloned(repo_name)
+    except Exception:
+        print("   [ERRO] Não foi possível obter o repositório.")
+        return None
+
+    # Base e pais do merge; os quatro blobs vêm numa só leitura
+    try:
+        base_sha, left_sha, right_sha = repositorio.revisoes_do_merge(commit_sha)
+        oids = repositorio.oids_do_merge(commit_sha, filepath)
+        base_blob, left_blob, right_blob, manual_blob = repositorio.ler_blobs(oids)
+    except KeyError:
+        print(f"   [ERRO] Commit {commit_sha} não encontrado no repo!")
+        return None
+
+    id_base = base_sha[:7]
+    id_left = left_sha[:7]
+    id_right = right_sha[:7]
+    id_manual = merge_short
+    # Motor e extensão da linguagem do arquivo (ver linguagens.py)
+    linguagem = linguagem_do_arquivo(filepath) or LINGUAGENS["haskell"]
+    ext = linguagem.extensoes[0]
 
-        # Agora garantimos que o repositório existe (clonando se necessário)
+    try:
+        case_dir = os.path.join(output_dir, f"{repo_name}_{merge_short}")
+        if separar_arquivos:
+            case_dir = os.path.join(case_dir, filepath.replace("/", "_").replace("\\", "_"))
+        os.makedirs(case_dir, exist_ok=True)
+
+        f_base = f"{case_dir}/base_{id_base}{ext}"
+        f_left = f"{case_dir}/left_{id_left}{ext}"
+        f_right = f"{case_dir}/right_{id_right}{ext}"
+        f_manual = f"{case_dir}/manual_{id_manual}{ext}"
+        f_merge_diff3 = f"{case_dir}/merge_diff3_{id_manual}{ext}"
+        f_merge_csdiff = f"{case_dir}/merge_csdiff_{id_manual}{ext}"
+
+        # Base, left e right
+        if None in (base_blob, left_blob, right_blob):
+            raise KeyError(filepath)
+        with open(f_base, "wb") as f: f.write(base_blob)
+        with open(f_left, "wb") as f: f.write(left_blob)
+        with open(f_right, "wb") as f: f.write(right_blob)
+
+        # Manual
+        if manual_blob is None:
+            print("   [AVISO] Manual não encontrado.")
+        else:
+            with open(f_manual, "wb") as f: f.write(manual_blob)
+
+        # diff3 (com timeout e limites; código 1 = houve conflito)
+        try:
+            res = executar(["diff3", "-m", f_left, f_base, f_right], "diff3", codigos_ok=(0, 1))
+            with open(f_merge_diff3, "wb") as out:
+                out.write(res.stdout)
+        except FalhaFerramenta as e:
+            print(f"   [FALHA] {e}")
+
+        # csdiff: a saída que o runner já guardou para estes blobs ou, se o cenário
+        # não foi minerado, o motor da linguagem (no Haskell, o servidor de merge
+        # persistente, sem subir uma JVM por caso)
         try:
-            repo_path = ensure_repo_cloned(repo_name)
-        except Exception:
-            print("   [ERRO] Não foi possível obter o repositório.")
-            continue
+            merged_text = saida_registrada(oids, filepath)
+            if merged_text is None:
+                merged_text = mesclar(linguagem, CenarioMerge(base_blob, left_blob, right_blob)).decode("utf-8", errors="replace")
+            with open(f_merge_csdiff, "w") as out:
+                out.write(merged_text)
+        except FalhaFerramenta as e:
+            # Erro do Java, timeout ou falta de memória: imprimimos no console na hora!
+            print(f"   [ERRO JAVA] {e}")
 
-        # Abre o repositório
-        repo = Repo(repo_path)
+        # info.txt
+        if repo_name in REPO_URLS:
+            base = REPO_URLS[repo_name]
+            with open(f"{case_dir}/info.txt", "w") as f:
+                f.write(f"Repo: {repo_name}\n")
+                f.write(f"Arquivo: {filepath}\n\n")
 
-        try:
-            merge_commit = repo.commit(commit_sha)
-        except:
-            print(f"   [ERRO] Commit {commit_sha} não encontrado no repo!")
-            continue
+                f.write(f"Commit Merge (Manual): {merge_short}\n")
+                f.write(f"Link: {base}/commit/{commit_sha}\n\n")
 
-        parent1 = merge_commit.parents[0]
-        parent2 = merge_commit.parents[1]
-        base_commit = repo.merge_base(parent1, parent2)[0]
+                f.write(f"Commit Base: {id_base}\n")
+                f.write(f"Link: {base}/commit/{base_sha}\n\n")
 
-        id_base = base_commit.hexsha[:7]
-        id_left = parent1.hexsha[:7]
-        id_right = parent2.hexsha[:7]
-        id_manual = merge_short
+                f.write(f"Commit Left: {id_left}\n")
+                f.write(f"Link: {base}/commit/{left_sha}\n\n")
 
-        try:
-            case_dir = os.path.join(OUTPUT_DIR, f"{repo_name}_{merge_short}")
-            os.makedirs(case_dir, exist_ok=True)
-
-            f_base = f"{case_dir}/base_{id_base}.hs"
-            f_left = f"{case_dir}/left_{id_left}.hs"
-            f_right = f"{case_dir}/right_{id_right}.hs"
-            f_manual = f"{case_dir}/manual_{id_manual}.hs"
-            f_merge_diff3 = f"{case_dir}/merge_diff3_{id_manual}.hs"
-            f_merge_csdiff = f"{case_dir}/merge_csdiff_{id_manual}.hs"
-
-            # Base, left e right
-            with open(f_base, "wb") as f: f.write(base_commit.tree[filepath].data_stream.read())
-            with open(f_left, "wb") as f: f.write(parent1.tree[filepath].data_stream.read())
-            with open(f_right, "wb") as f: f.write(parent2.tree[filepath].data_stream.read())
-
-            # Manual
-            try:
-                with open(f_manual, "wb") as f: f.write(merge_commit.tree[filepath].data_stream.read())
-            except:
-                print("   [AVISO] Manual não encontrado.")
-
-            # diff3
-            with open(f_merge_diff3, "w") as out:
-                subprocess.run(["diff3", "-m", f_left, f_base, f_right],
-                               stdout=out, stderr=subprocess.DEVNULL)
-
-            # csdiff
-            with open(f_merge_csdiff, "w") as out:
-                resultado = subprocess.run(
-                    ["java", "-jar", HASKELL_SEPMERGE_JAR, f_base, f_left, f_right], 
-                    stdout=out, 
-                    stderr=subprocess.PIPE, # Captura o erro
-                    text=True
-                )
-                # Se o Java jogar algum erro, nós imprimimos no console na hora!
-                if resultado.stderr:
-                    print(f"   [ERRO JAVA] {resultado.stderr.strip()}")
-
-            # info.txt
-            if repo_name in REPO_URLS:
-                base = REPO_URLS[repo_name]
-                with open(f"{case_dir}/info.txt", "w") as f:
-                    f.write(f"Repo: {repo_name}\n")
-                    f.write(f"Arquivo: {filepath}\n\n")
-
-                    f.write(f"Commit Merge (Manual): {merge_short}\n")
-                    f.write(f"Link: {base}/commit/{commit_sha}\n\n")
-
-                    f.write(f"Commit Base: {id_base}\n")
-                    f.write(f"Link: {base}/commit/{base_commit.hexsha}\n\n")
-
-                    f.write(f"Commit Left: {id_left}\n")
-                    f.write(f"Link: {base}/commit/{parent1.hexsha}\n\n")
-
-                    f.write(f"Commit Right: {id_right}\n")
-                    f.write(f"Link: {base}/commit/{parent2.hexsha}\n")
-
-            print(f"   -> Arquivos salvos em {case_dir}/")
-            print(f"      Base: {id_base} | Left: {id_left} | Right: {id_right}")
-
-        except Exception as e:
-            print(f"   [ERRO] Falha geral na extração: {e}")
+                f.write(f"Commit Right: {id_right}\n")
+                f.write(f"Link: {base}/commit/{right_sha}\n")
+
+        print(f"   -> Arquivos salvos em {case_dir}/")
+        print(f"      Base: {id_base} | Left: {id_left} | Right: {id_right}")
+        return case_dir
+
+    except Exception as e:
+        print(f"   [ERRO] Falha geral na extração: {e}")
+        return None
+
+
+def extract_cases():
+    # Os casos da lista acima, um por vez (para um filtro sobre os resultados e em paralelo, ver casos_em_lote.py)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for repo_name, commit_sha, filepath in CASOS_INTERESSANTES:
+        extrair_caso(repo_name, commit_sha, filepath)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,322 @@
+# FILA DE TRABALHO DA MINERAÇÃO DISTRIBUÍDA
+# Modo coordenador/trabalhador do runner. O coordenador enumera os cenários e
+# os publica como tarefas numa fila durável. Trabalhadores em qualquer número
+# de máquinas alugam lotes de tarefas por um prazo, renovam o aluguel
+# enquanto trabalham (batimento) e devolvem a linha de cada cenário. O
+# coordenador coleta os resultados e continua o único escritor do CSV e do
+# checkpoint. Um aluguel que vence devolve a tarefa à fila: o trabalhador
+# morreu, ou está travado numa tarefa há mais de LIMITE_ALUGUEIS_TAREFA
+# prazos (aí o batimento para de renovar). Depois de MAX_TENTATIVAS a tarefa
+# fica como falha e não entra no checkpoint, então o próximo --resume tenta
+# de novo. Se nenhum trabalhador dá sinal de vida dentro do prazo, o
+# coordenador desiste da rodada em vez de esperar para sempre.
+# A fila é um SQLite num caminho visível para todos: no mesmo nó, ou num
+# sistema de arquivos compartilhado com locks confiáveis (NFS nem sempre os
+# tem). Um broker pode ocupar o lugar dela com a mesma interface: publicar,
+# alugar, renovar, concluir, falhar, coletar, prazo_trabalhadores e encerrada.
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from collections import namedtuple
+
+# Prazo de um aluguel (segundos): o batimento o renova a cada terço do prazo
+DURACAO_ALUGUEL = 300
+# Tarefas alugadas de uma vez por trabalhador
+TAMANHO_LOTE_FILA = 8
+# Tentativas de uma tarefa (aluguéis vencidos ou erros) antes de ficar como falha
+MAX_TENTATIVAS = 3
+# Prazos de aluguel que uma só tarefa pode ocupar: depois disso o trabalhador
+# é considerado travado e o batimento deixa os aluguéis vencerem
+LIMITE_ALUGUEIS_TAREFA = 4
+# Espera entre consultas à fila quando não há o que fazer (segundos)
+INTERVALO_FILA = 2.0
+# Tarefas publicadas por transação
+LOTE_PUBLICACAO = 500
+
+# Uma tarefa alugada: o id na fila, o URL do repositório (cada nó clona o
+# seu) e os campos do Cenario do runner (oids como lista)
+Tarefa = namedtuple("Tarefa", ["id", "repo_url", "repo", "merge", "base", "arquivo", "oids"])
+
+
+def identificador_trabalhador():
+    """Nome do trabalhador nos aluguéis: máquina e pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FilaTrabalho:
+    """
+    Fila em SQLite (modo WAL). Cada processo (e cada thread) usa a sua
+    instância; as operações que disputam tarefas rodam em transações
+    BEGIN IMMEDIATE, então dois trabalhadores nunca alugam a mesma tarefa.
+    """
+
+    def __init__(self, caminho, max_tentativas=MAX_TENTATIVAS):
+        self.caminho = caminho
+        self.max_tentativas = max_tentativas
+        self._conexao = None
+        self._pid = None
+
+    def _conectar(self):
+        if self._conexao is None or self._pid != os.getpid():
+            self._conexao = sqlite3.connect(self.caminho, timeout=60, isolation_level=None)
+            self._pid = os.getpid()
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS tarefas (
+                    id INTEGER PRIMARY KEY,
+                    repo_url TEXT NOT NULL,
+                    repo TEXT NOT NULL,
+                    merge TEXT NOT NULL,
+                    base TEXT,
+                    arquivo TEXT NOT NULL,
+                    oids TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendente',
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    dono TEXT,
+                    prazo REAL,
+                    resultado TEXT,
+                    erro TEXT,
+                    coletada INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (repo, merge, arquivo)
+                );
+                CREATE INDEX IF NOT EXISTS idx_tarefas_estado ON tarefas (estado, id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS trabalhadores (
+                    dono TEXT PRIMARY KEY,
+                    prazo REAL NOT NULL
+                );
+            """)
+        return self._conexao
+
+    def _transacao(self, operacao):
+        conexao = self._conectar()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = operacao(conexao)
+            conexao.execute("COMMIT")
+            return resultado
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+    def _expirar(self, conexao):
+        # Aluguéis vencidos de tarefas sem tentativas sobrando viram falha; os outros voltam a ser alugáveis
+        conexao.execute(
+            "UPDATE tarefas SET estado = 'falhou', erro = 'aluguel vencido', dono = NULL "
+            "WHERE estado = 'alugada' AND prazo < ? AND tentativas >= ?", (time.time(), self.max_tentativas))
+
+    # --- Coordenador ---
+
+    def reiniciar(self, opcoes=None):
+        """Esvazia a fila para uma nova rodada e abre a publicação (opcoes: repassadas aos trabalhadores)."""
+        def operacao(conexao):
+            conexao.execute("DELETE FROM tarefas")
+            conexao.execute("DELETE FROM meta")
+            conexao.execute("DELETE FROM trabalhadores")
+            self._meta(conexao, "publicacao", "aberta")
+            self._meta(conexao, "opcoes", json.dumps(opcoes or {}))
+        self._transacao(operacao)
+
+    def retomar(self, opcoes=None):
+        """Mantém a fila (as concluídas ainda não coletadas são coletadas) e dá novas tentativas às falhas."""
+        def operacao(conexao):
+            conexao.execute("UPDATE tarefas SET estado = 'pendente', tentativas = 0, erro = NULL, coletada = 0 "
+                            "WHERE estado = 'falhou'")
+            self._meta(conexao, "publicacao", "aberta")
+            self._meta(conexao, "opcoes", json.dumps(opcoes or {}))
+        self._transacao(operacao)
+
+    @staticmethod
+    def _meta(conexao, chave, valor):
+        conexao.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (chave, valor))
+
+    @staticmethod
+    def _sinal(conexao, dono, prazo):
+        # Sinal de vida do trabalhador: vale até o fim do prazo dos seus aluguéis
+        conexao.execute("INSERT OR REPLACE INTO trabalhadores (dono, prazo) VALUES (?, ?)", (dono, prazo))
+
+    def publicar(self, repo_url, cenarios):
+        """Publica os cenários (Cenario do runner) em transações de LOTE_PUBLICACAO; devolve quantos eram novos."""
+        novas = 0
+        lote = []
+
+        def operacao(conexao):
+            antes = conexao.total_changes
+            conexao.executemany(
+                "INSERT OR IGNORE INTO tarefas (repo_url, repo, merge, base, arquivo, oids) VALUES (?, ?, ?, ?, ?, ?)",
+                lote)
+            return conexao.total_changes - antes
+
+        for cenario in cenarios:
+            lote.append((repo_url, cenario.repo, cenario.merge, cenario.base, cenario.arquivo,
+                         json.dumps(list(cenario.oids))))
+            if len(lote) >= LOTE_PUBLICACAO:
+                novas += self._transacao(operacao)
+                lote = []
+        if lote:
+            novas += self._transacao(operacao)
+        return novas
+
+    def fechar_publicacao(self):
+        """Todas as tarefas da rodada estão na fila: os trabalhadores param quando ela esvaziar."""
+        self._meta(self._conectar(), "publicacao", "fechada")
+
+    def coletar(self):
+        """
+        Tarefas terminadas e ainda não coletadas: lista de (Tarefa, resultado,
+        erro), com resultado None nas que esgotaram as tentativas.
+        """
+        def operacao(conexao):
+            self._expirar(conexao)
+            return conexao.execute(
+                "SELECT id, repo_url, repo, merge, base, arquivo, oids, estado, resultado, erro FROM tarefas "
+                "WHERE estado IN ('concluida', 'falhou') AND coletada = 0 ORDER BY id").fetchall()
+        terminadas = []
+        for *campos, oids, estado, resultado, erro in self._transacao(operacao):
+            terminadas.append((Tarefa(*campos, json.loads(oids)),
+                               json.loads(resultado) if estado == "concluida" else None, erro))
+        return terminadas
+
+    def marcar_coletadas(self, ids):
+        """Chamado depois que as linhas coletadas foram gravadas."""
+        def operacao(conexao):
+            conexao.executemany("UPDATE tarefas SET coletada = 1 WHERE id = ?", ((i,) for i in ids))
+        self._transacao(operacao)
+
+    def prazo_trabalhadores(self):
+        """Até quando o trabalhador mais recente dá sinal de vida (epoch), ou None se nenhum apareceu."""
+        return self._conectar().execute("SELECT MAX(prazo) FROM trabalhadores").fetchone()[0]
+
+    def inacabadas(self):
+        """Repositórios com tarefas ainda não concluídas (pendentes, alugadas ou com falha)."""
+        linhas = self._conectar().execute("SELECT DISTINCT repo FROM tarefas WHERE estado != 'concluida'")
+        return {repo for repo, in linhas}
+
+    def falhas(self):
+        """(repo, merge, arquivo, erro) das tarefas que esgotaram as tentativas."""
+        return self._conectar().execute(
+            "SELECT repo, merge, arquivo, erro FROM tarefas WHERE estado = 'falhou' ORDER BY id").fetchall()
+
+    def resumo(self):
+        """Quantas tarefas há em cada estado."""
+        linhas = self._conectar().execute("SELECT estado, COUNT(*) FROM tarefas GROUP BY estado")
+        return dict(linhas)
+
+    # --- Trabalhador ---
+
+    def opcoes(self):
+        """As opções que o coordenador repassou aos trabalhadores ({} antes da primeira publicação)."""
+        linha = self._conectar().execute("SELECT valor FROM meta WHERE chave = 'opcoes'").fetchone()
+        return json.loads(linha[0]) if linha else {}
+
+    def alugar(self, dono, quantidade=TAMANHO_LOTE_FILA, duracao=DURACAO_ALUGUEL):
+        """Aluga até 'quantidade' tarefas pendentes (ou de aluguéis vencidos) por 'duracao' segundos."""
+        def operacao(conexao):
+            self._expirar(conexao)
+            agora = time.time()
+            linhas = conexao.execute(
+                "SELECT id, repo_url, repo, merge, base, arquivo, oids FROM tarefas "
+                "WHERE estado = 'pendente' OR (estado = 'alugada' AND prazo < ?) ORDER BY id LIMIT ?",
+                (agora, quantidade)).fetchall()
+            conexao.executemany(
+                "UPDATE tarefas SET estado = 'alugada', dono = ?, prazo = ?, tentativas = tentativas + 1 WHERE id = ?",
+                ((dono, agora + duracao, linha[0]) for linha in linhas))
+            self._sinal(conexao, dono, agora + duracao)
+            return linhas
+        return [Tarefa(*linha[:6], json.loads(linha[6])) for linha in self._transacao(operacao)]
+
+    def renovar(self, dono, duracao=DURACAO_ALUGUEL):
+        """Batimento: estende o prazo de todas as tarefas alugadas por este trabalhador."""
+        def operacao(conexao):
+            prazo = time.time() + duracao
+            conexao.execute("UPDATE tarefas SET prazo = ? WHERE estado = 'alugada' AND dono = ?", (prazo, dono))
+            self._sinal(conexao, dono, prazo)
+        self._transacao(operacao)
+
+    def concluir(self, dono, id_, resultado):
+        """
+        Entrega o resultado (JSON) da tarefa. False se o aluguel já não é
+        deste trabalhador (venceu e outro a alugou): o resultado é descartado.
+        """
+        cursor = self._conectar().execute(
+            "UPDATE tarefas SET estado = 'concluida', resultado = ?, prazo = NULL "
+            "WHERE id = ? AND dono = ? AND estado = 'alugada'", (json.dumps(resultado), id_, dono))
+        return cursor.rowcount == 1
+
+    def falhar(self, dono, id_, erro):
+        """Devolve a tarefa à fila (ou a marca como falha, sem tentativas sobrando)."""
+        self._conectar().execute(
+            "UPDATE tarefas SET estado = CASE WHEN tentativas >= ? THEN 'falhou' ELSE 'pendente' END, "
+            "erro = ?, dono = NULL, prazo = NULL WHERE id = ? AND dono = ? AND estado = 'alugada'",
+            (self.max_tentativas, erro, id_, dono))
+
+    def encerrada(self):
+        """A publicação terminou e não há tarefa pendente nem alugada."""
+        conexao = self._conectar()
+        publicacao = conexao.execute("SELECT valor FROM meta WHERE chave = 'publicacao'").fetchone()
+        if publicacao is None or publicacao[0] != "fechada":
+            return False
+        restantes = conexao.execute(
+            "SELECT COUNT(*) FROM tarefas WHERE estado IN ('pendente', 'alugada')").fetchone()[0]
+        return restantes == 0
+
+    def close(self):
+        if self._conexao is not None and self._pid == os.getpid():
+            self._conexao.close()
+        self._conexao = None
+
+
+class Batimento:
+    """
+    Thread que renova os aluguéis do trabalhador enquanto ele processa as
+    tarefas. A renovação depende do avanço: o trabalhador marca o início de
+    cada tarefa (tarefa()) e, se uma delas passa de limite prazos, a thread
+    para de renovar. Um trabalhador travado (ferramenta presa, deadlock) com o
+    processo vivo perde os aluguéis como um trabalhador morto.
+    """
+
+    def __init__(self, caminho, dono, duracao=DURACAO_ALUGUEL, limite=LIMITE_ALUGUEIS_TAREFA):
+        self.dono = dono
+        self.duracao = duracao
+        self.limite = limite
+        # A thread tem a sua conexão (o sqlite3 não compartilha conexões entre threads)
+        self._fila = FilaTrabalho(caminho)
+        self._inicio_tarefa = time.monotonic()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, name="batimento", daemon=True)
+
+    def tarefa(self):
+        """Marca o início de uma tarefa: o limite de renovações conta a partir daqui."""
+        self._inicio_tarefa = time.monotonic()
+
+    def _rodar(self):
+        travada = None
+        while not self._parar.wait(self.duracao / 3):
+            inicio = self._inicio_tarefa
+            if time.monotonic() - inicio > self.limite * self.duracao:
+                if travada != inicio:
+                    print(f"   [FILA] Tarefa sem terminar há mais de {self.limite * self.duracao:.0f}s: "
+                          "os aluguéis deixam de ser renovados e voltam para a fila")
+                    travada = inicio
+                continue
+            try:
+                self._fila.renovar(self.dono, self.duracao)
+            except sqlite3.Error as e:
+                # Uma renovação perdida não é fatal: ainda há dois terços do prazo
+                print(f"   [FILA] Falha ao renovar os aluguéis: {e}")
+        self._fila.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
@@ -1,35 +1,163 @@
-import pandas as pd
 import os
-import subprocess
+import html
 import difflib
-from git import Repo
+from execucao import FalhaFerramenta
+from resultados import carregar_resultados
+from repositorios import REPOSITORIOS
+from cenario import CenarioMerge
+from linguagens import LINGUAGENS, linguagem_do_arquivo, mesclar
+from diff3_nativo import diff_linhas, dividir_linhas
+from armazem_saidas import saida_registrada
 
 # --- CONFIGURAÇÕES ---
 CSV_FILE = "casos_sucesso_absoluto.csv"
-REPOS_DIR = "./repos_haskell"
-# Ajuste o caminho para o JAR se necessário, tal como fez no extrair_casos.py
-HASKELL_SEPMERGE_JAR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../haskell-sepmerge/target/haskell-sepmerge.jar"))
+PASTA_SAIDA = "comparacoes_visuais"
+# Nome de cada motor de merge no cabeçalho do HTML (ver linguagens.py)
+_NOMES_MOTOR = {"sepmerge": "Haskell-SepMerge", "csdiff": "csdiff"}
+# Linhas de contexto em volta de cada bloco alterado
+CONTEXTO = 5
+# Acima deste total de linhas (os dois lados) o HtmlDiff, quadrático, dá lugar ao diff linear
+LIMITE_LINHAS_HTMLDIFF = 2000
 
-def get_content_safe(tree, filepath):
-    """Extrai o conteúdo do ficheiro a partir da árvore do Git."""
+_MODELO_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{titulo}</title>
+<style>
+  table.diff {{font-family: Courier, monospace; border: medium; border-collapse: collapse}}
+  .diff td {{padding: 0 4px; white-space: pre-wrap; vertical-align: top}}
+  .diff_header {{background-color: #e0e0e0; text-align: right}}
+  .diff_next {{background-color: #c0c0c0; text-align: center}}
+  .diff_add {{background-color: #aaffaa}}
+  .diff_chg {{background-color: #ffff77}}
+  .diff_sub {{background-color: #ffaaaa}}
+</style>
+</head>
+<body>
+<table class="diff">
+<thead><tr><th colspan="2">{desc_a}</th><th colspan="2">{desc_b}</th></tr></thead>
+<tbody>
+{linhas}
+</tbody>
+</table>
+</body>
+</html>
+"""
+
+def get_content_safe(conteudo):
+    """Descodifica o blob para texto, ignorando erros de encoding (None se o ficheiro não existe)."""
+    return None if conteudo is None else conteudo.decode('utf-8', errors='ignore')
+
+def _celulas(numero, linha, classe):
+    if linha is None:
+        return '<td class="diff_header"></td><td></td>'
+    texto = html.escape(linha.decode("utf-8", errors="replace").rstrip("\n"))
+    return f'<td class="diff_header">{numero}</td><td class="{classe}">{texto}</td>'
+
+def html_lado_a_lado_linear(texto_a, texto_b, desc_a, desc_b, contexto=CONTEXTO):
+    """
+    Diff lado a lado com o diff de duas vias do diff3_nativo (o algoritmo do
+    GNU diff, com o corte de custo): quase linear no tamanho dos ficheiros.
+    Não realça as diferenças dentro da linha, que é o que torna o HtmlDiff
+    quadrático em ficheiros grandes.
+    """
+    a = dividir_linhas(texto_a.encode("utf-8"))
+    b = dividir_linhas(texto_b.encode("utf-8"))
+    mudancas = diff_linhas(a, b)
+    linhas = []
+
+    def iguais(de0, ate0, de1):
+        for k in range(ate0 - de0):
+            linhas.append(f"<tr>{_celulas(de0 + k + 1, a[de0 + k], '')}{_celulas(de1 + k + 1, b[de1 + k], '')}</tr>")
+
+    pos0 = pos1 = 0
+    for indice, (i0, n0, i1, n1) in enumerate(mudancas):
+        # Trecho igual antes do bloco: só o contexto depois do bloco anterior e antes deste
+        if i0 - pos0 > 2 * contexto or (indice == 0 and i0 > contexto):
+            if indice > 0:
+                iguais(pos0, pos0 + contexto, pos1)
+            linhas.append('<tr><td class="diff_next" colspan="4">…</td></tr>')
+            iguais(i0 - contexto, i0, i1 - contexto)
+        else:
+            iguais(pos0, i0, pos1)
+        for k in range(max(n0, n1)):
+            classe = "diff_chg" if k < n0 and k < n1 else "diff_sub" if k < n0 else "diff_add"
+            linha_a = a[i0 + k] if k < n0 else None
+            linha_b = b[i1 + k] if k < n1 else None
+            linhas.append(f"<tr>{_celulas(i0 + k + 1, linha_a, classe)}{_celulas(i1 + k + 1, linha_b, classe)}</tr>")
+        pos0, pos1 = i0 + n0, i1 + n1
+    if not mudancas:
+        linhas.append('<tr><td class="diff_next" colspan="4">Sem diferenças</td></tr>')
+    elif len(a) - pos0 > contexto:
+        iguais(pos0, pos0 + contexto, pos1)
+        linhas.append('<tr><td class="diff_next" colspan="4">…</td></tr>')
+    else:
+        iguais(pos0, len(a), pos1)
+    return _MODELO_HTML.format(titulo=html.escape(f"{desc_a} x {desc_b}"), desc_a=html.escape(desc_a),
+                               desc_b=html.escape(desc_b), linhas="\n".join(linhas))
+
+def gerar_html(texto_a, texto_b, desc_a, desc_b):
+    """HtmlDiff (com realce dentro da linha) para ficheiros pequenos; o diff linear para os grandes."""
+    linhas_a, linhas_b = texto_a.splitlines(), texto_b.splitlines()
+    if len(linhas_a) + len(linhas_b) > LIMITE_LINHAS_HTMLDIFF:
+        return html_lado_a_lado_linear(texto_a, texto_b, desc_a, desc_b)
+    # O parâmetro context=True com numlines=5 garante que vemos apenas o bloco alterado e 5 linhas acima/abaixo
+    return difflib.HtmlDiff(wrapcolumn=90).make_file(
+        linhas_a, linhas_b, fromdesc=desc_a, todesc=desc_b, context=True, numlines=CONTEXTO
+    )
+
+def gerar_comparacao(repo_name, commit_sha, filename, pasta_saida=PASTA_SAIDA):
+    """Gera o HTML de um caso e devolve o caminho (ou None se o caso foi ignorado)."""
+    # 1 e 2. Reconstruir o cenário base, left e right e a versão manual (resolvida pelo humano)
+    # numa só leitura do repositório (ver repositorios.py)
     try:
-        # Lemos e descodificamos para texto, ignorando erros de encoding
-        return tree[filepath].data_stream.read().decode('utf-8', errors='ignore')
-    except Exception:
+        repositorio = REPOSITORIOS.abrir(repo_name)
+        oids = repositorio.oids_do_merge(commit_sha, filename)
+        blobs = repositorio.ler_blobs(oids)
+    except (FileNotFoundError, KeyError) as e:
+        print(f"  -> Ignorado: {e}")
+        return None
+    base_text, left_text, right_text, manual_text = (get_content_safe(blob) for blob in blobs)
+
+    if not all([manual_text, base_text, left_text, right_text]):
+        print("  -> Ignorado: Falha ao extrair um dos blobs do Git.")
         return None
 
+    # 3. A saída do Haskell-SepMerge (a nossa ferramenta): a que o runner guardou para estes
+    # blobs ou, se o cenário ainda não foi minerado, um merge no motor da linguagem
+    # (no Haskell, o servidor persistente)
+    linguagem = linguagem_do_arquivo(filename) or LINGUAGENS["haskell"]
+    csdiff_text = saida_registrada(oids, filename)
+    if csdiff_text is None:
+        try:
+            csdiff_text = mesclar(linguagem, CenarioMerge(*blobs[:3])).decode("utf-8", errors="ignore")
+        except FalhaFerramenta as e:
+            print(f"  -> Ignorado: Falha no {_NOMES_MOTOR[linguagem.motor]}: {e}")
+            return None
+
+    # 4. Gerar o ficheiro HTML com o Diff Lado a Lado
+    html_diff = gerar_html(csdiff_text, manual_text, f"{_NOMES_MOTOR[linguagem.motor]} (Automático)",
+                           f"Merge Humano ({commit_sha[:7]})")
+
+    os.makedirs(pasta_saida, exist_ok=True)
+    nome_seguro = filename.replace("/", "_").replace("\\", "_")
+    caminho_html = os.path.join(pasta_saida, f"{repo_name}_{commit_sha[:7]}_{nome_seguro}.html")
+
+    with open(caminho_html, "w", encoding="utf-8") as f:
+        f.write(html_diff)
+    return caminho_html
+
 def gerar_comparacoes_html():
     if not os.path.exists(CSV_FILE):
         print(f"[ERRO] Ficheiro '{CSV_FILE}' não encontrado.")
         return
 
-    df = pd.read_csv(CSV_FILE)
-    
+    df = carregar_resultados(CSV_FILE)
+
     # Filtramos apenas os 5 casos em que a ferramenta teve sucesso, mas o código difere do manual
-    casos_diferentes = df[(df['CSDiff_Equals_Manual'] == False)]
-    
-    pasta_saida = "comparacoes_visuais"
-    os.makedirs(pasta_saida, exist_ok=True)
+    # (para outros filtros e em paralelo, ver casos_em_lote.py)
+    casos_diferentes = df[~df['CSDiff_Equals_Manual']]
 
     print(f"A iniciar a geração de {len(casos_diferentes)} comparações visuais...\n")
 
@@ -37,58 +165,11 @@ def gerar_comparacoes_html():
         repo_name = row['Repo']
         commit_sha = row['MergeCommit']
         filename = row['File']
-        
+
         print(f"[{index+1}/{len(casos_diferentes)}] A processar: {repo_name} | {commit_sha[:7]} | {filename}")
-        
-        repo_path = os.path.join(REPOS_DIR, repo_name)
-        repo = Repo(repo_path)
-        commit = repo.commit(commit_sha)
-        
-        # 1. Extrair a versão manual (resolvida pelo humano)
-        manual_text = get_content_safe(commit.tree, filename)
-        
-        # 2. Reconstruir o cenário base, left e right
-        parent1 = commit.parents[0]
-        parent2 = commit.parents[1]
-        base_commit = repo.merge_base(parent1, parent2)[0]
-        
-        base_text = get_content_safe(base_commit.tree, filename)
-        left_text = get_content_safe(parent1.tree, filename)
-        right_text = get_content_safe(parent2.tree, filename)
-        
-        if not all([manual_text, base_text, left_text, right_text]):
-            print("  -> Ignorado: Falha ao extrair um dos blobs do Git.")
-            continue
-            
-        # Guardar ficheiros temporários para o Java ler
-        with open("temp_base.hs", "w", encoding="utf-8") as f: f.write(base_text)
-        with open("temp_left.hs", "w", encoding="utf-8") as f: f.write(left_text)
-        with open("temp_right.hs", "w", encoding="utf-8") as f: f.write(right_text)
-        
-        # 3. Executar o Haskell-SepMerge (a nossa ferramenta)
-        resultado = subprocess.run(
-            ["java", "-jar", HASKELL_SEPMERGE_JAR, "temp_base.hs", "temp_left.hs", "temp_right.hs"],
-            capture_output=True, text=True
-        )
-        csdiff_text = resultado.stdout
-        
-        # 4. Gerar o ficheiro HTML com o Diff Lado a Lado
-        # O parâmetro context=True com numlines=5 garante que vemos apenas o bloco alterado e 5 linhas acima/abaixo
-        html_diff = difflib.HtmlDiff(wrapcolumn=90).make_file(
-            csdiff_text.splitlines(), 
-            manual_text.splitlines(),
-            fromdesc=f"Haskell-SepMerge (Automático)",
-            todesc=f"Merge Humano ({commit_sha[:7]})",
-            context=True, numlines=5
-        )
-        
-        nome_seguro = filename.replace("/", "_").replace("\\", "_")
-        caminho_html = os.path.join(pasta_saida, f"{repo_name}_{commit_sha[:7]}_{nome_seguro}.html")
-        
-        with open(caminho_html, "w", encoding="utf-8") as f:
-            f.write(html_diff)
-            
-        print(f"  -> Diff guardado em: {caminho_html}")
+        caminho_html = gerar_comparacao(repo_name, commit_sha, filename)
+        if caminho_html:
+            print(f"  -> Diff guardado em: {caminho_html}")
 
 if __name__ == "__main__":
-    gerar_comparacoes_html()
\ No newline at end of file
+    gerar_comparacoes_html()
@@ -0,0 +1,349 @@
+# HISTÓRICO GIT EM FLUXO
+# Enumera os merges com um único "git rev-list --merges --parents" (lido linha
+# a linha, sem materializar os commits no Python) e resolve os merge bases
+# sem subir um "git merge-base" por merge: os commits são lidos sob demanda por
+# um "git cat-file --batch" que fica aberto durante toda a enumeração, e o
+# merge base é calculado com o mesmo algoritmo do git (paint_down_to_common +
+# remove_redundant, em ordem de data do commit), devolvendo o mesmo commit
+# que o "git merge-base A B" devolveria.
+import heapq
+import subprocess
+
+# Até 1000 OIDs (41 bytes cada) por escrita: bem abaixo dos 64 KiB de um pipe
+_OIDS_POR_LOTE = 1000
+# Blocos em que o conteúdo de um objeto acima do limite é lido e descartado
+_BLOCO_DESCARTE = 1 << 20
+
+_MODO_ARVORE = b"40000"
+_MODO_SUBMODULO = b"160000"
+
+_PARENT1 = 1
+_PARENT2 = 2
+_STALE = 4
+_RESULT = 8
+
+
+class ObjetoGrande(Exception):
+    """Um objeto passou do limite de tamanho da leitura: só o cabeçalho foi guardado."""
+
+    def __init__(self, oid, tamanho):
+        super().__init__(f"{oid} tem {tamanho} bytes")
+        self.oid = oid
+        self.tamanho = tamanho
+
+
+class CatFileBatch:
+    """Processo 'git cat-file --batch' persistente: lê objetos pelo OID."""
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self._proc = None
+
+    def _iniciar(self):
+        self._proc = subprocess.Popen(
+            ["git", "-C", self.repo_path, "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+    def _garantir_processo(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self.close()
+            self._iniciar()
+
+    def ler(self, oid):
+        """Devolve (tipo, conteúdo) do objeto ou None se ele não existir."""
+        self._garantir_processo()
+        self._proc.stdin.write(oid.encode() + b"\n")
+        self._proc.stdin.flush()
+        return self._ler_resposta()
+
+    def ler_varios(self, oids, limite_bytes=None):
+        """
+        Lê vários objetos num só pedido: todos os OIDs vão de uma vez e as
+        respostas são lidas em seguida, na mesma ordem. Em blocos, para que
+        o pipe de entrada nunca encha enquanto o cat-file espera a leitura.
+        Com limite_bytes, um objeto maior nunca fica inteiro na memória: o
+        conteúdo é descartado aos poucos e, lidas todas as respostas, sobe
+        ObjetoGrande.
+        """
+        self._garantir_processo()
+        objetos = []
+        for i in range(0, len(oids), _OIDS_POR_LOTE):
+            lote = oids[i:i + _OIDS_POR_LOTE]
+            self._proc.stdin.write(b"".join(oid.encode() + b"\n" for oid in lote))
+            self._proc.stdin.flush()
+            objetos.extend(self._ler_resposta(limite_bytes) for _ in lote)
+        grande = next((o[1] for o in objetos if o is not None and isinstance(o[1], ObjetoGrande)), None)
+        if grande is not None:
+            raise grande
+        return objetos
+
+    def ler_blobs(self, oids, limite_bytes=None):
+        """Conteúdo (bytes) de cada blob, na ordem dos OIDs (ObjetoGrande se algum passar do limite)."""
+        return [objeto[1] for objeto in self.ler_varios(oids, limite_bytes)]
+
+    def ler_arvore(self, oid):
+        """Entradas de uma árvore: {nome (bytes): (modo, oid)}."""
+        return _ler_arvore(self.ler(oid)[1])
+
+    def _ler_resposta(self, limite_bytes=None):
+        cabecalho = self._proc.stdout.readline().split()
+        if len(cabecalho) != 3:
+            return None  # "<oid> missing"
+        oid, tipo, tamanho = cabecalho
+        tamanho = int(tamanho)
+        if limite_bytes is not None and tamanho > limite_bytes:
+            # Mantém o protocolo em dia sem guardar o conteúdo (nem o '\n' final)
+            restante = tamanho + 1
+            while restante > 0:
+                pedaco = self._proc.stdout.read(min(restante, _BLOCO_DESCARTE))
+                if not pedaco:
+                    break  # o cat-file morreu: o próximo pedido o reinicia
+                restante -= len(pedaco)
+            return tipo.decode(), ObjetoGrande(oid.decode(), tamanho)
+        conteudo = self._proc.stdout.read(tamanho)
+        self._proc.stdout.read(1)  # '\n' depois do conteúdo
+        return tipo.decode(), conteudo
+
+    def close(self):
+        if self._proc is not None:
+            # Workers criados por fork herdam o stdin do processo: fechar o pipe
+            # não basta para encerrar o cat-file (que só lê, então pode ser morto)
+            self._proc.kill()
+            self._proc.wait()
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GrafoCommits:
+    """Pais e data (do committer) de cada commit, carregados sob demanda."""
+
+    def __init__(self, catfile):
+        self.catfile = catfile
+        self._commits = {}
+
+    def limitar(self, max_commits):
+        """
+        Esvazia o cache de commits se ele passou de max_commits (None: sem
+        limite). Chamado entre um merge e outro: os commits voltam a ser
+        lidos do cat-file quando precisarem.
+        """
+        if max_commits is not None and len(self._commits) > max_commits:
+            self._commits.clear()
+
+    def commit(self, sha):
+        info = self._commits.get(sha)
+        if info is None:
+            objeto = self.catfile.ler(sha)
+            if objeto is None or objeto[0] != "commit":
+                raise KeyError(sha)
+            info = _ler_cabecalho(objeto[1])
+            self._commits[sha] = info
+        return info
+
+    def arvore(self, sha):
+        return self.commit(sha)[2]
+
+    def pais(self, sha):
+        return self.commit(sha)[1]
+
+    def data(self, sha):
+        return self.commit(sha)[0]
+
+    def _pintar_ate_comum(self, um, outros, flags):
+        """paint_down_to_common: candidatos a merge base, em ordem de data."""
+        resultado = []
+        fila = []
+        contador = 0
+        # Entradas da fila por commit e quantas ainda não estão STALE
+        # (o git varre a fila inteira a cada passo para saber isso)
+        na_fila = {}
+        nao_stale = 0
+
+        def enfileirar(sha):
+            nonlocal contador, nao_stale
+            heapq.heappush(fila, (-self.data(sha), contador, sha))
+            contador += 1
+            na_fila[sha] = na_fila.get(sha, 0) + 1
+            if not flags[sha] & _STALE:
+                nao_stale += 1
+
+        flags[um] = flags.get(um, 0) | _PARENT1
+        enfileirar(um)
+        for outro in outros:
+            flags[outro] = flags.get(outro, 0) | _PARENT2
+            enfileirar(outro)
+
+        while nao_stale:
+            _, _, sha = heapq.heappop(fila)
+            na_fila[sha] -= 1
+            if not flags[sha] & _STALE:
+                nao_stale -= 1
+            marcas = flags[sha] & (_PARENT1 | _PARENT2 | _STALE)
+            if marcas == (_PARENT1 | _PARENT2):
+                if not flags[sha] & _RESULT:
+                    flags[sha] |= _RESULT
+                    self._inserir_por_data(resultado, sha)
+                marcas |= _STALE
+            for pai in self.pais(sha):
+                anteriores = flags.get(pai, 0)
+                if anteriores & marcas == marcas:
+                    continue
+                flags[pai] = anteriores | marcas
+                if marcas & _STALE and not anteriores & _STALE:
+                    nao_stale -= na_fila.get(pai, 0)
+                enfileirar(pai)
+        return resultado
+
+    def _inserir_por_data(self, lista, sha):
+        # commit_list_insert_by_date: depois de todos com data >= à do commit
+        data = self.data(sha)
+        posicao = 0
+        while posicao < len(lista) and not self.data(lista[posicao]) < data:
+            posicao += 1
+        lista.insert(posicao, sha)
+
+    def _remover_redundantes(self, candidatos):
+        redundante = [False] * len(candidatos)
+        for i, sha in enumerate(candidatos):
+            if redundante[i]:
+                continue
+            outros = [j for j in range(len(candidatos)) if j != i and not redundante[j]]
+            flags = {}
+            self._pintar_ate_comum(sha, [candidatos[j] for j in outros], flags)
+            if flags[sha] & _PARENT2:
+                redundante[i] = True
+            for j in outros:
+                if flags[candidatos[j]] & _PARENT1:
+                    redundante[j] = True
+        return [sha for i, sha in enumerate(candidatos) if not redundante[i]]
+
+    def merge_bases(self, a, b):
+        """Todos os melhores ancestrais comuns, na ordem do 'git merge-base --all'."""
+        if a == b:
+            return [a]
+        flags = {}
+        candidatos = self._pintar_ate_comum(a, [b], flags)
+        bases = []
+        for sha in candidatos:
+            if not flags[sha] & _STALE:
+                self._inserir_por_data(bases, sha)
+        if len(bases) <= 1:
+            return bases
+        resultado = []
+        for sha in self._remover_redundantes(bases):
+            self._inserir_por_data(resultado, sha)
+        return resultado
+
+    def merge_base(self, a, b):
+        """O merge base que o 'git merge-base A B' imprime, ou None se não houver."""
+        bases = self.merge_bases(a, b)
+        return bases[0] if bases else None
+
+
+def _ler_cabecalho(conteudo):
+    """(data do committer, [pais], árvore) a partir do objeto commit."""
+    pais = []
+    data = 0
+    arvore = None
+    for linha in conteudo.split(b"\n"):
+        if not linha:
+            break  # fim do cabeçalho; o resto é a mensagem
+        if linha.startswith(b"tree "):
+            arvore = linha[5:].decode()
+        elif linha.startswith(b"parent "):
+            pais.append(linha[7:].decode())
+        elif linha.startswith(b"committer "):
+            # committer Nome <email> 1700000000 -0300
+            data = int(linha.rsplit(b" ", 2)[1])
+    return data, pais, arvore
+
+
+def _ler_arvore(conteudo):
+    # Formato binário: "<modo> <nome>\0<oid de 20 bytes>" por entrada
+    entradas = {}
+    posicao = 0
+    while posicao < len(conteudo):
+        espaco = conteudo.index(b" ", posicao)
+        nulo = conteudo.index(b"\0", espaco)
+        entradas[conteudo[espaco + 1:nulo]] = (conteudo[posicao:espaco], conteudo[nulo + 1:nulo + 21].hex())
+        posicao = nulo + 21
+    return entradas
+
+
+def _ordem_da_arvore(nome, modo):
+    # O git ordena as entradas como se os diretórios terminassem em '/'
+    return nome + b"/" if modo == _MODO_ARVORE else nome
+
+
+def arquivos_alterados_nos_dois_lados(catfile, base, left, right, manual, filtro):
+    """
+    Pré-filtro por OID sobre as árvores dos commits (base, pais e merge).
+    Devolve [(caminho, (oid_base, oid_left, oid_right, oid_manual))] para os
+    arquivos aceitos pelo filtro que existem nas quatro versões e cujos
+    conteúdos em base, left e right são todos diferentes. Subárvores iguais
+    nos dois pais, iguais à base em um dos lados ou ausentes na base ou no
+    merge são puladas sem leitura, e nenhum blob é lido. A ordem é a mesma do 'git diff-tree' entre os pais.
+    """
+    encontrados = []
+    _comparar_arvores(catfile, b"", (base, left, right, manual), filtro, encontrados)
+    return encontrados
+
+
+def _comparar_arvores(catfile, prefixo, oids, filtro, encontrados):
+    arvores = [catfile.ler_arvore(oid) for oid in oids]
+    nomes = {}
+    for entradas in arvores[1:3]:
+        for nome, (modo, _) in entradas.items():
+            nomes.setdefault(nome, _ordem_da_arvore(nome, modo))
+    for nome in sorted(nomes, key=nomes.get):
+        versoes = [entradas.get(nome) for entradas in arvores]
+        if None in versoes:
+            continue  # falta em alguma das quatro versões
+        (modo_b, oid_b), (modo_l, oid_l), (modo_r, oid_r), (modo_m, oid_m) = versoes
+        if oid_l == oid_r or oid_b == oid_l or oid_b == oid_r:
+            continue  # igual nos dois pais, ou um dos lados não mexeu em nada aqui
+        modos = (modo_b, modo_l, modo_r, modo_m)
+        if all(modo == _MODO_ARVORE for modo in modos):
+            _comparar_arvores(catfile, prefixo + nome + b"/", (oid_b, oid_l, oid_r, oid_m), filtro, encontrados)
+        elif not any(modo in (_MODO_ARVORE, _MODO_SUBMODULO) for modo in modos):
+            caminho = (prefixo + nome).decode("utf-8", errors="surrogateescape")
+            if oid_b != oid_l and oid_b != oid_r and filtro(caminho):
+                encontrados.append((caminho, (oid_b, oid_l, oid_r, oid_m)))
+
+
+def _argumentos_merges(rev):
+    # Só merges de dois pais (octopus ficam de fora, como antes)
+    return ["rev-list", "--min-parents=2", "--max-parents=2", rev]
+
+
+def contar_merges(repo_path, rev="HEAD"):
+    res = subprocess.run(["git", "-C", repo_path, *_argumentos_merges(rev), "--count"],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return int(res.stdout.strip() or 0)
+
+
+def iterar_merges(repo_path, rev="HEAD"):
+    """
+    Gera (merge, pai1, pai2) na mesma ordem do iter_commits(), lendo a saída
+    do rev-list à medida que ela chega.
+    """
+    proc = subprocess.Popen(["git", "-C", repo_path, *_argumentos_merges(rev), "--parents"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for linha in proc.stdout:
+            merge, pai1, pai2 = linha.split()
+            yield merge, pai1, pai2
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
@@ -0,0 +1,173 @@
+# INSTRUMENTAÇÃO DAS RODADAS
+# Mede o tempo de cada etapa de cada cenário (enumeração, leitura dos blobs,
+# diff3, merge da ferramenta, contagem de conflitos, igualdade e as validações
+# sintáticas) e agrega tudo em percentis e histogramas. No fim da rodada gera
+# um relatório JSON e uma tabela-resumo; opcionalmente grava um perfil do
+# cProfile (um .prof por processo) para abrir no snakeviz / pstats.
+import os
+import json
+import time
+import cProfile
+import contextvars
+from array import array
+from contextlib import contextmanager
+
+# Limites superiores (segundos) das faixas do histograma: 1-2-5 por década
+FAIXAS_HISTOGRAMA = [m * 10 ** e for e in range(-4, 3) for m in (1, 2, 5)]
+
+
+class Perfil:
+    """
+    Tempos por etapa. Desligado (o padrão), medir() não custa quase nada.
+    As etapas de um cenário são somadas num dicionário (cenario()), que os
+    workers devolvem ao processo principal para ser acumulado com acumular().
+    O dicionário atual é por contexto: no modo assíncrono cada cenário é uma
+    tarefa do asyncio e soma só as suas etapas.
+    """
+
+    def __init__(self):
+        self.ativo = False
+        self.inicio = time.time()
+        self._etapas = {}
+        self._atual = contextvars.ContextVar("etapas_do_cenario", default=None)
+
+    @contextmanager
+    def medir(self, etapa):
+        if not self.ativo:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.anotar(etapa, time.perf_counter() - inicio)
+
+    def anotar(self, etapa, segundos):
+        atual = self._atual.get()
+        if atual is not None:
+            atual[etapa] = atual.get(etapa, 0.0) + segundos
+        else:
+            self._etapas.setdefault(etapa, array("d")).append(segundos)
+
+    @contextmanager
+    def cenario(self):
+        """Agrupa as etapas de um cenário; o dicionário recebe também o 'total_cenario'."""
+        tempos = {}
+        if not self.ativo:
+            yield tempos
+            return
+        anterior = self._atual.set(tempos)
+        inicio = time.perf_counter()
+        try:
+            yield tempos
+        finally:
+            self._atual.reset(anterior)
+            tempos["total_cenario"] = time.perf_counter() - inicio
+
+    def acumular(self, tempos):
+        for etapa, segundos in tempos.items():
+            self._etapas.setdefault(etapa, array("d")).append(segundos)
+
+    def cronometrar(self, iteravel, etapa):
+        """Repassa os itens de um iterável medindo quanto custa produzir cada um."""
+        iterador = iter(iteravel)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                item = next(iterador)
+            except StopIteration:
+                return
+            if self.ativo:
+                self.anotar(etapa, time.perf_counter() - inicio)
+            yield item
+
+    def relatorio(self):
+        duracao = time.time() - self.inicio
+        etapas = {}
+        for etapa, valores in self._etapas.items():
+            ordenados = sorted(valores)
+            etapas[etapa] = {
+                "n": len(ordenados),
+                "total_s": sum(ordenados),
+                "media_ms": 1000 * sum(ordenados) / len(ordenados),
+                "p50_ms": 1000 * percentil(ordenados, 50),
+                "p90_ms": 1000 * percentil(ordenados, 90),
+                "p99_ms": 1000 * percentil(ordenados, 99),
+                "max_ms": 1000 * ordenados[-1],
+                "histograma": histograma(ordenados),
+            }
+        return {
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.inicio)),
+            "duracao_s": duracao,
+            "cenarios": etapas.get("total_cenario", {}).get("n", 0),
+            "etapas": etapas,
+        }
+
+    def salvar(self, caminho):
+        relatorio = self.relatorio()
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        return relatorio
+
+    def imprimir_resumo(self, relatorio=None):
+        relatorio = relatorio or self.relatorio()
+        etapas = relatorio["etapas"]
+        # O percentual é sobre o tempo somado dos cenários (nos workers, em paralelo)
+        total = etapas.get("total_cenario", {}).get("total_s", 0.0)
+        print("=" * 92)
+        print(f" ⏱️  PERFIL DA RODADA: {relatorio['cenarios']} cenários em {relatorio['duracao_s']:.1f}s")
+        print("=" * 92)
+        print(f"{'Etapa':<22}{'N':>8}{'Total (s)':>12}{'%':>7}{'Média':>10}{'p50':>10}{'p90':>10}{'p99':>10}")
+        print("-" * 92)
+        for etapa, e in sorted(etapas.items(), key=lambda item: -item[1]["total_s"]):
+            fracao = f"{100 * e['total_s'] / total:.1f}" if total and etapa != "total_cenario" else "-"
+            print(f"{etapa:<22}{e['n']:>8}{e['total_s']:>12.2f}{fracao:>7}"
+                  f"{e['media_ms']:>8.1f}ms{e['p50_ms']:>8.1f}ms{e['p90_ms']:>8.1f}ms{e['p99_ms']:>8.1f}ms")
+        print("=" * 92)
+
+
+def percentil(ordenados, p):
+    """Percentil com interpolação linear sobre uma lista já ordenada."""
+    if not ordenados:
+        return 0.0
+    posicao = (len(ordenados) - 1) * p / 100
+    baixo = int(posicao)
+    alto = min(baixo + 1, len(ordenados) - 1)
+    return ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * (posicao - baixo)
+
+
+def histograma(ordenados):
+    """Contagem por faixa ('<=limite' em segundos; o que passar do último vai em '>')."""
+    contagem = {}
+    i = 0
+    for limite in FAIXAS_HISTOGRAMA:
+        inicio = i
+        while i < len(ordenados) and ordenados[i] <= limite:
+            i += 1
+        if i > inicio:
+            contagem[f"<={limite:g}"] = i - inicio
+    if i < len(ordenados):
+        contagem[f">{FAIXAS_HISTOGRAMA[-1]:g}"] = len(ordenados) - i
+    return contagem
+
+
+# --- cProfile ---
+_profiler = None
+
+def iniciar_cprofile():
+    global _profiler
+    if _profiler is not None:
+        # Workers criados por fork herdam o profiler ligado do processo principal
+        _profiler.disable()
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+def salvar_cprofile(caminho, por_processo=False):
+    """Grava o perfil no formato do pstats (workers usam o sufixo .<pid>)."""
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _profiler.dump_stats(f"{caminho}.{os.getpid()}" if por_processo else caminho)
+
+
+PERFIL = Perfil()
@@ -0,0 +1,84 @@
+# LINGUAGENS MINERADAS
+# Registro extensão -> linguagem: cada linguagem diz com que separadores o
+# csdiff isola a estrutura, qual motor de merge roda sobre os seus arquivos e
+# qual validador confere a sintaxe das saídas sem conflito. O runner enumera
+# o histórico uma vez e manda cada arquivo alterado ao motor da sua
+# linguagem: a mesma enumeração e a mesma busca de blobs servem a todas.
+# Para uma linguagem nova basta uma entrada em LINGUAGENS (e, se o validador
+# for novo, outra em validacao_sintaxe.VALIDADORES).
+import os
+import shutil
+import hashlib
+from collections import namedtuple
+from sepmerge_cliente import obter_cliente, HASKELL_SEPMERGE_JAR, SERVIDOR_JAVA
+from csdiff_nativo import csdiff_merge, SEPARADORES_PADRAO
+from cache_resultados import hash_ferramenta
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# nome: coluna Language dos resultados; extensoes: a primeira nomeia os arquivos
+# validados; separadores: os do csdiff (None no Haskell-SepMerge, que traz os seus)
+Linguagem = namedtuple("Linguagem", ["nome", "extensoes", "separadores", "motor", "validador"])
+
+LINGUAGENS = {linguagem.nome: linguagem for linguagem in [
+    Linguagem("haskell", (".hs",), None, "sepmerge", "ghc"),
+    Linguagem("java", (".java",), SEPARADORES_PADRAO, "csdiff", "javac"),
+    Linguagem("javascript", (".js", ".mjs", ".cjs"), SEPARADORES_PADRAO + ("[", "]"), "csdiff", "node"),
+    # Sem "{" / "}" como blocos nem ";": a estrutura do Python está nos parênteses, colchetes e ":"
+    Linguagem("python", (".py",), ("(", ")", "[", "]", "{", "}", ",", ":"), "csdiff", "python"),
+]}
+# Só Haskell por padrão, como o experimento original (--languages no runner)
+LINGUAGENS_PADRAO = ["haskell"]
+
+# Arquivos que definem a versão de cada motor (entram no hash da coluna Tool_Version)
+_FONTES_MOTOR = {
+    "sepmerge": (HASKELL_SEPMERGE_JAR, SERVIDOR_JAVA),
+    "csdiff": (os.path.join(SCRIPT_DIR, "csdiff_nativo.py"), os.path.join(SCRIPT_DIR, "diff3_nativo.py")),
+}
+# Executáveis sem os quais o motor (ou o validador) não roda
+_REQUISITOS_MOTOR = {"sepmerge": ("java",), "csdiff": ()}
+_REQUISITOS_VALIDADOR = {"ghc": ("ghc",), "javac": ("javac",), "node": ("node",), "python": ()}
+
+_por_extensao = {extensao: linguagem for linguagem in LINGUAGENS.values() for extensao in linguagem.extensoes}
+_versoes = {}
+
+
+def linguagem_do_arquivo(caminho, nomes=None):
+    """A Linguagem do arquivo pela extensão (só entre nomes, se informado), ou None."""
+    linguagem = _por_extensao.get(os.path.splitext(caminho)[1].lower())
+    if linguagem is None or (nomes is not None and linguagem.nome not in nomes):
+        return None
+    return linguagem
+
+
+def versao_motor(linguagem):
+    """
+    Hash do motor da linguagem. No Haskell-SepMerge é o hash do JAR e do
+    servidor, como antes do registro (o cache dos cenários Haskell continua
+    valendo); no csdiff entram também os separadores da linguagem.
+    """
+    versao = _versoes.get(linguagem.nome)
+    if versao is None:
+        versao = hash_ferramenta(*_FONTES_MOTOR[linguagem.motor])
+        if linguagem.separadores is not None:
+            versao = hashlib.sha256("|".join([versao, *linguagem.separadores]).encode()).hexdigest()
+        _versoes[linguagem.nome] = versao
+    return versao
+
+
+def mesclar(linguagem, cenario_merge):
+    """Saída (bytes) do motor da linguagem para o CenarioMerge; FalhaFerramenta se o merge falhar."""
+    if linguagem.motor == "sepmerge":
+        return cenario_merge.sepmerge(obter_cliente(HASKELL_SEPMERGE_JAR))
+    extensao = linguagem.extensoes[0]
+    rotulos = (f"temp_left{extensao}", f"temp_base{extensao}", f"temp_right{extensao}")
+    return csdiff_merge(cenario_merge.left, cenario_merge.base, cenario_merge.right,
+                        linguagem.separadores, rotulos)
+
+
+def requisitos_faltando(linguagem):
+    """(faltando para o merge, faltando para a validação): arquivos e executáveis ausentes."""
+    motor = [caminho for caminho in _FONTES_MOTOR[linguagem.motor] if not os.path.exists(caminho)]
+    motor += [exe for exe in _REQUISITOS_MOTOR[linguagem.motor] if shutil.which(exe) is None]
+    validador = [exe for exe in _REQUISITOS_VALIDADOR[linguagem.validador] if shutil.which(exe) is None]
+    return motor, validador
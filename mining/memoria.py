@@ -0,0 +1,131 @@
+# ORÇAMENTO DE MEMÓRIA
+# Para rodar a mineração em máquinas pequenas (VMs de CI) sem ser morto por
+# falta de memória. O orçamento (--memory-budget) é dividido entre os
+# processos e limita o que cada um mantém: o cache de blobs, o cache de
+# commits do grafo e o tamanho dos arquivos lidos. Arquivos acima do limite
+# (--max-file-kb, ou uma fração do orçamento) nem chegam inteiros ao Python:
+# o cat-file descarta o conteúdo e o cenário é ignorado, com uma linha no log
+# (--large-file-sample ainda processa uma amostra deles). O RSS é lido do
+# /proc: pico por cenário e por repositório.
+import hashlib
+import resource
+
+# Com orçamento e sem --max-file-kb: um arquivo pode usar 1/16 da parte do
+# processo (os quatro blobs, as saídas e as cópias da validação cabem nela)
+FRACAO_ARQUIVO = 16
+# Parte do orçamento do processo para o cache LRU de blobs
+FRACAO_CACHE_BLOBS = 4
+# Memória estimada de um commit no cache do grafo (pais, árvore e data)
+BYTES_POR_COMMIT = 400
+
+
+def _status_kb(campo):
+    """Valor (kB) de um campo do /proc/self/status, ou None fora do Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith(campo):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    """RSS atual do processo (MB)."""
+    kb = _status_kb("VmRSS:")
+    return 0.0 if kb is None else kb / 1024
+
+
+def pico_rss_mb():
+    """Pico de RSS desde o início do processo ou desde o último zerar_pico() (MB)."""
+    kb = _status_kb("VmHWM:")
+    if kb is None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024
+
+
+def zerar_pico():
+    """Recomeça a contagem do pico (Linux: '5' em /proc/self/clear_refs). False se não der."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class OrcamentoMemoria:
+    """
+    Limites de memória de um processo. Sem orçamento e sem limite de
+    arquivo, nada muda em relação à mineração sem --memory-budget.
+    """
+
+    def __init__(self, limite_mb=None, limite_arquivo_kb=None, amostra_grandes=0.0):
+        self.limite_mb = limite_mb
+        self.limite_arquivo_kb = limite_arquivo_kb
+        self.amostra_grandes = amostra_grandes
+        self.avisado = False
+
+    def dividir(self, processos):
+        """A parte de cada um de 'processos' processos (o principal e os workers)."""
+        if self.limite_mb is not None:
+            self.limite_mb = self.limite_mb / processos
+        return self
+
+    def limite_arquivo(self):
+        """Tamanho máximo (bytes) de um blob lido, ou None sem limite."""
+        if self.limite_arquivo_kb is not None:
+            return self.limite_arquivo_kb * 1024
+        if self.limite_mb is not None:
+            return int(self.limite_mb * 1024 ** 2) // FRACAO_ARQUIVO
+        return None
+
+    def limite_para(self, oids):
+        """
+        O limite de leitura para um cenário: None para os sorteados pela
+        amostra dos grandes (pelos OIDs, então a amostra é a mesma a cada rodada).
+        """
+        if self.amostra_grandes > 0:
+            sorteio = int.from_bytes(hashlib.sha1("".join(o or "" for o in oids).encode()).digest()[:8], "big")
+            if sorteio / 2 ** 64 < self.amostra_grandes:
+                return None
+        return self.limite_arquivo()
+
+    def limite_cache_bytes(self, atual):
+        """O limite do cache de blobs dentro do orçamento (nunca acima do configurado)."""
+        if self.limite_mb is None:
+            return atual
+        return min(atual, int(self.limite_mb * 1024 ** 2) // FRACAO_CACHE_BLOBS)
+
+    def max_commits(self):
+        """Commits no cache do grafo antes de esvaziá-lo, ou None sem orçamento."""
+        if self.limite_mb is None:
+            return None
+        return int(self.limite_mb * 1024 ** 2) // FRACAO_CACHE_BLOBS // BYTES_POR_COMMIT
+
+    def excedido(self):
+        return self.limite_mb is not None and rss_mb() > self.limite_mb
+
+
+def adicionar_opcoes_memoria(parser):
+    """As mesmas opções de memória em todos os scripts."""
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="Memória total da rodada (todos os processos): limita os caches e o tamanho dos arquivos")
+    parser.add_argument("--max-file-kb", type=int, metavar="KB",
+                        help=f"Ignora cenários com algum arquivo maior que KB (padrão: sem limite, ou 1/{FRACAO_ARQUIVO} "
+                             "da parte de cada processo no --memory-budget)")
+    parser.add_argument("--large-file-sample", type=float, default=0.0, metavar="FRACAO",
+                        help="Fração (0-1) dos cenários com arquivos acima do limite processada mesmo assim")
+
+
+def aplicar_opcoes_memoria(args):
+    """Reconfigura o orçamento do processo; deve ser chamado antes de criar os workers."""
+    ORCAMENTO.limite_mb = args.memory_budget
+    ORCAMENTO.limite_arquivo_kb = args.max_file_kb
+    ORCAMENTO.amostra_grandes = args.large_file_sample
+    return ORCAMENTO
+
+
+# Orçamento do processo (workers herdam a configuração no fork e ficam com a sua parte)
+ORCAMENTO = OrcamentoMemoria()
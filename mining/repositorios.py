@@ -0,0 +1,288 @@
+# REPOSITÓRIOS MINERADOS
+# Todos os scripts usam o mesmo diretório (REPOS_DIR), com cada repositório
+# guardado como clone bare: o pipeline só lê objetos do histórico, então
+# não há working tree para baixar e manter. Só as branches vêm do servidor
+# (não o --mirror, que traria também os refs/pull/* do GitHub, milhares de
+# refs e objetos que a mineração nunca percorre). Com um filtro (--partial-clone:
+# blob:none) o clone é parcial: commits e árvores vêm no clone, e os blobs só
+# quando um cenário precisa deles, todos os que faltam numa única busca ao
+# servidor (o git sozinho faria uma busca por objeto).
+# Os objetos são lidos por um Repositorio (cat-file --batch persistente) e os
+# blobs passam por um cache LRU por processo, compartilhado entre os
+# repositórios: o OID já identifica o conteúdo.
+import os
+import atexit
+import shutil
+import threading
+import subprocess
+from collections import OrderedDict
+from historico_git import CatFileBatch, GrafoCommits
+
+# --- CONFIGURAÇÕES ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOS_DIR = os.path.join(SCRIPT_DIR, "repos_haskell")
+# Filtro dos clones novos ("blob:none" para clone parcial; None clona tudo)
+FILTRO_PARCIAL = "blob:none"
+LIMITE_CACHE_BLOBS_MB = 256
+# Refs trazidas no clone e no fetch: as branches do servidor, nos mesmos nomes
+REFSPEC_BRANCHES = "+refs/heads/*:refs/heads/*"
+
+_MODO_ARVORE = b"40000"
+_MODO_SUBMODULO = b"160000"
+
+
+class CacheBlobs:
+    """
+    LRU de blobs por OID, limitado pela soma dos tamanhos. É um só para todos
+    os repositórios do processo e, no modo assíncrono, usado por várias
+    threads ao mesmo tempo: toda operação passa pela trava.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.tamanho = 0
+        self.acertos = 0
+        self.faltas = 0
+        self._blobs = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, oid):
+        with self._trava:
+            conteudo = self._blobs.get(oid)
+            if conteudo is None:
+                self.faltas += 1
+                return None
+            self._blobs.move_to_end(oid)
+            self.acertos += 1
+            return conteudo
+
+    def guardar(self, oid, conteudo):
+        with self._trava:
+            if oid in self._blobs or len(conteudo) > self.limite_bytes:
+                return
+            self._blobs[oid] = conteudo
+            self.tamanho += len(conteudo)
+            while self.tamanho > self.limite_bytes:
+                _, antigo = self._blobs.popitem(last=False)
+                self.tamanho -= len(antigo)
+
+    def limpar(self):
+        with self._trava:
+            self._blobs.clear()
+            self.tamanho = 0
+
+
+class Repositorio:
+    """Acesso aos objetos de um repositório: commits, árvores e blobs (com o cache LRU)."""
+
+    def __init__(self, nome, caminho, cache):
+        self.nome = nome
+        self.caminho = caminho
+        self.cache = cache
+        # Clone parcial: o remoto "promisor" é quem tem os blobs que faltam
+        self.filtro = _config(caminho, "remote.origin.partialclonefilter")
+        self._catfile = None
+        self._grafo = None
+        self._presentes = None
+
+    @property
+    def parcial(self):
+        return self.filtro is not None
+
+    @property
+    def catfile(self):
+        if self._catfile is None:
+            self._catfile = CatFileBatch(self.caminho)
+        return self._catfile
+
+    @property
+    def grafo(self):
+        if self._grafo is None:
+            self._grafo = GrafoCommits(self.catfile)
+        return self._grafo
+
+    def ler_blobs(self, oids, limite_bytes=None):
+        """
+        Conteúdo de cada blob, na ordem dos OIDs (None para OID None). Com
+        limite_bytes, um blob maior que o limite faz subir ObjetoGrande sem
+        ter sido carregado (ver historico_git.py).
+        """
+        conteudos = [None if oid is None else self.cache.obter(oid) for oid in oids]
+        faltando = list(dict.fromkeys(oid for oid, c in zip(oids, conteudos) if oid is not None and c is None))
+        if faltando:
+            if self.parcial:
+                self.buscar_blobs(faltando)
+            lidos = dict(zip(faltando, self.catfile.ler_blobs(faltando, limite_bytes)))
+            for oid, conteudo in lidos.items():
+                self.cache.guardar(oid, conteudo)
+            conteudos = [lidos.get(oid) if c is None else c for oid, c in zip(oids, conteudos)]
+        return conteudos
+
+    def buscar_blobs(self, oids):
+        """
+        Clone parcial: traz numa só busca os blobs que ainda não estão no
+        clone. Devolve quantos foram pedidos ao servidor. Se a busca falhar,
+        a leitura ainda tenta o fetch sob demanda do próprio git.
+        """
+        if self._presentes is None:
+            self._presentes = self._blobs_presentes()
+        ausentes = [oid for oid in oids if oid not in self._presentes]
+        if not ausentes:
+            return 0
+        # O mesmo comando que o git roda para um objeto ausente, com todos de uma vez
+        res = subprocess.run(
+            ["git", "-C", self.caminho, "-c", "fetch.negotiationAlgorithm=noop", "fetch", "origin",
+             "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no", f"--filter={self.filtro}", "--stdin"],
+            input="".join(oid + "\n" for oid in ausentes), text=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if res.returncode == 0:
+            self._presentes.update(ausentes)
+        return len(ausentes)
+
+    def _blobs_presentes(self):
+        # Só lista o que está no disco (não dispara busca): num clone parcial são poucos blobs
+        res = subprocess.run(
+            ["git", "-C", self.caminho, "cat-file", "--batch-all-objects", "--unordered",
+             "--batch-check=%(objecttype) %(objectname)"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        return {linha[5:] for linha in res.stdout.splitlines() if linha.startswith("blob ")}
+
+    def revisoes_do_merge(self, merge):
+        """(base, pai1, pai2) do merge (hash curto ou completo); KeyError se não houver."""
+        pais = self.grafo.pais(merge)
+        if len(pais) != 2:
+            raise KeyError(merge)
+        base = self.grafo.merge_base(*pais)
+        if base is None:
+            raise KeyError(merge)
+        return base, pais[0], pais[1]
+
+    def oid_do_arquivo(self, commit, caminho):
+        """OID do blob em commit:caminho, ou None se o arquivo não existir nele."""
+        modo, oid = _MODO_ARVORE, self.grafo.arvore(commit)
+        for parte in caminho.encode("utf-8", errors="surrogateescape").split(b"/"):
+            if modo != _MODO_ARVORE:
+                return None
+            entrada = self.catfile.ler_arvore(oid).get(parte)
+            if entrada is None:
+                return None
+            modo, oid = entrada
+        return None if modo in (_MODO_ARVORE, _MODO_SUBMODULO) else oid
+
+    def oids_do_merge(self, merge, caminho):
+        """OIDs de caminho em (base, left, right, manual); None onde o arquivo não existe."""
+        return [self.oid_do_arquivo(rev, caminho) for rev in (*self.revisoes_do_merge(merge), merge)]
+
+    def close(self):
+        if self._catfile is not None:
+            self._catfile.close()
+            self._catfile = None
+            self._grafo = None
+
+
+class GerenciadorRepositorios:
+    """
+    Clona (bare, só as branches, parcial se houver filtro), atualiza e abre os
+    repositórios de diretorio. Os Repositorio abertos são por processo: um
+    worker criado por fork não usa os cat-file do pai.
+    """
+
+    def __init__(self, diretorio=REPOS_DIR, filtro=None, limite_cache_mb=LIMITE_CACHE_BLOBS_MB):
+        self.diretorio = diretorio
+        self.filtro = filtro
+        self.cache = CacheBlobs(limite_cache_mb * 1024 ** 2)
+        self._abertos = {}
+        self._pid = os.getpid()
+
+    @staticmethod
+    def nome_do_url(url):
+        return url.rstrip("/").split("/")[-1].removesuffix(".git")
+
+    def caminho(self, nome):
+        """Clone bare em <nome>.git; clones completos antigos (<nome>/) continuam valendo."""
+        antigo = os.path.join(self.diretorio, nome)
+        if os.path.isdir(antigo):
+            return antigo
+        return os.path.join(self.diretorio, nome + ".git")
+
+    def existe(self, nome):
+        return os.path.isdir(self.caminho(nome))
+
+    def garantir(self, url, atualizar=False):
+        """Clona o repositório se ainda não estiver no diretório (ou traz os commits novos) e o abre."""
+        nome = self.nome_do_url(url)
+        caminho = self.caminho(nome)
+        if not os.path.isdir(caminho):
+            os.makedirs(self.diretorio, exist_ok=True)
+            # Clona ao lado e renomeia: um clone interrompido não vira um repositório pela metade
+            temporario = caminho + ".clonando"
+            shutil.rmtree(temporario, ignore_errors=True)
+            filtro = [f"--filter={self.filtro}"] if self.filtro else []
+            subprocess.run(["git", "clone", "--bare", "--quiet", *filtro, url, temporario], check=True)
+            # O clone --bare não configura refspec: sem ele, o fetch só atualizaria o FETCH_HEAD
+            subprocess.run(["git", "-C", temporario, "config", "remote.origin.fetch", REFSPEC_BRANCHES], check=True)
+            os.replace(temporario, caminho)
+        elif atualizar:
+            self.atualizar(nome)
+        return self.abrir(nome)
+
+    def atualizar(self, nome):
+        # O fetch atualiza as próprias branches (e o HEAD que a mineração segue). O
+        # refspec explícito vale também para os espelhos (--mirror) de versões anteriores
+        res = subprocess.run(["git", "-C", self.caminho(nome), "fetch", "--quiet", "origin", REFSPEC_BRANCHES],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if res.returncode != 0:
+            print(f"[AVISO] git fetch falhou em {nome}: {res.stderr.strip()}")
+
+    def abrir(self, nome):
+        """O Repositorio já clonado (FileNotFoundError se não estiver no diretório)."""
+        if self._pid != os.getpid():
+            # Processo filho: os cat-file herdados são do pai e continuam com ele
+            self._abertos = {}
+            self._pid = os.getpid()
+        repositorio = self._abertos.get(nome)
+        if repositorio is None:
+            caminho = self.caminho(nome)
+            if not os.path.isdir(caminho):
+                raise FileNotFoundError(f"Repositório '{nome}' não encontrado em {self.diretorio}")
+            repositorio = Repositorio(nome, caminho, self.cache)
+            self._abertos[nome] = repositorio
+        return repositorio
+
+    def fechar(self):
+        if self._pid != os.getpid():
+            return
+        for repositorio in self._abertos.values():
+            repositorio.close()
+        self._abertos = {}
+
+
+def _config(caminho, chave):
+    res = subprocess.run(["git", "-C", caminho, "config", "--get", chave],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return res.stdout.strip() or None
+
+
+def adicionar_opcoes_repositorios(parser):
+    """As mesmas opções de repositório em todos os scripts."""
+    parser.add_argument("--repos-dir", default=REPOS_DIR,
+                        help=f"Diretório compartilhado com os repositórios (padrão: {REPOS_DIR})")
+    parser.add_argument("--partial-clone", action="store_true",
+                        help=f"Clones novos sem os blobs ({FILTRO_PARCIAL}): cada blob é buscado quando um cenário o lê")
+    parser.add_argument("--blob-cache-mb", type=int, default=LIMITE_CACHE_BLOBS_MB,
+                        help=f"Tamanho do cache LRU de blobs por processo (padrão: {LIMITE_CACHE_BLOBS_MB} MB)")
+
+
+def aplicar_opcoes_repositorios(args):
+    """Reconfigura o gerenciador do processo; deve ser chamado antes de criar os workers."""
+    REPOSITORIOS.diretorio = args.repos_dir
+    REPOSITORIOS.filtro = FILTRO_PARCIAL if args.partial_clone else None
+    REPOSITORIOS.cache.limite_bytes = args.blob_cache_mb * 1024 ** 2
+    return REPOSITORIOS
+
+
+# Gerenciador do processo (workers herdam a configuração no fork)
+REPOSITORIOS = GerenciadorRepositorios()
+atexit.register(REPOSITORIOS.fechar)
@@ -0,0 +1,258 @@
+# ARQUIVO DE RESULTADOS
+# Esquema tipado das colunas, o coletor que grava as linhas em lotes (CSV ou
+# Parquet) e o carregador usado pelas análises. O coletor vive só no processo
+# principal: os workers devolvem as linhas e ele é o único escritor.
+import os
+import csv
+import io
+import time
+import shutil
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = pq = ds = None
+
+# Colunas do arquivo de resultados e seus tipos
+ESQUEMA = [
+    ("Repo", "string"),
+    ("MergeCommit", "string"),
+    ("File", "string"),
+    ("Diff3_Conflict", "int"),
+    ("CSDiff_Conflict", "int"),
+    ("CSDiff_Equals_Manual", "bool"),
+    ("Diff3_ParseOK", "bool"),
+    ("CSDiff_ParseOK", "bool"),
+    ("Manual_ParseOK", "bool"),
+    # Falha da ferramenta no merge ou na validação daquela saída: TIMEOUT, OOM,
+    # CRASH ou vazio. Um merge que falhou tem contagem de conflitos -1
+    ("Diff3_Failure", "string"),
+    ("CSDiff_Failure", "string"),
+    ("Manual_Failure", "string"),
+    # Versão do motor de merge que gerou a linha (início do hash do JAR + servidor,
+    # ou do csdiff com os separadores da linguagem; ver linguagens.py)
+    ("Tool_Version", "string"),
+    # Linguagem do arquivo (chave de linguagens.LINGUAGENS)
+    ("Language", "string"),
+]
+COLUNAS = [nome for nome, _ in ESQUEMA]
+# Colunas que arquivos de rodadas antigas não têm e o valor lido nelas
+# (as rodadas anteriores ao registro de linguagens só mineravam Haskell)
+_COLUNAS_NOVAS = {"Diff3_Failure": "", "CSDiff_Failure": "", "Manual_Failure": "", "Tool_Version": "",
+                  "Language": "haskell"}
+
+_TIPOS_PANDAS = {"string": "string", "int": "int32", "bool": "bool"}
+
+# O lote é gravado ao juntar N cenários concluídos ou a cada T segundos
+TAMANHO_LOTE = 200
+INTERVALO_SEGUNDOS = 30
+
+# Linhas por pedaço na leitura incremental (ler_resultados)
+TAMANHO_PEDACO = 200_000
+
+
+def caminho_resultados(caminho_csv, formato):
+    """O Parquet fica ao lado do CSV, com o mesmo nome (é um diretório de partes)."""
+    if formato == "parquet":
+        return os.path.splitext(caminho_csv)[0] + ".parquet"
+    return caminho_csv
+
+
+def _esquema_arrow():
+    tipos = {"string": pa.string(), "int": pa.int32(), "bool": pa.bool_()}
+    return pa.schema([(nome, tipos[tipo]) for nome, tipo in ESQUEMA])
+
+
+class ColetorResultados:
+    """
+    Acumula as linhas e as grava em lotes. Cada lote vai inteiro para o disco
+    (um único write() em O_APPEND no CSV; um arquivo de parte renomeado no
+    Parquet), e só depois ao_descarregar recebe as marcas dos cenários do
+    lote: o checkpoint nunca registra um cenário cuja linha ainda está na memória.
+    """
+
+    def __init__(self, caminho, formato="csv", tamanho_lote=TAMANHO_LOTE,
+                 intervalo=INTERVALO_SEGUNDOS, ao_descarregar=None):
+        if formato not in ("csv", "parquet"):
+            raise ValueError(f"Formato desconhecido: {formato}")
+        if formato == "parquet" and pa is None:
+            raise RuntimeError("O formato Parquet requer o pacote 'pyarrow'")
+        self.caminho = caminho
+        self.formato = formato
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.ao_descarregar = ao_descarregar
+        self._linhas = []
+        self._marcas = []
+        self._ultima_gravacao = time.monotonic()
+        self._proxima_parte = 0
+
+    def preparar(self, retomar=False):
+        """
+        Cria o arquivo vazio (com o cabeçalho) ou, ao retomar, mantém o que já
+        existe. Devolve as chaves (Repo, MergeCommit, File) já gravadas.
+        """
+        if self.formato == "parquet":
+            if retomar and os.path.isdir(self.caminho):
+                partes = sorted(n for n in os.listdir(self.caminho) if n.startswith("parte-"))
+                if not partes:
+                    return set()
+                self._proxima_parte = int(partes[-1].split("-")[1].split(".")[0]) + 1
+                return linhas_registradas(self.caminho)
+            shutil.rmtree(self.caminho, ignore_errors=True)
+            os.makedirs(self.caminho)
+            return set()
+
+        if retomar and os.path.exists(self.caminho) and os.path.getsize(self.caminho) > 0:
+            if reparar_final(self.caminho):
+                print(" > Checkpoint: última linha incompleta do CSV descartada")
+            if migrar_cabecalho(self.caminho):
+                print(" > Checkpoint: CSV de uma versão anterior convertido para as colunas atuais")
+            return linhas_registradas(self.caminho)
+        with open(self.caminho, 'w', newline='') as csvfile:
+            csv.writer(csvfile).writerow(COLUNAS)
+        return set()
+
+    def adicionar(self, row=None, marca=None):
+        """Uma linha (ou None para cenários sem linha) e a marca do cenário para o checkpoint."""
+        if row is not None:
+            self._linhas.append(row)
+        if marca is not None:
+            self._marcas.append(marca)
+        if (len(self._linhas) + len(self._marcas) >= self.tamanho_lote
+                or time.monotonic() - self._ultima_gravacao >= self.intervalo):
+            self.descarregar()
+
+    def descarregar(self):
+        if self._linhas:
+            if self.formato == "parquet":
+                self._gravar_parte(self._linhas)
+            else:
+                anexar_linhas(self.caminho, self._linhas)
+        if self._marcas and self.ao_descarregar is not None:
+            self.ao_descarregar(self._marcas)
+        self._linhas = []
+        self._marcas = []
+        self._ultima_gravacao = time.monotonic()
+
+    def _gravar_parte(self, linhas):
+        # Cada lote é um arquivo novo: escrito com um nome oculto (que a leitura
+        # ignora) e renomeado no fim, então uma parte nunca aparece pela metade
+        tabela = pa.Table.from_pylist([dict(zip(COLUNAS, row)) for row in linhas], schema=_esquema_arrow())
+        nome = f"parte-{self._proxima_parte:06d}.parquet"
+        destino = os.path.join(self.caminho, nome)
+        temporario = os.path.join(self.caminho, "." + nome)
+        pq.write_table(tabela, temporario)
+        os.replace(temporario, destino)
+        self._proxima_parte += 1
+
+    def close(self):
+        self.descarregar()
+
+
+def anexar_linhas(caminho, rows):
+    """
+    Acrescenta as linhas ao CSV em O_APPEND, repetindo o write() até gravar
+    tudo (uma escrita pode ser parcial). Um kill no meio ainda pode deixar a
+    última linha pela metade: reparar_final a corta antes de retomar.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    dados = buffer.getvalue().encode("utf-8")
+    fd = os.open(caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        visao = memoryview(dados)
+        while visao:
+            visao = visao[os.write(fd, visao):]
+    finally:
+        os.close(fd)
+
+
+def reparar_final(caminho):
+    """Corta uma última linha incompleta (queda de energia no meio da escrita)."""
+    with open(caminho, "rb+") as f:
+        conteudo = f.read()
+        if conteudo and not conteudo.endswith(b"\n"):
+            f.truncate(conteudo.rfind(b"\n") + 1)
+            return True
+    return False
+
+
+def migrar_cabecalho(caminho):
+    """Reescreve um CSV antigo (sem as colunas mais novas) com o cabeçalho atual."""
+    with open(caminho, newline='') as f:
+        cabecalho = next(csv.reader(f), [])
+    if cabecalho == COLUNAS:
+        return False
+    df = carregar_resultados(caminho)
+    temporario = caminho + ".migrando"
+    df.to_csv(temporario, index=False, columns=COLUNAS)
+    os.replace(temporario, caminho)
+    return True
+
+
+def linhas_registradas(caminho):
+    """Chaves (Repo, MergeCommit, File) das linhas que já estão no arquivo de resultados."""
+    df = carregar_resultados(caminho, colunas=["Repo", "MergeCommit", "File"])
+    return set(zip(df["Repo"], df["MergeCommit"], df["File"]))
+
+
+def _eh_parquet(caminho):
+    return os.path.isdir(caminho) or caminho.endswith(".parquet")
+
+
+def _cabecalho(caminho):
+    with open(caminho, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def _tipos_csv(pedidas, existentes):
+    return {nome: _TIPOS_PANDAS[tipo] for nome, tipo in ESQUEMA if nome in pedidas and nome in existentes}
+
+
+def _completar(df, pedidas):
+    # Colunas novas: o valor padrão quando não há valor (o CSV grava "", que o
+    # pandas lê como ausente) ou quando o arquivo é de uma rodada anterior a elas
+    for nome, padrao in _COLUNAS_NOVAS.items():
+        if nome in pedidas:
+            df[nome] = df[nome].fillna(padrao) if nome in df else pd.Series(padrao, index=df.index, dtype="string")
+    return df[[c for c in pedidas if c in df]]
+
+
+def _dataset(caminho):
+    if ds is None:
+        raise RuntimeError("O formato Parquet requer o pacote 'pyarrow'")
+    # Com o esquema explícito, partes gravadas antes de uma coluna nova a trazem nula
+    return ds.dataset(caminho, format="parquet", schema=_esquema_arrow())
+
+
+def carregar_resultados(caminho, colunas=None):
+    """
+    Lê os resultados (CSV ou Parquet) já com os tipos do esquema: inteiros
+    e booleanos de verdade, não as strings 'True'/'False' do CSV.
+    """
+    pedidas = COLUNAS if colunas is None else colunas
+    if _eh_parquet(caminho):
+        return _completar(_dataset(caminho).to_table(columns=pedidas).to_pandas(), pedidas)
+    existentes = _cabecalho(caminho)
+    df = pd.read_csv(caminho, usecols=[c for c in pedidas if c in existentes], dtype=_tipos_csv(pedidas, existentes))
+    return _completar(df, pedidas)
+
+
+def ler_resultados(caminho, colunas=None, tamanho_pedaco=TAMANHO_PEDACO):
+    """
+    Como carregar_resultados, mas em DataFrames de até tamanho_pedaco linhas:
+    só as colunas pedidas são lidas e a tabela inteira nunca fica na memória.
+    """
+    pedidas = COLUNAS if colunas is None else colunas
+    if _eh_parquet(caminho):
+        for lote in _dataset(caminho).to_batches(columns=pedidas, batch_size=tamanho_pedaco):
+            yield _completar(lote.to_pandas(), pedidas)
+        return
+    existentes = _cabecalho(caminho)
+    for df in pd.read_csv(caminho, usecols=[c for c in pedidas if c in existentes],
+                          dtype=_tipos_csv(pedidas, existentes), chunksize=tamanho_pedaco):
+        yield _completar(df, pedidas)
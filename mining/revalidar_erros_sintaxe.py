@@ -1,8 +1,21 @@
 import os
 import csv
-import subprocess
+import time
 import shutil
-from git import Repo
+import hashlib
+import argparse
+from collections import Counter, namedtuple
+from validacao_sintaxe import validar_lote, FALHAS_VALIDACAO
+from cache_resultados import CACHE, hash_ferramenta
+from cenario import CenarioMerge, arquivos_em_memoria
+from conflitos import contar_conflitos, iguais_sem_espacos, CONFLITOS_FALHA
+from sepmerge_cliente import obter_cliente, SERVIDOR_JAVA
+from linguagens import LINGUAGENS, versao_motor
+from armazem_saidas import chave_cenario
+from resultados import carregar_resultados
+from instrumentacao import PERFIL, iniciar_cprofile, salvar_cprofile
+from execucao import FalhaFerramenta, adicionar_argumentos, aplicar_argumentos
+from repositorios import REPOSITORIOS, adicionar_opcoes_repositorios, aplicar_opcoes_repositorios
 
 # --- CONFIGURAÇÕES ---
 # Aponte para a versão mais recente do seu script (ex: v10, v11 ou v12)
@@ -14,12 +27,18 @@ INPUT_CSV = "resultados_com_validacao_total.csv"
 # Onde salvar o relatório de "Antes vs Depois"
 OUTPUT_CSV = "resultado_revalidacao.csv"
 
-REPOS_DIR = "./repos_haskell"
+# Relatório do modo diferencial (--after): uma linha por cenário, antes e depois
+DIFF_OUTPUT_CSV = "resultado_revalidacao_diferencial.csv"
 
-def check_dependencies():
-    if not os.path.exists(CSDIFF_SCRIPT):
-        print(f"[ERRO] Script não encontrado: {CSDIFF_SCRIPT}")
-        return False
+# Modo diferencial: quantos cenários além dos prioritários (os que davam conflito,
+# falha ou código inválido) são conferidos antes de parar
+ORCAMENTO_PADRAO = 200
+
+def check_dependencies(ferramentas=(CSDIFF_SCRIPT,)):
+    for ferramenta in ferramentas:
+        if not os.path.exists(ferramenta):
+            print(f"[ERRO] Ferramenta não encontrada: {ferramenta}")
+            return False
     if shutil.which("ghc") is None:
         print("[ERRO] GHC necessário para validar sintaxe.")
         return False
@@ -28,98 +47,346 @@ def check_dependencies():
         return False
     return True
 
-def check_syntax(filepath):
-    try:
-        res = subprocess.run(["ghc", "-fno-code", "-v0", filepath], 
-                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
-        if res.returncode == 0: return True
-        err = res.stderr.lower()
-        if any(e in err for e in ["parse error", "lexical error", "incorrect indentation", "unexpected"]):
-            return False
-        return True
-    except: return True
-
 def revalidate():
     print(f"Lendo falhas de: {INPUT_CSV}")
     print(f"Testando com script: {CSDIFF_SCRIPT}")
+    versao = hash_ferramenta(CSDIFF_SCRIPT)
     print("-" * 60)
 
     # Prepara output
     with open(OUTPUT_CSV, 'w', newline='') as outfile:
         writer = csv.writer(outfile)
-        writer.writerow(["Repo", "Commit", "File", "Old_ParseOK", "New_ParseOK", "Status"])
+        writer.writerow(["Repo", "Commit", "File", "Old_ParseOK", "New_ParseOK", "Status", "Failure"])
+        
+        # FILTRO: Casos onde a ferramenta disse que resolveu (0 conflitos)
+        # mas gerou código quebrado (ParseOK=False), e o humano acertou (True).
+        # O carregador já devolve inteiros e booleanos (nada de comparar 'True'/'False')
+        df = carregar_resultados(INPUT_CSV)
+        falhas = df[(df['CSDiff_Conflict'] == 0) & ~df['CSDiff_ParseOK'] & df['Manual_ParseOK']]
         
-        with open(INPUT_CSV, 'r') as infile:
-            reader = csv.DictReader(infile)
+        count = 0
+        fixed = 0
+        
+        for row in falhas.to_dict("records"):
+            repo_name = row['Repo']
+            commit_sha = row['MergeCommit']
+            filename = row['File']
             
-            count = 0
-            fixed = 0
+            print(f"Processando: {repo_name} {commit_sha} - {filename}")
             
-            for row in reader:
-                # FILTRO: Casos onde a ferramenta disse que resolveu (0 conflitos)
-                # mas gerou código quebrado (ParseOK=False), e o humano acertou (True).
-                if (row['CSDiff_Conflict'] == '0' and 
-                    row['CSDiff_ParseOK'] == 'False' and 
-                    row['Manual_ParseOK'] == 'True'):
-                    
-                    repo_name = row['Repo']
-                    commit_sha = row['MergeCommit']
-                    filename = row['File']
+            # 1. Setup do Repositório (diretório compartilhado, ver repositorios.py)
+            if not REPOSITORIOS.existe(repo_name):
+                print("  [SKIP] Repo não encontrado localmente.")
+                continue
+                
+            repositorio = REPOSITORIOS.abrir(repo_name)
+            
+            # 2. Extração dos Arquivos
+            # O hash curto do CSV basta: o cat-file resolve o commit
+            with PERFIL.cenario() as tempos:
+                try:
+                    oids = repositorio.oids_do_merge(commit_sha, filename)[:3]
+                    if None in oids:
+                        raise KeyError(filename)
                     
-                    print(f"Processando: {repo_name} {commit_sha} - {filename}")
+                    # Mesmos blobs + mesma versão do script = resultado já conhecido
+                    chave = CACHE.chave("revalidacao", oids, versao)
+                    with PERFIL.medir("cache"):
+                        em_cache = CACHE.obter(chave)
                     
-                    # 1. Setup do Repositório
-                    repo_path = os.path.join(REPOS_DIR, repo_name)
-                    if not os.path.exists(repo_path):
-                        print("  [SKIP] Repo não encontrado localmente.")
-                        continue
-                        
-                    repo = Repo(repo_path)
-                    
-                    # 2. Extração dos Arquivos
-                    # Precisamos achar o hash completo se o CSV só tiver o curto
-                    try:
-                        commit = repo.commit(commit_sha)
-                        parent1 = commit.parents[0]
-                        parent2 = commit.parents[1]
-                        base = repo.merge_base(parent1, parent2)[0]
-                        
-                        base_blob = base.tree[filename].data_stream.read()
-                        left_blob = parent1.tree[filename].data_stream.read()
-                        right_blob = parent2.tree[filename].data_stream.read()
+                    falha = ""
+                    if em_cache is not None:
+                        is_valid = em_cache["parse_ok"]
+                    else:
+                        with PERFIL.medir("leitura_blobs"):
+                            cenario = CenarioMerge(*repositorio.ler_blobs(oids))
                         
-                        with open("temp_base.hs", "wb") as f: f.write(base_blob)
-                        with open("temp_left.hs", "wb") as f: f.write(left_blob)
-                        with open("temp_right.hs", "wb") as f: f.write(right_blob)
-                        
-                        # 3. Executa a NOVA versão da ferramenta
-                        subprocess.run([CSDIFF_SCRIPT, "temp_base.hs", "temp_left.hs", "temp_right.hs"], 
-                                       stdout=open("out_revalidation.hs", "w"), stderr=subprocess.DEVNULL)
+                        # 3. Executa a NOVA versão da ferramenta (num diretório privado do tmpfs)
+                        try:
+                            with PERFIL.medir("merge_ferramenta"):
+                                saida = cenario.executar_script(CSDIFF_SCRIPT)
+                        except FalhaFerramenta as e:
+                            saida, falha = None, e.classe
+                            print(f"  [FALHA] {e}")
                         
                         # 4. Verifica Sintaxe
-                        is_valid = check_syntax("out_revalidation.hs")
-                        
-                        status = "CORRIGIDO" if is_valid else "AINDA QUEBRADO"
-                        if is_valid: fixed += 1
-                        
-                        print(f"  -> Resultado: {status}")
-                        
-                        writer.writerow([
-                            repo_name, commit_sha, filename, 
-                            "False", str(is_valid), status
-                        ])
-                        
-                        count += 1
-                        
-                    except Exception as e:
-                        print(f"  [ERRO] Falha ao processar: {e}")
-                        continue
+                        is_valid = False
+                        if saida is not None:
+                            with arquivos_em_memoria({"out_revalidation.hs": saida}) as caminhos:
+                                with PERFIL.medir("sintaxe_ferramenta"):
+                                    resultado = validar_lote([caminhos["out_revalidation.hs"]])[0]
+                            is_valid = resultado.ok
+                            if resultado.classe_erro in FALHAS_VALIDACAO:
+                                falha = resultado.classe_erro
+                        # Falhas podem ser passageiras: não entram no cache
+                        if not falha:
+                            CACHE.guardar(chave, versao, {"parse_ok": is_valid})
+                    
+                    status = f"FALHA ({falha})" if falha else "CORRIGIDO" if is_valid else "AINDA QUEBRADO"
+                    if is_valid: fixed += 1
+                    
+                    print(f"  -> Resultado: {status}")
+                    
+                    writer.writerow([
+                        repo_name, commit_sha, filename, 
+                        False, is_valid, status, falha
+                    ])
+                    
+                    count += 1
+                    
+                except Exception as e:
+                    print(f"  [ERRO] Falha ao processar: {e}")
+            PERFIL.acumular(tempos)
 
     print("-" * 60)
     print(f"Total reprocessado: {count}")
     print(f"Total corrigido pela nova versão: {fixed}")
     print(f"Relatório salvo em: {OUTPUT_CSV}")
 
+# --- MODO DIFERENCIAL (--after) ---
+# Compara duas versões da ferramenta nos cenários Haskell do INPUT_CSV. Cada
+# versão é um .jar do Haskell-SepMerge (rodado pelo servidor de merge) ou um
+# script no estilo csdiff.sh; sem --before, a versão anterior é a que gerou o
+# CSV e os números dela vêm das próprias linhas. Primeiro vão os prioritários
+# (a versão anterior dava conflito, falha ou código inválido), depois o resto
+# numa ordem embaralhada pela chave (sempre a mesma), até o orçamento.
+# Nada é refeito sem necessidade: as métricas de cada versão ficam no cache
+# pelos blobs, a versão que o runner usa reaproveita o que ele guardou, os
+# blobs são lidos uma vez para as duas versões e uma saída já validada (as
+# versões concordam na maior parte dos cenários) não volta ao GHC.
+
+# Uma versão da ferramenta: caminho, hash do conteúdo e o merge (CenarioMerge -> bytes)
+Ferramenta = namedtuple("Ferramenta", ["caminho", "versao", "mesclar"])
+
+# Situação de uma saída, da pior para a melhor. Código inválido sem conflito é
+# pior que um conflito: a ferramenta diz que resolveu e entrega código quebrado
+ESTADOS = ["FALHA", "INVALIDO", "CONFLITO", "VALIDO", "IGUAL_MANUAL"]
+
+COLUNAS_DIFERENCIAL = [
+    "Repo", "MergeCommit", "File", "Priority", "Old_State", "New_State",
+    "Old_Conflict", "New_Conflict", "Old_ParseOK", "New_ParseOK",
+    "Old_Equals_Manual", "New_Equals_Manual", "Old_Failure", "New_Failure", "Change",
+]
+
+def carregar_ferramenta(caminho):
+    """A Ferramenta de um .jar do Haskell-SepMerge ou de um script de merge."""
+    if caminho.endswith(".jar"):
+        # Mesmo hash do runner (JAR + servidor): a versão dele reaproveita o cache
+        return Ferramenta(caminho, hash_ferramenta(caminho, SERVIDOR_JAVA),
+                          lambda cenario: cenario.sepmerge(obter_cliente(caminho)))
+    return Ferramenta(caminho, hash_ferramenta(caminho), lambda cenario: cenario.executar_script(caminho))
+
+def estado(metricas):
+    if metricas["falha"]:
+        return "FALHA"
+    if metricas["conflitos"] != 0:
+        return "CONFLITO"
+    if not metricas["parse_ok"]:
+        return "INVALIDO"
+    return "IGUAL_MANUAL" if metricas["igual_manual"] else "VALIDO"
+
+def comparar(antes, depois):
+    """
+    CORRIGIDO, REGRESSAO ou IGUAL pelo estado (e, no mesmo estado, pelo
+    número de conflitos); FALHA se uma das versões falhou (pode ser passageiro).
+    """
+    if antes["falha"] or depois["falha"]:
+        return "FALHA"
+    nota_antes = (ESTADOS.index(estado(antes)), -antes["conflitos"])
+    nota_depois = (ESTADOS.index(estado(depois)), -depois["conflitos"])
+    if nota_depois > nota_antes:
+        return "CORRIGIDO"
+    return "REGRESSAO" if nota_depois < nota_antes else "IGUAL"
+
+def _do_csv(row):
+    return {"conflitos": int(row["CSDiff_Conflict"]), "parse_ok": bool(row["CSDiff_ParseOK"]),
+            "igual_manual": bool(row["CSDiff_Equals_Manual"]), "falha": row["CSDiff_Failure"]}
+
+def _do_runner(ferramenta, oids):
+    """As métricas que o experiment_runner_final guardou, se a ferramenta é a versão que ele usa."""
+    haskell = LINGUAGENS["haskell"]
+    try:
+        if ferramenta.versao != versao_motor(haskell):
+            return None
+    except FileNotFoundError:
+        return None
+    metricas = CACHE.obter(chave_cenario(oids, haskell))
+    if not metricas or not metricas.get("interessante"):
+        return None
+    return {"conflitos": metricas["csdiff_conflict"], "parse_ok": metricas["csdiff_parse_ok"],
+            "igual_manual": metricas["csdiff_equals_manual"], "falha": metricas.get("csdiff_failure", "")}
+
+def validar_saida(saida):
+    """(parse_ok, classe da falha) de uma saída Haskell; o resultado fica no cache pelo conteúdo da saída."""
+    chave = CACHE.chave("sintaxe", [hashlib.sha256(saida).hexdigest()], "ghc")
+    em_cache = CACHE.obter(chave)
+    if em_cache is not None:
+        return em_cache["parse_ok"], ""
+    with arquivos_em_memoria({"out_revalidation.hs": saida}) as caminhos:
+        with PERFIL.medir("sintaxe_ferramenta"):
+            resultado = validar_lote([caminhos["out_revalidation.hs"]])[0]
+    falha = resultado.classe_erro if resultado.classe_erro in FALHAS_VALIDACAO else ""
+    if not falha:
+        CACHE.guardar(chave, "ghc", {"parse_ok": resultado.ok})
+    return resultado.ok, falha
+
+def medir(ferramenta, oids, ler_cenario):
+    """
+    Métricas da ferramenta nos blobs 'oids' (base, left, right, manual): do
+    cache, do que o runner guardou ou rodando o merge. ler_cenario() devolve
+    o CenarioMerge, lido do repositório só na primeira chamada.
+    """
+    chave = CACHE.chave("revalidacao_diferencial", oids, ferramenta.versao)
+    with PERFIL.medir("cache"):
+        metricas = CACHE.obter(chave) or _do_runner(ferramenta, oids)
+    if metricas is not None:
+        return metricas
+    cenario = ler_cenario()
+    try:
+        with PERFIL.medir("merge_ferramenta"):
+            saida = ferramenta.mesclar(cenario)
+    except FalhaFerramenta as e:
+        print(f"  [FALHA] {e}")
+        return {"conflitos": CONFLITOS_FALHA, "parse_ok": False, "igual_manual": False, "falha": e.classe}
+    metricas = {"conflitos": contar_conflitos(saida), "parse_ok": False,
+                "igual_manual": iguais_sem_espacos(saida, cenario.manual), "falha": ""}
+    if metricas["conflitos"] == 0:
+        metricas["parse_ok"], metricas["falha"] = validar_saida(saida)
+    # Falhas podem ser passageiras: não entram no cache
+    if not metricas["falha"]:
+        CACHE.guardar(chave, ferramenta.versao, metricas)
+    return metricas
+
+def _prioritaria(row):
+    return row["CSDiff_Conflict"] != 0 or not row["CSDiff_ParseOK"] or row["CSDiff_Failure"] != ""
+
+def _embaralhada(row):
+    return hashlib.sha1(f"{row['Repo']}|{row['MergeCommit']}|{row['File']}".encode()).digest()
+
+def _revalidar_linha(row, depois, antes):
+    """(métricas antes, métricas depois) de uma linha do CSV, ou None se o repositório não está aqui."""
+    if not REPOSITORIOS.existe(row["Repo"]):
+        print("  [SKIP] Repo não encontrado localmente.")
+        return None
+    repositorio = REPOSITORIOS.abrir(row["Repo"])
+    oids = repositorio.oids_do_merge(row["MergeCommit"], row["File"])
+    if None in oids:
+        raise KeyError(row["File"])
+    lido = []
+
+    def ler_cenario():
+        if not lido:
+            with PERFIL.medir("leitura_blobs"):
+                lido.append(CenarioMerge(*repositorio.ler_blobs(oids)))
+        return lido[0]
+
+    metricas_antes = _do_csv(row) if antes is None else medir(antes, oids, ler_cenario)
+    return metricas_antes, medir(depois, oids, ler_cenario)
+
+def revalidar_diferencial(depois, antes=None, orcamento=ORCAMENTO_PADRAO, orcamento_segundos=None):
+    print(f"Lendo cenários de: {INPUT_CSV}")
+    print(f"Antes:  {antes.caminho} ({antes.versao[:12]})" if antes else "Antes:  resultados gravados no CSV")
+    print(f"Depois: {depois.caminho} ({depois.versao[:12]})")
+    print("-" * 60)
+
+    df = carregar_resultados(INPUT_CSV)
+    linhas = df[df["Language"] == "haskell"].to_dict("records")
+    prioritarias = [row for row in linhas if _prioritaria(row)]
+    restantes = sorted((row for row in linhas if not _prioritaria(row)), key=_embaralhada)
+
+    mudancas = Counter()
+    regressoes = []
+    conferidas = {True: 0, False: 0}
+    inicio = time.monotonic()
+    with open(DIFF_OUTPUT_CSV, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(COLUNAS_DIFERENCIAL)
+        for prioritaria, lote in ((True, prioritarias), (False, restantes)):
+            for row in lote:
+                if not prioritaria and (conferidas[False] >= orcamento or orcamento_segundos is not None
+                                        and time.monotonic() - inicio > orcamento_segundos):
+                    break
+                chave = (row["Repo"], row["MergeCommit"], row["File"])
+                print(f"Processando: {' '.join(chave)}")
+                with PERFIL.cenario() as tempos:
+                    try:
+                        par = _revalidar_linha(row, depois, antes)
+                    except Exception as e:
+                        print(f"  [ERRO] Falha ao processar: {e}")
+                        par = None
+                PERFIL.acumular(tempos)
+                if par is None:
+                    continue
+                metricas_antes, metricas_depois = par
+                mudanca = comparar(metricas_antes, metricas_depois)
+                estados = (estado(metricas_antes), estado(metricas_depois))
+                print(f"  -> {mudanca} ({estados[0]} -> {estados[1]})")
+                writer.writerow([
+                    *chave, prioritaria, *estados,
+                    *(m[campo] for campo in ("conflitos", "parse_ok", "igual_manual", "falha")
+                      for m in (metricas_antes, metricas_depois)),
+                    mudanca,
+                ])
+                conferidas[prioritaria] += 1
+                mudancas[mudanca] += 1
+                if mudanca == "REGRESSAO":
+                    regressoes.append((*chave, *estados))
+
+    print("-" * 60)
+    print(f"Prioritários conferidos: {conferidas[True]} de {len(prioritarias)}")
+    print(f"Demais conferidos: {conferidas[False]} de {len(restantes)}")
+    for mudanca in ("CORRIGIDO", "REGRESSAO", "IGUAL", "FALHA"):
+        print(f"  {mudanca:<10} {mudancas[mudanca]}")
+    if regressoes:
+        print("Regressões:")
+        for repo_name, commit_sha, filename, antes_, depois_ in regressoes:
+            print(f"  {repo_name} {commit_sha} {filename}: {antes_} -> {depois_}")
+    print(f"Relatório salvo em: {DIFF_OUTPUT_CSV}")
+
 if __name__ == "__main__":
-    if check_dependencies():
-        revalidate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Revalida os casos que não compilaram com uma nova versão da ferramenta.")
+    parser.add_argument("--after", metavar="FERRAMENTA",
+                        help="Modo diferencial: compara esta versão da ferramenta (.jar do Haskell-SepMerge ou "
+                             "script de merge) com a anterior, em todos os cenários Haskell do CSV")
+    parser.add_argument("--before", metavar="FERRAMENTA",
+                        help="A versão anterior no modo diferencial (padrão: os resultados gravados no CSV)")
+    parser.add_argument("--budget", type=int, default=ORCAMENTO_PADRAO, metavar="N",
+                        help=f"Modo diferencial: cenários conferidos além dos que davam conflito, falha ou "
+                             f"código inválido (padrão: {ORCAMENTO_PADRAO})")
+    parser.add_argument("--time-budget", type=float, metavar="SEGUNDOS",
+                        help="Modo diferencial: para de conferir os demais cenários depois deste tempo")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Não consulta nem grava o cache de resultados")
+    parser.add_argument("--invalidate-tool", nargs="?", const="atual", metavar="HASH",
+                        help="Apaga do cache os resultados do script atual (com --after, dessa versão) ou do HASH informado")
+    adicionar_argumentos(parser)
+    adicionar_opcoes_repositorios(parser)
+    parser.add_argument("--profile-report", metavar="ARQUIVO_JSON",
+                        help="Mede cada etapa por caso e grava o relatório (percentis e histogramas) neste JSON")
+    parser.add_argument("--cprofile", metavar="ARQUIVO_PROF",
+                        help="Grava o perfil do cProfile (pstats) da revalidação")
+    args = parser.parse_args()
+    if args.before and not args.after:
+        parser.error("--before só vale com --after")
+
+    ferramentas = [f for f in (args.after, args.before) if f] or [CSDIFF_SCRIPT]
+    if check_dependencies(ferramentas):
+        aplicar_argumentos(args)
+        aplicar_opcoes_repositorios(args)
+        CACHE.ativo = not args.no_cache
+        if args.invalidate_tool:
+            alvo = carregar_ferramenta(ferramentas[0]).versao if args.invalidate_tool == "atual" else args.invalidate_tool
+            print(f"Cache: {CACHE.invalidar_ferramenta(alvo)} resultados removidos ({alvo[:12]})")
+        PERFIL.ativo = args.profile_report is not None
+        if args.cprofile:
+            iniciar_cprofile()
+        if args.after:
+            revalidar_diferencial(carregar_ferramenta(args.after), args.before and carregar_ferramenta(args.before),
+                                  args.budget, args.time_budget)
+        else:
+            revalidate()
+        if args.cprofile:
+            salvar_cprofile(args.cprofile)
+        if PERFIL.ativo:
+            PERFIL.imprimir_resumo(PERFIL.salvar(args.profile_report))
+            print(f"Perfil salvo em: {args.profile_report}")
\ No newline at end of file
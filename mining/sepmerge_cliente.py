@@ -0,0 +1,242 @@
+# CLIENTE DO SERVIDOR DE MERGE (Haskell-SepMerge)
+# Mantém uma única JVM viva (haskell/SepMergeServer.java) e conversa com ela
+# por stdin/stdout, uma requisição JSON por linha. Evita o custo de subir
+# uma JVM nova ("java -jar") a cada arquivo.
+import os
+import json
+import atexit
+import asyncio
+import shutil
+import tempfile
+import subprocess
+import execucao
+from execucao import FalhaFerramenta, classificar, prazo, TIMEOUT, OOM, CRASH
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HASKELL_SEPMERGE_JAR = os.path.abspath(os.path.join(SCRIPT_DIR, "../haskell/haskell-sepmerge.jar"))
+SERVIDOR_JAVA = os.path.abspath(os.path.join(SCRIPT_DIR, "../haskell/SepMergeServer.java"))
+# Tamanho máximo de uma resposta (uma linha JSON) no cliente assíncrono
+LIMITE_RESPOSTA = 1 << 30
+
+
+class ErroSepMerge(FalhaFerramenta):
+    """O merge não saiu: a ferramenta respondeu com erro, estourou o prazo ou o servidor caiu."""
+
+    def __init__(self, mensagem, classe=CRASH):
+        super().__init__("sepmerge", classe, mensagem)
+
+
+class ClienteSepMerge:
+    """
+    Cliente com reuso de conexão: o servidor é iniciado na primeira chamada
+    e reaproveitado nas seguintes. Se o processo morrer (ou a comunicação
+    quebrar), ele é reiniciado automaticamente e a requisição é reenviada.
+    Uma requisição que passa do timeout não é reenviada: o servidor é morto
+    e o merge falha como TIMEOUT.
+    """
+
+    def __init__(self, jar=HASKELL_SEPMERGE_JAR, java="java", max_reinicios=3):
+        self.jar = os.path.abspath(jar)
+        self.java = java
+        self.max_reinicios = max_reinicios
+        self._proc = None
+        self._workdir = None
+        self._proximo_id = 0
+
+    def _comando(self):
+        # A JVM reserva muito espaço de endereçamento: o limite de memória vira o -Xmx
+        memoria = [f"-Xmx{execucao.LIMITES.memoria_mb}m"] if execucao.LIMITES.memoria_mb else []
+        return [self.java, *memoria, "-cp", self.jar, SERVIDOR_JAVA]
+
+    def _iniciar(self):
+        # Cada servidor escreve seus temp_*.hs num diretório próprio
+        self._workdir = tempfile.mkdtemp(prefix="sepmerge_")
+        self._proc = subprocess.Popen(
+            self._comando(),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=self._workdir, text=True, encoding="utf-8", bufsize=1
+        )
+
+    def _vivo(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def merge(self, base, left, right):
+        """
+        Faz o merge de três versões (bytes ou str).
+        Retorna (texto_mesclado, numero_de_conflitos).
+        """
+        requisicao = _requisicao(base, left, right)
+        ultimo_erro = None
+        classe = CRASH
+        for _ in range(self.max_reinicios + 1):
+            if not self._vivo():
+                self.close()
+                self._iniciar()
+            self._proximo_id += 1
+            requisicao["id"] = self._proximo_id
+            proc = self._proc
+            linha = erro_pipe = None
+            try:
+                with prazo(proc, execucao.LIMITES.timeout) as estourou:
+                    proc.stdin.write(json.dumps(requisicao) + "\n")
+                    proc.stdin.flush()
+                    linha = proc.stdout.readline()
+            except (BrokenPipeError, OSError, ValueError) as e:
+                erro_pipe = e
+            if estourou.is_set():
+                self.close()
+                raise ErroSepMerge(f"mais de {execucao.LIMITES.timeout}s", TIMEOUT)
+            if not linha:
+                # O servidor morreu no meio da requisição: reinicia e tenta de novo
+                self.close()
+                classe = classificar(proc.returncode) or CRASH
+                ultimo_erro = erro_pipe or EOFError(f"Servidor de merge encerrou sem responder ({classe})")
+                continue
+            return _resposta(linha)
+        raise ErroSepMerge(f"Servidor de merge indisponível: {ultimo_erro}", classe)
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except Exception:
+                pass
+            try:
+                self._proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait()
+            self._proc = None
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ClienteSepMergeAsync(ClienteSepMerge):
+    """
+    O mesmo cliente sobre os pipes do asyncio (modo assíncrono): as mesmas
+    regras de reinício e de timeout, sem bloquear o laço de eventos. O
+    servidor atende uma requisição por vez; merges simultâneos usam vários
+    clientes, cada um com a sua JVM (ver assincrono.py).
+    """
+
+    async def _iniciar(self):
+        self._workdir = tempfile.mkdtemp(prefix="sepmerge_")
+        self._proc = await asyncio.create_subprocess_exec(
+            *self._comando(), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL, cwd=self._workdir, limit=LIMITE_RESPOSTA
+        )
+
+    def _vivo(self):
+        return self._proc is not None and self._proc.returncode is None
+
+    async def merge(self, base, left, right):
+        requisicao = _requisicao(base, left, right)
+        ultimo_erro = None
+        classe = CRASH
+        for _ in range(self.max_reinicios + 1):
+            if not self._vivo():
+                await self.close()
+                await self._iniciar()
+            self._proximo_id += 1
+            requisicao["id"] = self._proximo_id
+            proc = self._proc
+            linha = erro_pipe = None
+            try:
+                proc.stdin.write((json.dumps(requisicao) + "\n").encode("utf-8"))
+                linha = await asyncio.wait_for(_ler_resposta(proc), execucao.LIMITES.timeout)
+            except asyncio.TimeoutError:
+                await self.close(matar=True)
+                raise ErroSepMerge(f"mais de {execucao.LIMITES.timeout}s", TIMEOUT)
+            except asyncio.CancelledError:
+                # A resposta pendente ficaria no pipe e iria para a próxima requisição
+                await self.close(matar=True)
+                raise
+            except (BrokenPipeError, ConnectionResetError, OSError, ValueError) as e:
+                erro_pipe = e
+            if not linha:
+                await self.close(matar=True)
+                classe = classificar(proc.returncode) or CRASH
+                ultimo_erro = erro_pipe or EOFError(f"Servidor de merge encerrou sem responder ({classe})")
+                continue
+            return _resposta(linha.decode("utf-8"))
+        raise ErroSepMerge(f"Servidor de merge indisponível: {ultimo_erro}", classe)
+
+    async def close(self, matar=False):
+        if self._proc is not None:
+            proc, self._proc = self._proc, None
+            if matar and proc.returncode is None:
+                proc.kill()
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+            try:
+                await asyncio.wait_for(proc.wait(), 5)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def _ler_resposta(proc):
+    await proc.stdin.drain()
+    return await proc.stdout.readline()
+
+
+def _requisicao(base, left, right):
+    return {"base": _como_texto(base), "left": _como_texto(left), "right": _como_texto(right)}
+
+
+def _resposta(linha):
+    resposta = json.loads(linha)
+    if not resposta.get("ok"):
+        erro = resposta.get("error", "erro desconhecido")
+        # O servidor captura o OutOfMemoryError e responde com ele
+        raise ErroSepMerge(erro, OOM if erro.startswith("OutOfMemoryError") else CRASH)
+    return resposta["merged"], resposta["conflicts"]
+
+
+def _como_texto(conteudo):
+    # A JVM lia os arquivos como UTF-8; bytes inválidos viram U+FFFD do mesmo jeito
+    if isinstance(conteudo, bytes):
+        return conteudo.decode("utf-8", errors="replace")
+    return conteudo
+
+
+_clientes = {}
+
+def obter_cliente(jar=HASKELL_SEPMERGE_JAR):
+    """
+    Cliente compartilhado por processo (e por JAR). A chave inclui o pid para
+    que workers criados por fork não herdem os pipes do processo pai.
+    """
+    chave = (os.getpid(), os.path.abspath(jar))
+    cliente = _clientes.get(chave)
+    if cliente is None:
+        cliente = ClienteSepMerge(jar)
+        _clientes[chave] = cliente
+    return cliente
+
+
+def fechar_clientes():
+    """Encerra os servidores iniciados por este processo."""
+    for (pid, _), cliente in list(_clientes.items()):
+        if pid == os.getpid():
+            cliente.close()
+
+atexit.register(fechar_clientes)
@@ -0,0 +1,137 @@
+# Testes do repositorios.py: clone bare (só as branches, completo ou parcial),
+# leitura dos blobs de um merge e o cache LRU de blobs.
+import subprocess
+import threading
+
+import pytest
+
+from repositorios import CacheBlobs, GerenciadorRepositorios, REFSPEC_BRANCHES, FILTRO_PARCIAL
+
+
+def _git(caminho, *argumentos):
+    res = subprocess.run(["git", "-C", str(caminho), *argumentos],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    return res.stdout.strip()
+
+
+def _commit(caminho, arquivo, conteudo, mensagem):
+    (caminho / arquivo).write_text(conteudo)
+    _git(caminho, "add", arquivo)
+    _git(caminho, "commit", "--quiet", "-m", mensagem)
+    return _git(caminho, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def origem(tmp_path):
+    """Repositório com um merge em main.hs e um refs/pull/1/head fora das branches."""
+    caminho = tmp_path / "origem"
+    caminho.mkdir()
+    _git(caminho, "init", "--quiet", "--initial-branch=main")
+    _git(caminho, "config", "user.name", "Teste")
+    _git(caminho, "config", "user.email", "teste@exemplo.com")
+    # Permite o clone parcial pelo file://
+    _git(caminho, "config", "uploadpack.allowFilter", "true")
+    _git(caminho, "config", "uploadpack.allowAnySHA1InWant", "true")
+    base = _commit(caminho, "main.hs", "a\nb\nc\n", "base")
+    _git(caminho, "checkout", "--quiet", "-b", "outra")
+    _commit(caminho, "main.hs", "a\nb\nc-outra\n", "outra")
+    _git(caminho, "checkout", "--quiet", "main")
+    _commit(caminho, "main.hs", "a-main\nb\nc\n", "main")
+    _git(caminho, "merge", "--quiet", "--no-edit", "outra")
+    merge = _git(caminho, "rev-parse", "HEAD")
+    pull = _commit(caminho, "pr.hs", "pr\n", "pr")
+    _git(caminho, "update-ref", "refs/pull/1/head", pull)
+    _git(caminho, "reset", "--quiet", "--hard", merge)
+    return {"url": f"file://{caminho}", "base": base, "merge": merge, "pull": pull}
+
+
+@pytest.mark.parametrize("filtro", [None, FILTRO_PARCIAL])
+def test_clone_bare_so_com_as_branches(tmp_path, origem, filtro):
+    gerenciador = GerenciadorRepositorios(str(tmp_path / "repos"), filtro=filtro)
+    try:
+        repositorio = gerenciador.garantir(origem["url"])
+        assert repositorio.caminho.endswith("origem.git")
+        assert _git(repositorio.caminho, "rev-parse", "--is-bare-repository") == "true"
+        refs = _git(repositorio.caminho, "for-each-ref", "--format=%(refname)").splitlines()
+        assert refs and all(ref.startswith("refs/heads/") for ref in refs)
+        assert _git(repositorio.caminho, "config", "--get", "remote.origin.fetch") == REFSPEC_BRANCHES
+        assert repositorio.parcial == (filtro is not None)
+
+        # O fetch traz as branches novas, mas continua sem os refs/pull/*
+        origem_local = origem["url"].removeprefix("file://")
+        _git(origem_local, "branch", "nova", origem["base"])
+        gerenciador.garantir(origem["url"], atualizar=True)
+        refs = _git(repositorio.caminho, "for-each-ref", "--format=%(refname)").splitlines()
+        assert "refs/heads/nova" in refs
+        assert not any(ref.startswith("refs/pull/") for ref in refs)
+    finally:
+        gerenciador.fechar()
+
+
+@pytest.mark.parametrize("filtro", [None, FILTRO_PARCIAL])
+def test_oids_e_blobs_do_merge(tmp_path, origem, filtro):
+    gerenciador = GerenciadorRepositorios(str(tmp_path / "repos"), filtro=filtro)
+    try:
+        repositorio = gerenciador.garantir(origem["url"])
+        oids = repositorio.oids_do_merge(origem["merge"], "main.hs")
+        origem_local = origem["url"].removeprefix("file://")
+        esperados = [_git(origem_local, "rev-parse", f"{rev}:main.hs")
+                     for rev in (origem["base"], "main~1", "outra", origem["merge"])]
+        assert oids == esperados
+        assert repositorio.oids_do_merge(origem["merge"], "nao_existe.hs") == [None] * 4
+
+        if filtro is not None:
+            # Nenhum dos blobs veio no clone: todos saem numa só busca
+            assert repositorio.buscar_blobs(list(dict.fromkeys(oids))) == len(set(oids))
+            assert repositorio.buscar_blobs(oids) == 0
+
+        conteudos = repositorio.ler_blobs([*oids, None])
+        assert conteudos == [b"a\nb\nc\n", b"a-main\nb\nc\n", b"a\nb\nc-outra\n", b"a-main\nb\nc-outra\n", None]
+        faltas = repositorio.cache.faltas
+        assert repositorio.ler_blobs(oids) == conteudos[:4]
+        assert repositorio.cache.faltas == faltas
+    finally:
+        gerenciador.fechar()
+
+
+def test_abrir_repositorio_inexistente(tmp_path):
+    gerenciador = GerenciadorRepositorios(str(tmp_path / "repos"))
+    with pytest.raises(FileNotFoundError):
+        gerenciador.abrir("nao_existe")
+
+
+def test_cache_blobs_remove_os_menos_usados():
+    cache = CacheBlobs(limite_bytes=10)
+    cache.guardar("a", b"1234")
+    cache.guardar("b", b"1234")
+    assert cache.obter("a") == b"1234"
+    cache.guardar("c", b"1234")
+    # "b" era o menos usado
+    assert cache.obter("b") is None
+    assert cache.obter("a") == b"1234" and cache.obter("c") == b"1234"
+    assert cache.tamanho == 8
+    # Maior que o limite: não entra
+    cache.guardar("d", b"x" * 11)
+    assert cache.obter("d") is None
+    assert (cache.acertos, cache.faltas) == (3, 2)
+    cache.limpar()
+    assert cache.tamanho == 0 and cache.obter("a") is None
+
+
+def test_cache_blobs_entre_threads():
+    cache = CacheBlobs(limite_bytes=1000)
+
+    def usar(indice):
+        for i in range(2000):
+            oid = f"{indice}-{i % 50}"
+            if cache.obter(oid) is None:
+                cache.guardar(oid, b"x" * (i % 20 + 1))
+
+    threads = [threading.Thread(target=usar, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.tamanho == sum(len(conteudo) for conteudo in cache._blobs.values())
+    assert cache.tamanho <= cache.limite_bytes
+    assert cache.acertos + cache.faltas == 8 * 2000
@@ -0,0 +1,396 @@
+# MOTOR DE VALIDAÇÃO SINTÁTICA (GHC)
+# Substitui o "ghc -fno-code -v0 arquivo" por arquivo: mantém uma sessão do
+# GHCi (-fno-code) aquecida e carrega os arquivos nela, um ":load" por arquivo.
+# Usado pelo experiment_runner_final.py e pelo revalidar_erros_sintaxe.py.
+# As outras linguagens (ver linguagens.py) têm validadores próprios no fim do
+# arquivo, com as mesmas classes de erro.
+import os
+import re
+import atexit
+import time
+import shutil
+import select
+import asyncio
+import subprocess
+from collections import namedtuple
+import execucao
+from execucao import executar, executar_async, FalhaFerramenta
+
+# Resultado estruturado da validação de um arquivo.
+# classe_erro: None (ok), "PARSE", "LEXICO", "INDENTACAO" ou, quando o próprio
+# GHC falhou, "TIMEOUT", "OOM" ou "CRASH" (as classes do execucao.py)
+ResultadoSintaxe = namedtuple("ResultadoSintaxe", ["arquivo", "ok", "classe_erro", "linha", "coluna", "mensagem"])
+
+# Classes em que o arquivo não chegou a ser validado
+FALHAS_VALIDACAO = (execucao.TIMEOUT, execucao.OOM, execucao.CRASH)
+
+REINICIAR_A_CADA = 500
+
+# Prompt único: marca o fim da saída de cada comando enviado ao GHCi
+_PROMPT = "<<<VALIDACAO-PRONTA>>>"
+
+# Mesmas palavras-chave do check_syntax original; outros erros (tipos, imports) não contam
+# (a ordem importa: o "parse error" padrão do GHC cita "possibly incorrect indentation")
+_CLASSES_ERRO = [
+    ("lexical error", "LEXICO"),
+    ("parse error", "PARSE"),
+    ("incorrect indentation", "INDENTACAO"),
+    ("unexpected", "PARSE"),
+]
+
+# arquivo:12:5: error   |   arquivo:12:5-9: error   |   arquivo:(12,5)-(13,1): error
+_LOCAL_ERRO = re.compile(r"^(?P<arq>.+?):(?:(?P<l>\d+):(?P<c>\d+)(?:-\d+)?|\((?P<l2>\d+),(?P<c2>\d+)\)-\(\d+,\d+\)): error", re.M)
+
+
+def classificar_saida(arquivo, saida, classes_erro=_CLASSES_ERRO, local_erro=_LOCAL_ERRO):
+    """Classifica a saída do GHC (ou de outro validador, com as suas palavras-chave) para um arquivo."""
+    texto = saida.lower()
+    chave, classe = next(((k, c) for k, c in classes_erro if k in texto), (None, None))
+    if classe is None:
+        return ResultadoSintaxe(arquivo, True, None, None, None, None)
+
+    linha = coluna = None
+    m = local_erro.search(saida)
+    if m is not None:
+        grupos = m.groupdict()
+        linha = _inteiro(grupos.get("l") or grupos.get("l2"))
+        coluna = _inteiro(grupos.get("c") or grupos.get("c2"))
+    mensagem = next(l.strip() for l in saida.splitlines() if chave in l.lower())
+    return ResultadoSintaxe(arquivo, False, classe, linha, coluna, mensagem)
+
+
+def _inteiro(valor):
+    return None if valor is None else int(valor)
+
+
+class SessaoGhci:
+    """
+    Sessão do GHCi reaproveitada entre arquivos. Cada arquivo é carregado com
+    ":load"; se um arquivo passar do timeout a sessão é morta, o arquivo é
+    marcado como TIMEOUT e uma nova sessão é aberta para o restante do lote.
+    Sem timeout explícito, vale o de execucao.LIMITES; o limite de memória
+    vira o "+RTS -M" (o RTS do GHC não convive com o RLIMIT_AS).
+    """
+
+    def __init__(self, ghc="ghc", timeout=None, reiniciar_a_cada=REINICIAR_A_CADA):
+        self.ghc = ghc
+        self.timeout = timeout
+        self.reiniciar_a_cada = reiniciar_a_cada
+        self._proc = None
+        self._carregados = 0
+
+    def _comando(self):
+        return [self.ghc, *_opcoes_rts(), "--interactive", "-v0", "-ignore-dot-ghci", "-fno-code",
+                "-fdiagnostics-color=never"]
+
+    def _iniciar(self):
+        self._proc = subprocess.Popen(self._comando(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT)
+        self._carregados = 0
+        self._enviar(f':set prompt "{_PROMPT}"')
+        self._enviar(':set prompt-cont ""')
+        # Descarta o prompt padrão e as respostas aos comandos de configuração
+        if self._ler_ate_prompt(self._timeout(), quantidade=2) is None:
+            raise EOFError("GHCi não respondeu ao iniciar")
+
+    def _timeout(self):
+        return self.timeout if self.timeout is not None else execucao.LIMITES.timeout
+
+    def _enviar(self, comando):
+        self._proc.stdin.write((comando + "\n").encode("utf-8"))
+        self._proc.stdin.flush()
+
+    def _ler_ate_prompt(self, timeout, quantidade=1):
+        """Lê o stdout até o prompt aparecer; devolve None se estourar o timeout (None: sem limite)."""
+        fd = self._proc.stdout.fileno()
+        prazo = time.monotonic() + timeout if timeout else None
+        buffer = b""
+        marcador = _PROMPT.encode()
+        while buffer.count(marcador) < quantidade:
+            restante = None if prazo is None else prazo - time.monotonic()
+            if restante is not None and restante <= 0:
+                return None
+            prontos, _, _ = select.select([fd], [], [], restante)
+            if not prontos:
+                return None
+            pedaco = os.read(fd, 65536)
+            if not pedaco:
+                raise EOFError("GHCi encerrou inesperadamente")
+            buffer += pedaco
+        return buffer.replace(marcador, b"").decode("utf-8", errors="replace")
+
+    def validar(self, arquivo):
+        try:
+            if self._proc is None or self._proc.poll() is not None or self._carregados >= self.reiniciar_a_cada:
+                self.close()
+                self._iniciar()
+            self._carregados += 1
+            self._enviar(f":load {arquivo}")
+            saida = self._ler_ate_prompt(self._timeout())
+        except (EOFError, BrokenPipeError, OSError):
+            self.close()
+            # Sessão caiu (às vezes por falta de memória): o arquivo vai para o GHC
+            # avulso, que reporta o erro normalmente ou classifica a falha
+            return validar_com_ghc(arquivo, self.ghc)
+        if saida is None:
+            self.close()
+            return ResultadoSintaxe(arquivo, False, execucao.TIMEOUT, None, None, f"Timeout de {self._timeout()}s")
+        return classificar_saida(arquivo, saida)
+
+    def validar_lote(self, arquivos):
+        return [self.validar(arquivo) for arquivo in arquivos]
+
+    def close(self):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc = None
+
+
+class SessaoGhciAsync(SessaoGhci):
+    """
+    A SessaoGhci sobre os pipes do asyncio, para o modo assíncrono: o mesmo
+    protocolo, sem bloquear o laço de eventos. Um arquivo por vez por
+    sessão; validações simultâneas usam várias sessões (ver assincrono.py).
+    """
+
+    async def _iniciar(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            *self._comando(), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        self._carregados = 0
+        self._enviar(f':set prompt "{_PROMPT}"')
+        self._enviar(':set prompt-cont ""')
+        if await self._ler_ate_prompt(self._timeout(), quantidade=2) is None:
+            raise EOFError("GHCi não respondeu ao iniciar")
+
+    def _enviar(self, comando):
+        self._proc.stdin.write((comando + "\n").encode("utf-8"))
+
+    async def _ler_ate_prompt(self, timeout, quantidade=1):
+        marcador = _PROMPT.encode()
+
+        async def ler():
+            await self._proc.stdin.drain()
+            buffer = b""
+            while buffer.count(marcador) < quantidade:
+                pedaco = await self._proc.stdout.read(65536)
+                if not pedaco:
+                    raise EOFError("GHCi encerrou inesperadamente")
+                buffer += pedaco
+            return buffer
+
+        try:
+            buffer = await asyncio.wait_for(ler(), timeout or None)
+        except asyncio.TimeoutError:
+            return None
+        return buffer.replace(marcador, b"").decode("utf-8", errors="replace")
+
+    async def validar(self, arquivo):
+        try:
+            if self._proc is None or self._proc.returncode is not None or self._carregados >= self.reiniciar_a_cada:
+                await self.close()
+                await self._iniciar()
+            self._carregados += 1
+            self._enviar(f":load {arquivo}")
+            saida = await self._ler_ate_prompt(self._timeout())
+        except (EOFError, BrokenPipeError, ConnectionResetError, OSError):
+            await self.close()
+            return await validar_com_ghc_async(arquivo, self.ghc)
+        except asyncio.CancelledError:
+            # A resposta pendente iria para o próximo arquivo
+            await self.close()
+            raise
+        if saida is None:
+            await self.close()
+            return ResultadoSintaxe(arquivo, False, execucao.TIMEOUT, None, None, f"Timeout de {self._timeout()}s")
+        return classificar_saida(arquivo, saida)
+
+    async def validar_lote(self, arquivos):
+        return [await self.validar(arquivo) for arquivo in arquivos]
+
+    async def close(self):
+        if self._proc is not None:
+            proc, self._proc = self._proc, None
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+
+
+def validar_com_ghc(arquivo, ghc="ghc"):
+    """Validação avulsa (um processo do GHC por arquivo), como o check_syntax original."""
+    try:
+        # O código de saída diz se houve erro no arquivo: só falhas do próprio GHC sobem
+        res = executar([ghc, *_opcoes_rts(), "-fno-code", "-v0", arquivo], "ghc",
+                       codigos_ok=None, limitar_memoria=False)
+    except FalhaFerramenta as e:
+        return ResultadoSintaxe(arquivo, False, e.classe, None, None, str(e))
+    return _resultado_ghc(arquivo, res)
+
+
+async def validar_com_ghc_async(arquivo, ghc="ghc"):
+    try:
+        res = await executar_async([ghc, *_opcoes_rts(), "-fno-code", "-v0", arquivo], "ghc",
+                                   codigos_ok=None, limitar_memoria=False)
+    except FalhaFerramenta as e:
+        return ResultadoSintaxe(arquivo, False, e.classe, None, None, str(e))
+    return _resultado_ghc(arquivo, res)
+
+
+def _resultado_ghc(arquivo, res):
+    if res.returncode == 0:
+        return ResultadoSintaxe(arquivo, True, None, None, None, None)
+    return classificar_saida(arquivo, res.stderr.decode("utf-8", errors="replace"))
+
+
+def _opcoes_rts():
+    memoria = execucao.LIMITES.memoria_mb
+    return ["+RTS", f"-M{memoria}m", "-RTS"] if memoria else []
+
+
+_sessoes = {}
+
+def obter_sessao():
+    """Uma sessão por processo (a chave com o pid evita herdar a sessão do pai num fork)."""
+    sessao = _sessoes.get(os.getpid())
+    if sessao is None:
+        sessao = SessaoGhci()
+        _sessoes[os.getpid()] = sessao
+    return sessao
+
+
+def validar_lote(arquivos, validador="ghc"):
+    """
+    Valida vários arquivos na sessão do processo (ou com o validador de outra
+    linguagem, ver VALIDADORES). Sem a ferramenta, tudo é considerado válido.
+    """
+    if validador != "ghc":
+        outro = VALIDADORES[validador]
+        if not outro.disponivel():
+            return [ResultadoSintaxe(arquivo, True, None, None, None, None) for arquivo in arquivos]
+        return [outro.validar(arquivo) for arquivo in arquivos]
+    if shutil.which("ghc") is None:
+        return [ResultadoSintaxe(arquivo, True, None, None, None, None) for arquivo in arquivos]
+    return obter_sessao().validar_lote(arquivos)
+
+
+def check_syntax(filepath):
+    """Compatível com o check_syntax antigo: True se não houver erro de sintaxe."""
+    return validar_lote([filepath])[0].ok
+
+
+def fechar_sessoes():
+    sessao = _sessoes.pop(os.getpid(), None)
+    if sessao is not None:
+        sessao.close()
+
+atexit.register(fechar_sessoes)
+
+
+# --- OUTRAS LINGUAGENS ---
+# Como no GHC, só os erros de sintaxe contam: tipos, imports e nomes de
+# arquivo/classe (o javac compila o arquivo inteiro) não invalidam a saída.
+
+class ValidadorComando:
+    """Validação por um comando externo, um processo por arquivo ('javac', 'node --check')."""
+
+    def __init__(self, nome, comando, classes_erro, local_erro, limitar_memoria=True):
+        self.nome = nome
+        self.comando = comando
+        self.classes_erro = classes_erro
+        self.local_erro = local_erro
+        # A JVM do javac não convive com o RLIMIT_AS (como o servidor de merge)
+        self.limitar_memoria = limitar_memoria
+
+    def disponivel(self):
+        return shutil.which(self.comando[0]) is not None
+
+    def validar(self, arquivo):
+        try:
+            res = executar([*self.comando, arquivo], self.nome, codigos_ok=None,
+                           limitar_memoria=self.limitar_memoria)
+        except FalhaFerramenta as e:
+            return ResultadoSintaxe(arquivo, False, e.classe, None, None, str(e))
+        return self._resultado(arquivo, res)
+
+    async def validar_async(self, arquivo):
+        try:
+            res = await executar_async([*self.comando, arquivo], self.nome, codigos_ok=None,
+                                       limitar_memoria=self.limitar_memoria)
+        except FalhaFerramenta as e:
+            return ResultadoSintaxe(arquivo, False, e.classe, None, None, str(e))
+        return self._resultado(arquivo, res)
+
+    def _resultado(self, arquivo, res):
+        if res.returncode == 0:
+            return ResultadoSintaxe(arquivo, True, None, None, None, None)
+        saida = (res.stdout + res.stderr).decode("utf-8", errors="replace")
+        return classificar_saida(arquivo, saida, self.classes_erro, self.local_erro)
+
+
+class ValidadorPython:
+    """
+    O mesmo que 'python -m py_compile', mas no próprio processo: o compile()
+    só analisa a sintaxe e não há interpretador novo por arquivo.
+    """
+
+    nome = "python"
+
+    def disponivel(self):
+        return True
+
+    def validar(self, arquivo):
+        with open(arquivo, "rb") as f:
+            codigo = f.read()
+        try:
+            compile(codigo, arquivo, "exec", dont_inherit=True)
+        except (IndentationError, TabError) as e:
+            return ResultadoSintaxe(arquivo, False, "INDENTACAO", e.lineno, e.offset, e.msg)
+        except SyntaxError as e:
+            classe = "LEXICO" if any(k in e.msg for k in _ERROS_LEXICOS_PYTHON) else "PARSE"
+            return ResultadoSintaxe(arquivo, False, classe, e.lineno, e.offset, e.msg)
+        except ValueError as e:
+            # Byte nulo no código-fonte
+            return ResultadoSintaxe(arquivo, False, "LEXICO", None, None, str(e))
+        except (RecursionError, MemoryError) as e:
+            # Aninhamento profundo demais para o parser: o arquivo não chegou a ser validado
+            return ResultadoSintaxe(arquivo, False, execucao.CRASH, None, None, repr(e))
+        return ResultadoSintaxe(arquivo, True, None, None, None, None)
+
+    async def validar_async(self, arquivo):
+        # Sem processo externo: o compile() roda numa thread para não parar o laço de eventos
+        return await asyncio.to_thread(self.validar, arquivo)
+
+
+_ERROS_LEXICOS_PYTHON = ("unterminated", "invalid character", "invalid non-printable", "invalid decimal literal")
+
+# A ordem importa, como em _CLASSES_ERRO ("';' expected", "<identifier> expected" etc.)
+_CLASSES_ERRO_JAVAC = [
+    ("illegal character", "LEXICO"),
+    ("unclosed", "LEXICO"),
+    ("reached end of file while parsing", "PARSE"),
+    ("illegal start of", "PARSE"),
+    ("' expected", "PARSE"),
+    ("> expected", "PARSE"),
+    ("or record expected", "PARSE"),
+    ("not a statement", "PARSE"),
+    ("without 'if'", "PARSE"),
+    ("orphaned", "PARSE"),
+]
+# Arquivo.java:12: error: ...
+_LOCAL_ERRO_JAVAC = re.compile(r"^(?P<arq>.+?):(?P<l>\d+): error", re.M)
+
+_CLASSES_ERRO_NODE = [("syntaxerror", "PARSE")]
+# arquivo.js:12 (primeira linha do erro do node --check)
+_LOCAL_ERRO_NODE = re.compile(r"^(?P<arq>.+?):(?P<l>\d+)$", re.M)
+
+VALIDADORES = {
+    "javac": ValidadorComando("javac", ["javac", "-proc:none", "-implicit:none", "-nowarn"],
+                              _CLASSES_ERRO_JAVAC, _LOCAL_ERRO_JAVAC, limitar_memoria=False),
+    "node": ValidadorComando("node", ["node", "--check"], _CLASSES_ERRO_NODE, _LOCAL_ERRO_NODE),
+    "python": ValidadorPython(),
+}